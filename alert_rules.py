@@ -0,0 +1,112 @@
+from dataclasses import dataclass
+from price_history import itinerary_id
+
+# Rule name → the value it needs, see ALERT_RULES in config.py
+RULE_PARAMETERS = {
+    'price_below': 'price',       # An offer cheaper than price
+    'price_drop': 'percent',      # An itinerary at least percent cheaper than in the previous run
+    'new_direct': None,           # A direct flight that the previous run did not offer
+    'duration_under': 'hours',    # An offer with a total travel time under hours
+}
+
+@dataclass(frozen=True)
+class AlertRule:
+    """One compiled alert condition, with its threshold in the units offers use"""
+    rule: str
+    value: float = None
+    threshold: int = None  # price_cents, percent or minutes
+
+    @property
+    def description(self):
+        if self.rule == 'price_below':
+            return f"Price below ${self.value:,.0f}"
+        if self.rule == 'price_drop':
+            return f"Price drop of {self.value:g}% or more since the last run"
+        if self.rule == 'new_direct':
+            return "New direct flight"
+        return f"Travel time under {self.value:g}h"
+
+    def matches(self, offer, previous_cents, is_new):
+        """previous_cents is the itinerary's price in the previous run, None if it was not offered"""
+        if self.rule == 'price_below':
+            return offer.price_cents < self.threshold
+        if self.rule == 'price_drop':
+            return previous_cents is not None and offer.price_cents * 100 <= previous_cents * (100 - self.threshold)
+        if self.rule == 'new_direct':
+            return is_new and offer.stops == 0
+        return offer.duration_minutes < self.threshold
+
+def compile_rules(specs, errors=None):
+    """
+    AlertRule tuple from ALERT_RULES style dicts such as {"rule": "price_below", "price": 450}.
+
+    Raises ValueError for unknown rules and missing or invalid values, so a
+    typo fails the configuration check instead of silencing every alert.
+    When an errors list is passed, the messages are appended to it and the
+    invalid rules are skipped instead.
+    """
+    rules = []
+    for spec in specs or ():
+        try:
+            rules.append(_compile_rule(spec))
+        except ValueError as e:
+            if errors is None:
+                raise
+            errors.append(str(e))
+    return tuple(rules)
+
+def _compile_rule(spec):
+    name = spec.get('rule') if isinstance(spec, dict) else None
+    if name not in RULE_PARAMETERS:
+        raise ValueError(f"Unknown alert rule {spec}, expected one of {', '.join(RULE_PARAMETERS)}")
+    parameter = RULE_PARAMETERS[name]
+    if parameter is None:
+        return AlertRule(name)
+    value = spec.get(parameter)
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or value <= 0:
+        raise ValueError(f"Alert rule {spec} needs a positive '{parameter}'")
+    if name == 'price_drop' and value >= 100:
+        raise ValueError(f"Alert rule {spec} needs a 'percent' below 100")
+    threshold = {'price': round(value * 100), 'percent': value, 'hours': round(value * 60)}[parameter]
+    return AlertRule(name, value, threshold)
+
+def evaluate_rules(rules, offers, previous_prices=None):
+    """
+    Check every rule against every offer in one pass.
+
+    previous_prices maps (departure_date, return_date, itinerary) of the
+    previous run to its price in cents, None on a route's first run.
+    Returns [{'rule': AlertRule, 'offers': [...]}] for the rules that fired,
+    each with its matching offers cheapest first.
+    """
+    if not rules:
+        return []
+    matched = {rule: [] for rule in rules}
+    for offer in offers:
+        previous_cents, is_new = None, False
+        if previous_prices is not None:
+            previous_cents = previous_prices.get((offer.departure_date, offer.return_date, itinerary_id(offer)))
+            is_new = previous_cents is None
+        for rule in rules:
+            if rule.matches(offer, previous_cents, is_new):
+                matched[rule].append(offer)
+    return [
+        {'rule': rule, 'offers': sorted(found, key=lambda offer: offer.price_cents)}
+        for rule, found in matched.items() if found
+    ]
+
+def render_alerts_html(alerts):
+    """The fired rules, each with its cheapest matching offer, for the top of the email summary"""
+    if not alerts:
+        return ""
+    items = []
+    for alert in alerts:
+        offer = alert['offers'][0]
+        segment = offer.first_segment
+        more = f" and {len(alert['offers']) - 1} more" if len(alert['offers']) > 1 else ""
+        items.append(
+            f"<li>{alert['rule'].description}: {segment.carrier_code} {segment.number}, "
+            f"{offer.departure_date or segment.departure_at.date().isoformat()} → {offer.return_date or '—'}, "
+            f"${offer.price:,.2f}{more}</li>"
+        )
+    return f"<strong>🔔 Price Alerts:</strong><ul style=\"margin:8px 0 12px; padding-left:20px;\">{''.join(items)}</ul>"
@@ -0,0 +1,223 @@
+import json
+import logging
+import os
+import random
+import threading
+import time
+from datetime import date, datetime, timedelta
+from types import SimpleNamespace
+from cache_manager import write_json_atomic
+from ttl_cache import canonical_hash
+
+AMADEUS_MODES = ('live', 'record', 'replay')
+
+# Statuses an injected failure picks from, the same ones the rate limiter retries
+INJECTED_ERROR_STATUSES = (429, 500, 503)
+
+class ReplayResponseError(Exception):
+    """Error raised by the replay client for injected failures and missing fixtures"""
+
+    def __init__(self, status_code, description):
+        super().__init__(f"[{status_code}] {description}")
+        self.response = SimpleNamespace(status_code=status_code, body=description, headers={})
+
+class FixtureStore:
+    """
+    Recorded API responses on disk, one JSON file per distinct request.
+
+    Files live in <directory>/<endpoint>/<hash of the parameters>.json, so a
+    recording session can be reviewed, trimmed or committed file by file.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self._index = {}
+        self._lock = threading.Lock()
+
+    def _path(self, endpoint, params):
+        return os.path.join(self.directory, endpoint, f"{canonical_hash(params)[:16]}.json")
+
+    def save(self, endpoint, params, data):
+        path = self._path(endpoint, params)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        write_json_atomic(path, {
+            'endpoint': endpoint,
+            'params': params,
+            'recorded_at': datetime.now().isoformat(timespec='seconds'),
+            'data': data,
+        })
+        with self._lock:
+            self._index.pop(endpoint, None)
+
+    def load(self, endpoint, params):
+        """The recorded data for exactly these parameters, or None"""
+        path = self._path(endpoint, params)
+        if not os.path.exists(path):
+            return None
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)['data']
+
+    def fixtures(self, endpoint):
+        """Every recorded fixture of an endpoint, read once per store"""
+        with self._lock:
+            if endpoint not in self._index:
+                directory = os.path.join(self.directory, endpoint)
+                fixtures = []
+                if os.path.isdir(directory):
+                    for name in sorted(os.listdir(directory)):
+                        if name.endswith('.json'):
+                            with open(os.path.join(directory, name), 'r', encoding='utf-8') as f:
+                                fixtures.append(json.load(f))
+                self._index[endpoint] = fixtures
+            return self._index[endpoint]
+
+def _shift_segments(itinerary, days):
+    for segment in itinerary.get('segments', []):
+        for point in ('departure', 'arrival'):
+            at = segment.get(point, {}).get('at')
+            if at:
+                segment[point]['at'] = (datetime.fromisoformat(at) + timedelta(days=days)).isoformat()
+
+def _redate_offers(fixture, params):
+    """Copy a recorded flight search onto other travel dates by shifting every segment"""
+    recorded = fixture['params']
+    departure_shift = (date.fromisoformat(params['departureDate']) - date.fromisoformat(recorded['departureDate'])).days
+    return_shift = departure_shift
+    if params.get('returnDate') and recorded.get('returnDate'):
+        return_shift = (date.fromisoformat(params['returnDate']) - date.fromisoformat(recorded['returnDate'])).days
+
+    offers = json.loads(json.dumps(fixture['data']))
+    for offer in offers:
+        for index, itinerary in enumerate(offer.get('itineraries', [])):
+            _shift_segments(itinerary, departure_shift if index == 0 else return_shift)
+    return offers
+
+def _nearest_flight_search(store, endpoint, params):
+    """Offers recorded for the same route on the closest departure date, re-dated to the request"""
+    same_route = [
+        fixture for fixture in store.fixtures(endpoint)
+        if fixture['params'].get('originLocationCode') == params.get('originLocationCode')
+        and fixture['params'].get('destinationLocationCode') == params.get('destinationLocationCode')
+        and bool(fixture['params'].get('nonStop')) == bool(params.get('nonStop'))
+    ]
+    if not same_route or 'departureDate' not in params:
+        return None
+    requested = date.fromisoformat(params['departureDate'])
+    nearest = min(same_route, key=lambda fixture: abs((date.fromisoformat(fixture['params']['departureDate']) - requested).days))
+    return _redate_offers(nearest, params)[:params.get('max', len(nearest['data']))]
+
+def _reference_records(store, endpoint, codes):
+    """Reference data records for the given IATA codes, gathered from every recorded response"""
+    records = {}
+    for fixture in store.fixtures(endpoint):
+        for record in fixture['data'] or []:
+            records.setdefault(record.get('iataCode'), record)
+    return [records[code] for code in codes if code in records]
+
+# Answers for requests that were never recorded exactly as asked
+_FALLBACKS = {
+    'shopping.flight_offers_search': _nearest_flight_search,
+    'reference_data.airlines': lambda store, endpoint, params: _reference_records(store, endpoint, params.get('airlineCodes', '').split(',')),
+    'reference_data.locations': lambda store, endpoint, params: _reference_records(store, endpoint, [params.get('keyword')]),
+}
+
+class _RecordingEndpoint:
+    def __init__(self, target, store, path):
+        self._target = target
+        self._store = store
+        self._path = path
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return _RecordingEndpoint(getattr(self._target, name), self._store, self._path + (name,))
+
+    def get(self, **params):
+        response = self._target.get(**params)
+        self._store.save(".".join(self._path), params, response.data)
+        return response
+
+class RecordingClient:
+    """Pass-through wrapper around a live client that saves every .get() response as a fixture"""
+
+    def __init__(self, client, store):
+        self._client = client
+        self._store = store
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return _RecordingEndpoint(getattr(self._client, name), self._store, (name,))
+
+class _ReplayEndpoint:
+    def __init__(self, client, path):
+        self._client = client
+        self._path = path
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return _ReplayEndpoint(self._client, self._path + (name,))
+
+    def get(self, **params):
+        return self._client.replay(".".join(self._path), params)
+
+class ReplayClient:
+    """
+    Offline stand-in for amadeus.Client that answers from recorded fixtures.
+
+    Requests that were not recorded exactly fall back to the nearest recorded
+    flight search for the same route, or to reference data gathered from all
+    recordings. Latency and failures can be injected to exercise the retry and
+    concurrency paths; seed makes the injected behaviour repeatable.
+    """
+
+    def __init__(self, store, latency_ms=0, latency_jitter_ms=0, error_rate=0.0, seed=None):
+        self.store = store
+        self.latency_ms = latency_ms
+        self.latency_jitter_ms = latency_jitter_ms
+        self.error_rate = error_rate
+        self.calls = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return _ReplayEndpoint(self, (name,))
+
+    def replay(self, endpoint, params):
+        with self._lock:
+            self.calls += 1
+            delay = max(0.0, self.latency_ms + self._random.uniform(-1, 1) * self.latency_jitter_ms) / 1000
+            failure = self._random.choice(INJECTED_ERROR_STATUSES) if self._random.random() < self.error_rate else None
+        if delay:
+            time.sleep(delay)
+        if failure:
+            raise ReplayResponseError(failure, f"Injected failure for {endpoint}")
+
+        data = self.store.load(endpoint, params)
+        if data is None and endpoint in _FALLBACKS:
+            data = _FALLBACKS[endpoint](self.store, endpoint, params)
+        if data is None:
+            raise ReplayResponseError(404, f"No fixture recorded for {endpoint} {params}")
+        return SimpleNamespace(data=data)
+
+def create_amadeus_client(mode, client_id=None, client_secret=None, hostname='test', fixtures_dir="fixtures/amadeus", **replay_options):
+    """
+    Build the Amadeus client for a mode: 'live' talks to the API, 'record' also
+    saves every response under fixtures_dir and 'replay' answers from those
+    fixtures without network access or credentials.
+    """
+    if mode not in AMADEUS_MODES:
+        raise ValueError(f"AMADEUS_MODE should be one of {', '.join(AMADEUS_MODES)}, got {mode}")
+    if mode == 'replay':
+        logging.info(f"Amadeus replay mode: answering from fixtures in {fixtures_dir}")
+        return ReplayClient(FixtureStore(fixtures_dir), **replay_options)
+
+    from amadeus import Client
+    client = Client(client_id=client_id, client_secret=client_secret, hostname=hostname)
+    if mode == 'record':
+        logging.info(f"Amadeus record mode: saving responses to {fixtures_dir}")
+        return RecordingClient(client, FixtureStore(fixtures_dir))
+    return client
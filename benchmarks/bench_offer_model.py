@@ -0,0 +1,165 @@
+"""
+Compare the raw Amadeus dict path with the parsed Offer model.
+
+The raw path repeats what search_flights, summarize_with_claude and
+build_email_body used to do on every pass over the response: walking
+itineraries[0]['segments'], regex-parsing durations and re-parsing ISO
+timestamps. The model path parses once and reuses the attributes.
+
+Usage: python benchmarks/bench_offer_model.py [--offers 500] [--repeat 5]
+"""
+import argparse
+import json
+import os
+import random
+import re
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models import parse_offers
+
+AIRPORTS = ['TLV', 'KEF', 'LHR', 'CDG', 'FRA', 'AMS', 'IST', 'VIE', 'CPH', 'OSL', 'MUC', 'BUD']
+CARRIERS = ['LY', 'FI', 'LH', 'BA', 'AF', 'KL', 'TK', 'W6', 'OS', 'SK']
+
+def _make_segments(rng, path, start, carriers, first_id=1):
+    segments = []
+    at = start
+    for i, (origin, destination) in enumerate(zip(path, path[1:])):
+        arrival = at + timedelta(minutes=rng.randint(60, 300))
+        segments.append({
+            'departure': {'iataCode': origin, 'terminal': '3', 'at': at.isoformat()},
+            'arrival': {'iataCode': destination, 'at': arrival.isoformat()},
+            'carrierCode': rng.choice(carriers),
+            'number': str(rng.randint(1, 9999)),
+            'aircraft': {'code': '32N'},
+            'operating': {'carrierCode': 'LY'},
+            'duration': 'PT3H',
+            'id': str(first_id + i),
+            'numberOfStops': 0,
+            'blacklistedInEU': False,
+        })
+        at = arrival + timedelta(minutes=rng.randint(45, 400))
+    return segments
+
+def _make_itinerary(segments, start):
+    total = datetime.fromisoformat(segments[-1]['arrival']['at']) - start
+    hours, minutes = divmod(int(total.total_seconds() // 60), 60)
+    return {'duration': f"PT{hours}H{minutes}M", 'segments': segments}
+
+def make_raw_offer(rng, offer_id, max_segments=3, airports=AIRPORTS, carriers=CARRIERS,
+                   origin='TLV', destination='KEF', departure_date='2026-08-11', return_date=None):
+    """One synthetic offer shaped like a flight_offers_search response item"""
+    via = [airport for airport in airports if airport not in (origin, destination)]
+    start = datetime.fromisoformat(departure_date).replace(hour=rng.randint(0, 23), minute=rng.choice([0, 15, 30, 45]))
+    stops = rng.sample(via, rng.randint(0, max_segments - 1))
+    segments = _make_segments(rng, [origin, *stops, destination], start, carriers)
+    itineraries = [_make_itinerary(segments, start)]
+    if return_date:
+        back_start = datetime.fromisoformat(return_date).replace(hour=rng.randint(0, 23), minute=rng.choice([0, 15, 30, 45]))
+        back_stops = rng.sample(via, rng.randint(0, max_segments - 1))
+        back = _make_segments(rng, [destination, *back_stops, origin], back_start, carriers, first_id=len(segments) + 1)
+        itineraries.append(_make_itinerary(back, back_start))
+        segments = segments + back
+    price = f"{rng.uniform(150, 1500):.2f}"
+    return {
+        'type': 'flight-offer',
+        'id': str(offer_id),
+        'source': 'GDS',
+        'instantTicketingRequired': False,
+        'nonHomogeneous': False,
+        'oneWay': False,
+        'lastTicketingDate': '2026-08-01',
+        'numberOfBookableSeats': rng.randint(1, 9),
+        'itineraries': itineraries,
+        'price': {'currency': 'USD', 'total': price, 'base': price, 'fees': [{'amount': '0.00', 'type': 'SUPPLIER'}], 'grandTotal': price},
+        'pricingOptions': {'fareType': ['PUBLISHED'], 'includedCheckedBagsOnly': True},
+        'validatingAirlineCodes': [segments[0]['carrierCode']],
+        'travelerPricings': [{
+            'travelerId': '1', 'fareOption': 'STANDARD', 'travelerType': 'ADULT',
+            'price': {'currency': 'USD', 'total': price, 'base': price},
+            'fareDetailsBySegment': [
+                {'segmentId': s['id'], 'cabin': 'ECONOMY', 'fareBasis': 'XLOWFARE', 'class': 'X', 'includedCheckedBags': {'quantity': 1}}
+                for s in segments
+            ],
+        }],
+    }
+
+def _raw_minutes(duration_str):
+    duration_str = duration_str.replace('PT', '')
+    hours = re.search(r'(\d+)H', duration_str)
+    minutes = re.search(r'(\d+)M', duration_str)
+    return (int(hours.group(1)) if hours else 0) * 60 + (int(minutes.group(1)) if minutes else 0)
+
+def _raw_dt(dt_str):
+    return datetime.fromisoformat(dt_str.replace('Z', '+00:00'))
+
+def consume_raw(flights, max_stops=2):
+    """The three passes the pipeline made over raw dicts"""
+    flights = [f for f in flights if len(f['itineraries'][0]['segments']) - 1 <= max_stops]
+    prompt = []
+    for f in flights:
+        segs = f['itineraries'][0]['segments']
+        prompt.append((segs[0]['carrierCode'], segs[0]['departure']['at'], segs[-1]['arrival']['at'],
+                       f['itineraries'][0]['duration'], f['price']['total'], len(segs) - 1))
+    cards = []
+    for f in flights:
+        segs = f['itineraries'][0]['segments']
+        layovers = [(_raw_dt(b['departure']['at']) - _raw_dt(a['arrival']['at'])).total_seconds() // 60 for a, b in zip(segs, segs[1:])]
+        cards.append((_raw_dt(segs[0]['departure']['at']), _raw_dt(segs[-1]['arrival']['at']),
+                      _raw_minutes(f['itineraries'][0]['duration']), float(f['price']['total']), layovers))
+    return flights, prompt, cards
+
+def consume_model(raw, max_stops=2):
+    """Parse once, then the same three passes over the outbound leg's attributes"""
+    offers = [o for o in parse_offers(raw) if o.outbound.stops <= max_stops]
+    prompt = [(o.first_segment.carrier_code, o.first_segment.departure_at, o.outbound.last_segment.arrival_at,
+               o.outbound.duration_minutes, o.price_cents, o.outbound.stops) for o in offers]
+    cards = [(o.first_segment.departure_at, o.outbound.last_segment.arrival_at, o.outbound.duration_minutes, o.price_cents,
+              o.outbound.layover_minutes) for o in offers]
+    return offers, prompt, cards
+
+def best_time(fn, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+def retained_bytes(build):
+    """Memory still allocated after build() returns, measured with tracemalloc"""
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    result = build()
+    retained = tracemalloc.get_traced_memory()[0] - baseline
+    tracemalloc.stop()
+    del result
+    return retained
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--offers', type=int, default=500)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    payload = json.dumps([make_raw_offer(rng, i) for i in range(args.offers)])
+    raw = json.loads(payload)
+
+    results = {
+        'offers': args.offers,
+        'raw_three_passes_s': best_time(lambda: consume_raw(raw), args.repeat),
+        'model_parse_and_three_passes_s': best_time(lambda: consume_model(raw), args.repeat),
+        'model_parse_only_s': best_time(lambda: parse_offers(raw), args.repeat),
+        'raw_retained_bytes': retained_bytes(lambda: json.loads(payload)),
+        'model_retained_bytes': retained_bytes(lambda: parse_offers(raw)),
+    }
+    print(json.dumps(results, indent=2))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,346 @@
+"""
+End-to-end benchmark of the search → summarize → render → send pipeline.
+
+Amadeus, Claude and SMTP are replaced by in-process stubs fed by synthetic
+offers, so the numbers cover this repository's code only. Each stage is timed
+over --repeat runs: the first run starts with empty reference data, summary
+and history stores (cold), the others reuse them (warm). A separate pass
+under tracemalloc records each stage's peak memory and the number of memory
+blocks it left allocated, so tracing does not skew the timings.
+
+The stages map to the pipeline as follows:
+  search     date grid, search_flights calls through run_searches_async and offer parsing
+  summarize  prepare_route_report and summarize_route_report: ranking, price history,
+             analytics and narrative
+  render     build_email_body, including the airline/airport prefetch
+  send       send_emails over a stubbed SMTP session, connect and login included
+
+Usage:
+  python benchmarks/bench_pipeline.py [--offers 50] [--segments 3] [--airports 40] [--flex 1]
+  python benchmarks/bench_pipeline.py --output results.json --save-baseline benchmarks/baseline.json
+  python benchmarks/bench_pipeline.py --baseline benchmarks/baseline.json [--tolerance 0.2]
+
+With --baseline the run is compared stage by stage and the exit status is 1
+when any stage is slower or uses more peak memory than the tolerance allows.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import random
+import statistics
+import string
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+from types import SimpleNamespace
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bench_offer_model import AIRPORTS, CARRIERS, make_raw_offer
+from search_executor import run_searches_async
+
+STAGES = ('search', 'summarize', 'render', 'send')
+
+def airport_pool(count):
+    """count distinct airport codes, the real ones first, then synthetic Zxx codes"""
+    synthetic = (f"Z{a}{b}" for a in string.ascii_uppercase for b in string.ascii_uppercase)
+    pool = list(AIRPORTS[:count])
+    while len(pool) < count:
+        pool.append(next(synthetic))
+    return pool
+
+class StubAmadeus:
+    """Answers flight searches with synthetic offers and reference lookups with made-up names"""
+
+    def __init__(self, offers, segments, airports, seed, latency_ms=0):
+        self.offers = offers
+        self.segments = segments
+        self.airports = airports
+        self.seed = seed
+        self.latency = latency_ms / 1000
+        self.calls = 0
+        self._lock = threading.Lock()
+        self.shopping = SimpleNamespace(flight_offers_search=SimpleNamespace(get=self._search))
+        self.reference_data = SimpleNamespace(
+            airlines=SimpleNamespace(get=self._airlines),
+            locations=SimpleNamespace(get=self._locations),
+        )
+
+    def _respond(self, data):
+        with self._lock:
+            self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+        # Round-trip through JSON like a real response body
+        return SimpleNamespace(data=json.loads(json.dumps(data)))
+
+    def _search(self, **params):
+        # Seeded per request, so every repeat sees the same offers for the same dates
+        key = f"{self.seed}|{params['departureDate']}|{params['returnDate']}"
+        rng = random.Random(zlib.crc32(key.encode()))
+        return self._respond([
+            make_raw_offer(
+                rng, i, self.segments, self.airports, CARRIERS,
+                params['originLocationCode'], params['destinationLocationCode'],
+                params['departureDate'], params['returnDate']
+            )
+            for i in range(min(self.offers, params.get('max', self.offers)))
+        ])
+
+    def _airlines(self, airlineCodes, **params):
+        return self._respond([{'iataCode': code, 'businessName': f"{code} Airways"} for code in airlineCodes.split(',')])
+
+    def _locations(self, keyword, **params):
+        return self._respond([{'iataCode': keyword, 'name': f"{keyword} INTERNATIONAL, {keyword} CITY"}])
+
+class StubClaude:
+    def __init__(self, latency_ms=0):
+        self.latency = latency_ms / 1000
+        self.calls = 0
+        self.messages = SimpleNamespace(create=self._create)
+
+    def _create(self, **kwargs):
+        self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+        return SimpleNamespace(content=[SimpleNamespace(text="<strong>Stub narrative.</strong><br>Book early.")])
+
+class StubSMTP:
+    sent_bytes = 0
+
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def login(self, user, password):
+        pass
+
+    def sendmail(self, sender, recipients, message):
+        StubSMTP.sent_bytes += len(message)
+        return {}
+
+    def quit(self):
+        pass
+
+class StageRecorder:
+    """Collects per-stage wall time, or peak memory and net allocated blocks when tracing"""
+
+    def __init__(self, trace_memory=False):
+        self.trace_memory = trace_memory
+        self.results = {}
+
+    @contextmanager
+    def stage(self, name):
+        if self.trace_memory:
+            tracemalloc.reset_peak()
+            current_before = tracemalloc.get_traced_memory()[0]
+            blocks_before = sys.getallocatedblocks()
+            yield
+            self.results[name] = {
+                'peak_bytes': tracemalloc.get_traced_memory()[1] - current_before,
+                'allocated_blocks': sys.getallocatedblocks() - blocks_before,
+            }
+        else:
+            started = time.perf_counter()
+            yield
+            self.results[name] = time.perf_counter() - started
+
+def load_pipeline(args, workdir):
+    """Import flight_search inside workdir with every external service stubbed"""
+    os.chdir(workdir)
+    os.environ.update({
+        'AMADEUS_MODE': 'replay',
+        'EMAIL_RECEIVER': 'bench@example.com',
+        'EMAIL_USER': 'bench@example.com',
+        'EMAIL_PASS': 'bench',
+    })
+    os.environ.pop('ANTHROPIC_API_KEY', None)
+
+    import smtplib
+    smtplib.SMTP_SSL = StubSMTP
+
+    import flight_search
+    from rate_limiter import ApiCallGuard, GuardedClient, TokenBucket
+    logging.getLogger().setLevel(logging.WARNING)
+
+    amadeus = StubAmadeus(args.offers, args.segments, airport_pool(args.airports), args.seed, args.backend_latency_ms)
+    claude = StubClaude(args.backend_latency_ms)
+    # Keep the guard in the call path but with a limit that never throttles
+    flight_search.set_clients(
+        amadeus=GuardedClient(amadeus, ApiCallGuard(TokenBucket(1e9, 1e9), name="Amadeus stub")),
+        claude=claude,
+    )
+    flight_search.AI_NARRATIVE_ENABLED = True
+    # Repeats return the same offers, render the full list every time rather than an empty delta
+    flight_search.EMAIL_CHANGES_ONLY = False
+    # Warm runs should still exercise search and parsing, not replay cached responses
+    flight_search.SEARCH_CACHE_ENABLED = False
+    return flight_search, amadeus, claude
+
+def run_pipeline(fs, route, recorder):
+    """One pass through the stages run_job_async goes through for a single route"""
+    return asyncio.run(run_pipeline_async(fs, route, recorder))
+
+async def run_pipeline_async(fs, route, recorder):
+    with recorder.stage('search'):
+        combinations = fs.build_date_grid(
+            route.departure_date, route.return_date,
+            departure_flex_days=route.departure_flex_days,
+            return_flex_days=route.return_flex_days,
+            max_cells=route.max_date_combinations,
+        )
+        with ThreadPoolExecutor(max_workers=fs.MAX_CONCURRENT_SEARCHES, thread_name_prefix="flight-search") as executor:
+            results = await run_searches_async(
+                lambda route, dep, ret: fs.search_flights(route.origin, route.destination, dep, ret, route.max_results, route.max_stops),
+                [(route, dep, ret) for dep, ret in combinations],
+                executor
+            )
+    with recorder.stage('summarize'):
+        report = fs.prepare_route_report(route, results)
+        await asyncio.to_thread(fs.summarize_route_report, report)
+    with recorder.stage('render'):
+        html = await asyncio.to_thread(
+            fs.build_email_body,
+            report['flights'], report['departure_dates'], report['return_dates'], report['summary'],
+            report['origin'], report['destination'], fs.get_amadeus(), report['price_matrix'], report['changes'],
+            report['changes_only']
+        )
+    with recorder.stage('send'):
+        await asyncio.to_thread(fs.send_emails, [("Flight Search Results", html, fs.SEND_TO)])
+        # run_job_async ends its SMTP session once per run
+        fs.close_mailer()
+    return report, html
+
+def measure(args):
+    workdir = tempfile.mkdtemp(prefix="flight-bench-")
+    cwd = os.getcwd()
+    try:
+        fs, amadeus, claude = load_pipeline(args, workdir)
+        from routes import RouteSpec
+        departure = date.today() + timedelta(days=60)
+        route = RouteSpec(
+            'TLV', 'KEF', departure.isoformat(), (departure + timedelta(days=5)).isoformat(),
+            departure_flex_days=args.flex, return_flex_days=args.flex,
+            max_results=args.offers, max_stops=args.segments - 1
+        )
+
+        timings = []
+        for _ in range(args.repeat):
+            recorder = StageRecorder()
+            report, html = run_pipeline(fs, route, recorder)
+            timings.append(recorder.results)
+
+        tracemalloc.start()
+        memory = StageRecorder(trace_memory=True)
+        run_pipeline(fs, route, memory)
+        tracemalloc.stop()
+    finally:
+        # Flush while still in workdir, the atexit flush would resolve the relative cache paths elsewhere
+        fs.cache.flush()
+        fs.summary_cache.flush()
+        fs.search_cache.flush()
+        os.chdir(cwd)
+
+    stages = {}
+    for name in (*STAGES, 'total'):
+        runs = [sum(t.values()) if name == 'total' else t[name] for t in timings]
+        warm = runs[1:] or runs
+        stages[name] = {
+            'cold_s': runs[0],
+            'warm_median_s': statistics.median(warm),
+            'warm_min_s': min(warm),
+        }
+        if name != 'total':
+            stages[name].update(memory.results[name])
+
+    return {
+        'meta': {
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'params': {
+                'offers': args.offers, 'segments': args.segments, 'airports': args.airports,
+                'flex': args.flex, 'repeat': args.repeat, 'seed': args.seed,
+                'backend_latency_ms': args.backend_latency_ms,
+            },
+        },
+        'workload': {
+            'searches_per_run': len(report['price_matrix']),
+            'offers_shown': len(report['flights']),
+            'email_chars': len(html),
+            'amadeus_calls': amadeus.calls,
+            'claude_calls': claude.calls,
+            'smtp_bytes': StubSMTP.sent_bytes,
+        },
+        'stages': stages,
+    }
+
+def compare(results, baseline, tolerance):
+    """Print the change per stage against a baseline, returns the regressed metrics"""
+    if baseline['meta']['params'] != results['meta']['params']:
+        print("Warning: baseline was recorded with different parameters", baseline['meta']['params'])
+
+    regressions = []
+    print(f"{'stage':<10} {'metric':<14} {'baseline':>12} {'current':>12} {'change':>8}")
+    for name, current in results['stages'].items():
+        previous = baseline['stages'].get(name)
+        if not previous:
+            continue
+        for metric in ('warm_median_s', 'peak_bytes'):
+            if metric not in current or not previous.get(metric):
+                continue
+            change = current[metric] / previous[metric] - 1
+            flag = " !" if change > tolerance else ""
+            print(f"{name:<10} {metric:<14} {previous[metric]:>12.6g} {current[metric]:>12.6g} {change:>+7.1%}{flag}")
+            if change > tolerance:
+                regressions.append(f"{name}.{metric}")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--offers', type=int, default=50, help="offers returned per search")
+    parser.add_argument('--segments', type=int, default=3, help="maximum segments per itinerary")
+    parser.add_argument('--airports', type=int, default=40, help="distinct airports connections are drawn from")
+    parser.add_argument('--flex', type=int, default=1, help="departure and return flex days")
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--backend-latency-ms', type=float, default=0, help="simulated latency of every stubbed call")
+    parser.add_argument('--output', help="write the results JSON to this file")
+    parser.add_argument('--save-baseline', help="also write the results as the baseline to this file")
+    parser.add_argument('--baseline', help="compare against this baseline JSON")
+    parser.add_argument('--tolerance', type=float, default=0.2, help="allowed slowdown before a stage counts as a regression")
+    args = parser.parse_args()
+
+    results = measure(args)
+    print(json.dumps(results, indent=2))
+
+    for path in (args.output, args.save_baseline):
+        if path:
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump(results, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        if regressions:
+            print(f"Regressions beyond {args.tolerance:.0%}: {', '.join(regressions)}")
+            sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+"""
+Track the cost of importing flight_search with python -X importtime.
+
+Each run imports the module in a fresh interpreter inside an empty temporary
+directory, so nothing is read from or written to the working tree. The
+median cumulative import time is checked against a budget, and the SDKs that
+are only needed once a run starts (amadeus, anthropic, numpy) must not be
+imported at all.
+
+Usage: python benchmarks/bench_startup.py [--module flight_search] [--runs 5] [--budget-ms 250] [--output startup.json]
+
+Exits with status 1 when the budget is exceeded or a deferred module was imported.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Imported on first use only, see get_amadeus(), get_claude_client() and prepare_route_report()
+DEFERRED_MODULES = ('amadeus', 'anthropic', 'numpy')
+
+def import_profile(module):
+    """Run one fresh import and parse its importtime output into {module: (self_us, cumulative_us)}"""
+    env = {**os.environ, 'PYTHONPATH': ROOT, 'PYTHONDONTWRITEBYTECODE': '1'}
+    with tempfile.TemporaryDirectory() as workdir:
+        result = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', f"import {module}"],
+            cwd=workdir, env=env, capture_output=True, text=True
+        )
+    if result.returncode != 0:
+        raise RuntimeError(f"Importing {module} failed:\n{result.stderr[-2000:]}")
+
+    profile = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        profile[name.strip()] = (int(self_us), int(cumulative_us))
+    return profile
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--module', default='flight_search')
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--budget-ms', type=float, default=250)
+    parser.add_argument('--top', type=int, default=15, help="slowest modules to list by self time")
+    parser.add_argument('--output', help="write the results JSON to this file")
+    args = parser.parse_args()
+
+    # The first import also warms the OS file cache, keep it out of the numbers
+    import_profile(args.module)
+    profiles = [import_profile(args.module) for _ in range(args.runs)]
+
+    cumulative_ms = [profile[args.module][1] / 1000 for profile in profiles]
+    last = profiles[-1]
+    slowest = sorted(last.items(), key=lambda item: item[1][0], reverse=True)[:args.top]
+    deferred_imported = sorted(
+        name for name in last
+        if name.split('.')[0] in DEFERRED_MODULES
+    )
+    top_level_deferred = sorted({name.split('.')[0] for name in deferred_imported})
+
+    results = {
+        'module': args.module,
+        'python': sys.version.split()[0],
+        'runs': args.runs,
+        'budget_ms': args.budget_ms,
+        'median_ms': statistics.median(cumulative_ms),
+        'min_ms': min(cumulative_ms),
+        'max_ms': max(cumulative_ms),
+        'modules_imported': len(last),
+        'deferred_modules_imported': top_level_deferred,
+        'slowest_self_ms': {name: self_us / 1000 for name, (self_us, _) in slowest},
+    }
+    print(json.dumps(results, indent=2))
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+
+    failures = []
+    if results['median_ms'] > args.budget_ms:
+        failures.append(f"median import time {results['median_ms']:.1f}ms is over the {args.budget_ms:.0f}ms budget")
+    if top_level_deferred:
+        failures.append(f"modules that should load lazily were imported: {', '.join(top_level_deferred)}")
+    if failures:
+        print("FAILED: " + "; ".join(failures))
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -1,71 +1,367 @@
+import atexit
 import json
 import os
 import logging
-from datetime import datetime, timedelta
+import sqlite3
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from config import CACHE_BACKEND, CACHE_TTL_DAYS, REFERENCE_INDEX_FILE
+from reference_index import ReferenceIndex
 
-class AirportAirlineCache:
-    def __init__(self, cache_file="airport_airline_cache.json"):
+AIRLINE_BATCH_SIZE = 20  # Airline codes per reference_data.airlines request
+
+def write_json_atomic(path, data):
+    """Write JSON to a temp file in the target directory, then rename it over path"""
+    directory = os.path.dirname(path) or '.'
+    os.makedirs(directory, exist_ok=True)
+
+    fd, tmp_path = tempfile.mkstemp(prefix='.' + os.path.basename(path) + '.', suffix='.tmp', dir=directory)
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(data, f, indent=2, ensure_ascii=False)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+def _load_json_cache(cache_file):
+    """Load the JSON cache document, or None if it is missing or unusable"""
+    if not os.path.exists(cache_file):
+        return None
+    try:
+        with open(cache_file, 'r', encoding='utf-8') as f:
+            cache_data = json.load(f)
+        # Check if cache is old format, migrate if needed
+        if 'airlines' not in cache_data or 'airports' not in cache_data:
+            logging.info("Migrating old cache format")
+            return None
+        return cache_data
+    except Exception as e:
+        logging.warning(f"Could not load cache file: {e}. Creating new cache.")
+        return None
+
+class JsonCacheStore:
+    """Reference data kept in memory and persisted as a single JSON document"""
+
+    def __init__(self, cache_file, write_back=True):
         self.cache_file = cache_file
+        self.write_back = write_back  # Batch changes in memory and flush once
         self.cache = self._load_cache()
-        self.cache_updated = False  # Track if cache was modified
-    
+        self._dirty = False
+
     def _load_cache(self):
         """Load cache from file or create new cache"""
-        if os.path.exists(self.cache_file):
-            try:
-                with open(self.cache_file, 'r', encoding='utf-8') as f:
-                    cache_data = json.load(f)
-                    # Check if cache is old format, migrate if needed
-                    if 'airlines' not in cache_data or 'airports' not in cache_data:
-                        logging.info("Migrating old cache format")
-                        return self._create_empty_cache()
-                    
-                    # Log cache restoration
-                    airlines_count = len(cache_data.get('airlines', {}))
-                    airports_count = len(cache_data.get('airports', {}))
-                    last_updated = cache_data.get('last_updated', 'unknown')
-                    logging.info(f"Cache restored: {airlines_count} airlines, {airports_count} airports (last updated: {last_updated})")
-                    
-                    return cache_data
-            except Exception as e:
-                logging.warning(f"Could not load cache file: {e}. Creating new cache.")
-                return self._create_empty_cache()
-        else:
-            logging.info("No existing cache found, creating new cache")
+        cache_data = _load_json_cache(self.cache_file)
+        if cache_data is None:
+            if not os.path.exists(self.cache_file):
+                logging.info("No existing cache found, creating new cache")
             return self._create_empty_cache()
-    
+
+        # Log cache restoration
+        airlines_count = len(cache_data.get('airlines', {}))
+        airports_count = len(cache_data.get('airports', {}))
+        last_updated = cache_data.get('last_updated', 'unknown')
+        logging.info(f"Cache restored: {airlines_count} airlines, {airports_count} airports (last updated: {last_updated})")
+        return cache_data
+
     def _create_empty_cache(self):
         """Create empty cache structure"""
         return {
-            'airlines': {}, 
-            'airports': {}, 
+            'airlines': {},
+            'airports': {},
+            'cities': {},
             'last_updated': datetime.now().isoformat(),
             'version': '1.0'
         }
-    
+
     def _save_cache(self):
-        """Save cache to file"""
+        """Save cache to file, returns True if it was written"""
         try:
             self.cache['last_updated'] = datetime.now().isoformat()
             self.cache['version'] = '1.0'
-            
-            # Create directory if it doesn't exist
-            os.makedirs(os.path.dirname(self.cache_file) if os.path.dirname(self.cache_file) else '.', exist_ok=True)
-            
-            with open(self.cache_file, 'w', encoding='utf-8') as f:
-                json.dump(self.cache, f, indent=2, ensure_ascii=False)
-            
+
+            write_json_atomic(self.cache_file, self.cache)
+
             logging.debug(f"Cache saved to {self.cache_file}")
-            self.cache_updated = True
-            
+            self._dirty = False
+            return True
+
         except Exception as e:
             logging.error(f"Could not save cache: {e}")
-    
+            return False
+
+    def get(self, section, code):
+        return self.cache.get(section, {}).get(code)
+
+    def get_many(self, section, codes):
+        entries = self.cache.get(section, {})
+        return {code: entries[code] for code in codes if code in entries}
+
+    def set(self, section, code, name):
+        """Store an entry, returns True if the cache changed"""
+        # Caches written before a section existed do not have it yet
+        entries = self.cache.setdefault(section, {})
+        if entries.get(code) == name:
+            return False
+        entries[code] = name
+        self._dirty = True
+        if not self.write_back:
+            return self._save_cache()
+        return True
+
+    def count(self, section):
+        return len(self.cache.get(section, {}))
+
+    def last_updated(self):
+        return self.cache['last_updated']
+
+    def flush(self):
+        """Write pending changes to disk, returns True if anything was written"""
+        if not self._dirty:
+            return False
+        return self._save_cache()
+
+class SqliteCacheStore:
+    """
+    Reference data in a SQLite database with per-entry refresh timestamps.
+
+    Entries older than ttl_days are treated as misses so they get refreshed
+    from the API. On first use an existing JSON cache is migrated into the
+    database.
+    """
+
+    def __init__(self, db_file, json_file=None, ttl_days=None, write_back=True):
+        self.db_file = db_file
+        self.ttl_seconds = ttl_days * 86400 if ttl_days else None
+        self.write_back = write_back  # Commit once on flush instead of per entry
+        self._dirty = False
+
+        directory = os.path.dirname(db_file)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.conn = sqlite3.connect(db_file, check_same_thread=False)
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS entries (
+                section TEXT NOT NULL,
+                code TEXT NOT NULL,
+                name TEXT NOT NULL,
+                updated_at REAL NOT NULL,
+                PRIMARY KEY (section, code)
+            ) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS meta (
+                key TEXT PRIMARY KEY,
+                value TEXT
+            );
+        """)
+        self.conn.commit()
+
+        if json_file:
+            self._migrate_json(json_file)
+
+        logging.info(
+            f"Cache restored from {db_file}: {self.count('airlines')} airlines, "
+            f"{self.count('airports')} airports (last updated: {self.last_updated()})"
+        )
+
+    def _migrate_json(self, json_file):
+        """One-time import of the legacy JSON cache"""
+        if self._get_meta('migrated_from_json'):
+            return
+        cache_data = _load_json_cache(json_file)
+        if cache_data:
+            now = time.time()
+            rows = [
+                (section, code, name, now)
+                for section in ('airlines', 'airports', 'cities')
+                for code, name in cache_data.get(section, {}).items()
+            ]
+            self.conn.executemany("INSERT OR IGNORE INTO entries VALUES (?, ?, ?, ?)", rows)
+            self._set_meta('last_updated', cache_data.get('last_updated', datetime.now().isoformat()))
+            logging.info(f"Migrated {len(rows)} entries from {json_file} to {self.db_file}")
+        self._set_meta('migrated_from_json', datetime.now().isoformat())
+        self.conn.commit()
+
+    def _get_meta(self, key):
+        row = self.conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def _set_meta(self, key, value):
+        self.conn.execute("INSERT OR REPLACE INTO meta VALUES (?, ?)", (key, value))
+
+    def _is_fresh(self, updated_at):
+        return self.ttl_seconds is None or time.time() - updated_at <= self.ttl_seconds
+
+    def get(self, section, code):
+        row = self.conn.execute(
+            "SELECT name, updated_at FROM entries WHERE section = ? AND code = ?", (section, code)
+        ).fetchone()
+        if row and self._is_fresh(row[1]):
+            return row[0]
+        return None
+
+    def get_many(self, section, codes):
+        codes = list(dict.fromkeys(codes))
+        found = {}
+        # Stay well below SQLite's bound-parameter limit
+        for start in range(0, len(codes), 500):
+            chunk = codes[start:start + 500]
+            placeholders = ",".join("?" * len(chunk))
+            rows = self.conn.execute(
+                f"SELECT code, name, updated_at FROM entries WHERE section = ? AND code IN ({placeholders})",
+                [section, *chunk]
+            )
+            for code, name, updated_at in rows:
+                if self._is_fresh(updated_at):
+                    found[code] = name
+        return found
+
+    def set(self, section, code, name):
+        """Store or refresh an entry, returns True if the cache changed"""
+        # A fresh entry with the same name needs no write, a stale one gets its timestamp renewed
+        if self.get(section, code) == name:
+            return False
+        try:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?)", (section, code, name, time.time())
+            )
+            self._set_meta('last_updated', datetime.now().isoformat())
+        except sqlite3.Error as e:
+            logging.error(f"Could not store {section} {code} in {self.db_file}: {e}")
+            return False
+        self._dirty = True
+        if not self.write_back:
+            return self.flush()
+        return True
+
+    def count(self, section):
+        return self.conn.execute("SELECT COUNT(*) FROM entries WHERE section = ?", (section,)).fetchone()[0]
+
+    def last_updated(self):
+        return self._get_meta('last_updated') or 'unknown'
+
+    def flush(self):
+        """Commit pending changes, returns True if anything was written"""
+        if not self._dirty:
+            return False
+        try:
+            self.conn.commit()
+        except sqlite3.Error as e:
+            logging.error(f"Could not commit cache to {self.db_file}: {e}")
+            self.conn.rollback()
+            self._dirty = False
+            return False
+        self._dirty = False
+        logging.debug(f"Cache committed to {self.db_file}")
+        return True
+
+def create_cache_store(backend, cache_file, ttl_days=None, write_back=True):
+    """Build the storage backend for AirportAirlineCache"""
+    if backend == 'json':
+        return JsonCacheStore(cache_file, write_back=write_back)
+    if backend == 'sqlite':
+        db_file = os.path.splitext(cache_file)[0] + '.db'
+        return SqliteCacheStore(db_file, json_file=cache_file, ttl_days=ttl_days, write_back=write_back)
+    raise ValueError(f"Unknown cache backend: {backend}")
+
+class AirportAirlineCache:
+    def __init__(self, cache_file="airport_airline_cache.json", write_back=True, backend=CACHE_BACKEND, ttl_days=CACHE_TTL_DAYS,
+                 reference_index=REFERENCE_INDEX_FILE):
+        self.cache_file = cache_file
+        self.write_back = write_back  # Batch changes in memory and flush once
+        self.backend = backend
+        self.ttl_days = ttl_days
+        # The store is opened on first use, so importing this module reads nothing from disk
+        self._store_instance = None if isinstance(backend, str) else backend
+        self._store_lock = threading.Lock()
+        self.cache_updated = False  # Track if cache was modified
+        self.stats_sources = {}  # Other caches reported alongside this one
+        # Bundled names, consulted between the cache and the API; mapped on first use
+        self.reference = ReferenceIndex(reference_index) if isinstance(reference_index, str) else reference_index
+        self.hits = 0
+        self.misses = 0
+        self.reference_hits = 0
+        self._lock = threading.Lock()
+        if write_back:
+            atexit.register(self.flush)
+
+    @property
+    def store(self):
+        """The storage backend, loaded on first access"""
+        if self._store_instance is None:
+            with self._store_lock:
+                if self._store_instance is None:
+                    self._store_instance = create_cache_store(
+                        self.backend, self.cache_file, ttl_days=self.ttl_days, write_back=self.write_back
+                    )
+        return self._store_instance
+
+    @property
+    def loaded(self):
+        return self._store_instance is not None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.flush()
+        return False
+
+    def _store(self, section, code, name):
+        """Record a new cache entry and persist it according to the write mode"""
+        with self._lock:
+            if self.store.set(section, code, name):
+                self.cache_updated = True
+
+    def _lookup(self, section, code):
+        with self._lock:
+            name = self.store.get(section, code)
+            self._count_lookups(hits=int(name is not None), misses=int(name is None))
+            return name
+
+    def get_many(self, section, codes):
+        """Bulk cache lookup, returns {code: name} for the codes that are cached"""
+        codes = list(dict.fromkeys(codes))
+        with self._lock:
+            found = self.store.get_many(section, codes)
+            self._count_lookups(hits=len(found), misses=len(codes) - len(found))
+            return found
+
+    def _count_lookups(self, hits, misses):
+        self.hits += hits
+        self.misses += misses
+
+    def _reference_name(self, section, code):
+        """Value from the bundled reference index, or None"""
+        if self.reference is None:
+            return None
+        name = self.reference.lookup(section, code)
+        if name is not None:
+            with self._lock:
+                self.reference_hits += 1
+        return name
+
+    def flush(self):
+        """Write pending cache changes to disk, if any"""
+        if not self.loaded:
+            return
+        with self._lock:
+            if self.store.flush():
+                logging.info(f"Cache flushed ({type(self.store).__name__})")
+
     def get_airline_name(self, carrier_code, amadeus_client=None):
-        """Get airline name from cache or API"""
-        if carrier_code in self.cache['airlines']:
+        """Get airline name from cache, the reference index or API"""
+        cached_name = self._lookup('airlines', carrier_code)
+        if cached_name is not None:
             logging.debug(f"Airline {carrier_code} found in cache")
-            return self.cache['airlines'][carrier_code]
+            return cached_name
+
+        reference_name = self._reference_name('airlines', carrier_code)
+        if reference_name is not None:
+            return reference_name
         
         # Try API if client provided
         if amadeus_client:
@@ -74,130 +370,205 @@ class AirportAirlineCache:
                 if response.data:
                     airline_name = response.data[0]['businessName']
                     # Cache the result
-                    self.cache['airlines'][carrier_code] = airline_name
-                    self._save_cache()
+                    self._store('airlines', carrier_code, airline_name)
                     logging.info(f"Cached new airline {carrier_code}: {airline_name}")
                     return airline_name
             except Exception as e:
                 logging.debug(f"Could not fetch airline {carrier_code} from API: {e}")
         
-        # Fallback to static mapping
         return self._get_airline_fallback(carrier_code)
     
     def get_airport_name(self, airport_code, amadeus_client=None):
-        """Get airport name from cache or API"""
-        if airport_code in self.cache['airports']:
+        """Get airport name from cache, the reference index or API"""
+        cached_name = self._lookup('airports', airport_code)
+        if cached_name is not None:
             logging.debug(f"Airport {airport_code} found in cache")
-            return self.cache['airports'][airport_code]
+            return cached_name
+
+        reference_name = self._reference_name('airports', airport_code)
+        if reference_name is not None:
+            return reference_name
         
         # Try API if client provided
         if amadeus_client:
-            try:
-                response = amadeus_client.reference_data.locations.get(
-                    keyword=airport_code,
-                    subType='AIRPORT'
-                )
-                if response.data:
-                    for location in response.data:
-                        if location['iataCode'] == airport_code:
-                            airport_name = location['name']
-                            # Cache the result
-                            self.cache['airports'][airport_code] = airport_name
-                            self._save_cache()
-                            logging.info(f"Cached new airport {airport_code}: {airport_name}")
-                            return airport_name
-            except Exception as e:
-                logging.debug(f"Could not fetch airport {airport_code} from API: {e}")
+            airport_name = self._fetch_airport_name(airport_code, amadeus_client)
+            if airport_name:
+                return airport_name
         
-        # Fallback to static mapping
         return self._get_airport_fallback(airport_code)
     
+    def _fetch_airport_name(self, airport_code, amadeus_client):
+        """Look up one airport through the API and cache it, returns None if not found"""
+        try:
+            response = amadeus_client.reference_data.locations.get(
+                keyword=airport_code,
+                subType='AIRPORT'
+            )
+            for location in response.data or []:
+                if location['iataCode'] == airport_code:
+                    airport_name = location['name']
+                    # Cache the result
+                    self._store('airports', airport_code, airport_name)
+                    logging.info(f"Cached new airport {airport_code}: {airport_name}")
+                    return airport_name
+        except Exception as e:
+            logging.debug(f"Could not fetch airport {airport_code} from API: {e}")
+        return None
+
+    def get_city_airports(self, code, amadeus_client=None):
+        """
+        Member airports of a city or metro code, busiest first, e.g. NYC → JFK, EWR, LGA.
+
+        An airport code resolves to itself, and so does a code neither the
+        reference index nor the API knows. API resolutions are cached in the
+        'cities' section, failed lookups are not.
+        """
+        cached = self._lookup('cities', code)
+        if cached is not None:
+            return cached.split(',')
+        reference_airports = self._reference_name('cities', code)
+        if reference_airports is not None:
+            return reference_airports.split(',')
+        if amadeus_client:
+            airports = self._fetch_city_airports(code, amadeus_client)
+            if airports:
+                return airports
+        return [code]
+
+    def _fetch_city_airports(self, code, amadeus_client):
+        """Resolve a code through the locations API and cache it, returns None if the call failed"""
+        try:
+            response = amadeus_client.reference_data.locations.get(keyword=code, subType='CITY,AIRPORT')
+        except Exception as e:
+            logging.debug(f"Could not resolve city code {code} from API: {e}")
+            return None
+
+        locations = response.data or []
+        members = []
+        for location in locations:
+            if location.get('subType') != 'AIRPORT':
+                continue
+            if location.get('iataCode') == code:
+                # Already an airport, nothing to expand
+                members = []
+                break
+            if location.get('address', {}).get('cityCode') == code:
+                members.append(location)
+
+        members.sort(key=lambda location: location.get('analytics', {}).get('travelers', {}).get('score', 0), reverse=True)
+        airports = [location['iataCode'] for location in members] or [code]
+        # The names come with the response, later airport lookups become cache hits
+        for location in members:
+            self._store('airports', location['iataCode'], location['name'])
+        for location in locations:
+            if airports != [code] and location.get('subType') == 'CITY' and location.get('iataCode') == code:
+                self._store('airports', code, location['name'])
+        self._store('cities', code, ",".join(airports))
+        if airports != [code]:
+            logging.info(f"Cached city {code}: {', '.join(airports)}")
+        return airports
+
+    def _fetch_airline_names(self, carrier_codes, amadeus_client):
+        """Look up many airlines with one API call per batch and cache them"""
+        found = {}
+        for start in range(0, len(carrier_codes), AIRLINE_BATCH_SIZE):
+            batch = carrier_codes[start:start + AIRLINE_BATCH_SIZE]
+            try:
+                response = amadeus_client.reference_data.airlines.get(airlineCodes=",".join(batch))
+                for airline in response.data or []:
+                    code = airline.get('iataCode')
+                    name = airline.get('businessName') or airline.get('commonName')
+                    if code in batch and name:
+                        self._store('airlines', code, name)
+                        found[code] = name
+                logging.info(f"Fetched {len(batch)} airlines in one API call, {len(found)} resolved so far")
+            except Exception as e:
+                logging.debug(f"Could not fetch airlines {batch} from API: {e}")
+        return found
+
+    def prefetch(self, airline_codes=(), airport_codes=(), amadeus_client=None, max_workers=4):
+        """
+        Resolve every airline and airport code up front.
+
+        Cache hits are read with one bulk lookup and misses are looked up in
+        the reference index. Airlines it does not know are fetched in batched
+        API calls and airports concurrently with at most max_workers requests
+        in flight. Codes that are still unknown get a generic name. Returns
+        (airline_names, airport_names) dicts covering every requested code, so
+        callers can render without further lookups.
+        """
+        airline_codes = sorted(set(airline_codes))
+        airport_codes = sorted(set(airport_codes))
+
+        airline_names = self.get_many('airlines', airline_codes)
+        airport_names = self.get_many('airports', airport_codes)
+
+        airline_misses = [code for code in airline_codes if code not in airline_names]
+        airport_misses = [code for code in airport_codes if code not in airport_names]
+        logging.info(
+            f"Prefetch: {len(airline_codes) - len(airline_misses)}/{len(airline_codes)} airlines and "
+            f"{len(airport_codes) - len(airport_misses)}/{len(airport_codes)} airports already cached"
+        )
+
+        for code in airline_misses:
+            name = self._reference_name('airlines', code)
+            if name is not None:
+                airline_names[code] = name
+        for code in airport_misses:
+            name = self._reference_name('airports', code)
+            if name is not None:
+                airport_names[code] = name
+        airline_misses = [code for code in airline_misses if code not in airline_names]
+        airport_misses = [code for code in airport_misses if code not in airport_names]
+
+        if amadeus_client and airline_misses:
+            airline_names.update(self._fetch_airline_names(airline_misses, amadeus_client))
+
+        if amadeus_client and airport_misses:
+            workers = max(1, min(max_workers, len(airport_misses)))
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="airport-lookup") as executor:
+                fetched = executor.map(lambda code: self._fetch_airport_name(code, amadeus_client), airport_misses)
+                for code, name in zip(airport_misses, fetched):
+                    if name:
+                        airport_names[code] = name
+
+        for code in airline_codes:
+            if code not in airline_names:
+                airline_names[code] = self._get_airline_fallback(code)
+        for code in airport_codes:
+            if code not in airport_names:
+                airport_names[code] = self._get_airport_fallback(code)
+
+        return airline_names, airport_names
+
     def _get_airline_fallback(self, carrier_code):
-        """Static airline mapping as fallback"""
-        airline_names = {
-            'LH': 'Lufthansa', 'BA': 'British Airways', 'AF': 'Air France',
-            'KL': 'KLM Royal Dutch Airlines', 'TK': 'Turkish Airlines', 'EK': 'Emirates',
-            'QR': 'Qatar Airways', 'LY': 'El Al Israel Airlines', 'W6': 'Wizz Air',
-            'FR': 'Ryanair', 'U2': 'easyJet', 'OS': 'Austrian Airlines',
-            'LX': 'Swiss International Air Lines', 'SN': 'Brussels Airlines',
-            'AY': 'Finnair', 'SK': 'Scandinavian Airlines', 'IB': 'Iberia',
-            'VY': 'Vueling', 'TP': 'TAP Air Portugal', 'UX': 'Air Europa',
-            'DL': 'Delta Air Lines', 'AA': 'American Airlines', 'UA': 'United Airlines',
-            'AC': 'Air Canada', 'VS': 'Virgin Atlantic', 'WF': 'Widerøe',
-            'FI': 'Icelandair', '6H': 'Israir Airlines', 'UP': 'Bahamasair',
-            'EL': 'El Al Israel Airlines'  # Added EL Al alternative code
-        }
-        name = airline_names.get(carrier_code, f"{carrier_code} Airlines")
-        
-        # Only cache fallback if it's a known airline
-        if carrier_code in airline_names:
-            self.cache['airlines'][carrier_code] = name
-            self._save_cache()
-            logging.debug(f"Cached fallback airline {carrier_code}: {name}")
-        
-        return name
-    
+        """Generic name for an airline the cache, reference index and API do not know"""
+        return f"{carrier_code} Airlines"
+
     def _get_airport_fallback(self, airport_code):
-        """Static airport mapping as fallback"""
-        airport_names = {
-            'TLV': 'Ben Gurion Airport, Tel Aviv', 
-            'KEF': 'Keflavik International Airport, Reykjavik',
-            'LHR': 'Heathrow Airport, London', 
-            'CDG': 'Charles de Gaulle Airport, Paris',
-            'FRA': 'Frankfurt Airport, Frankfurt', 
-            'AMS': 'Amsterdam Schiphol Airport, Amsterdam',
-            'IST': 'Istanbul Airport, Istanbul', 
-            'DXB': 'Dubai International Airport, Dubai',
-            'DOH': 'Hamad International Airport, Doha', 
-            'VIE': 'Vienna International Airport, Vienna',
-            'ZUR': 'Zurich Airport, Zurich', 
-            'BRU': 'Brussels Airport, Brussels', 
-            'HEL': 'Helsinki Airport, Helsinki',
-            'ARN': 'Stockholm Arlanda Airport, Stockholm', 
-            'MAD': 'Madrid-Barajas Airport, Madrid',
-            'BCN': 'Barcelona Airport, Barcelona', 
-            'LIS': 'Lisbon Airport, Lisbon',
-            'JFK': 'John F. Kennedy International Airport, New York',
-            'LAX': 'Los Angeles International Airport, Los Angeles',
-            'ORD': 'O\'Hare International Airport, Chicago',
-            'CPH': 'Copenhagen Airport, Copenhagen',
-            'OSL': 'Oslo Airport, Oslo',
-            'MUC': 'Munich Airport, Munich',
-            'FCO': 'Leonardo da Vinci Airport, Rome'
-        }
-        name = airport_names.get(airport_code, f"{airport_code} Airport")
-        
-        # Only cache fallback if it's a known airport
-        if airport_code in airport_names:
-            self.cache['airports'][airport_code] = name
-            self._save_cache()
-            logging.debug(f"Cached fallback airport {airport_code}: {name}")
-        
-        return name
-    
+        """Generic name for an airport the cache, reference index and API do not know"""
+        return f"{airport_code} Airport"
+
+    def register_stats_source(self, name, source):
+        """Include another cache's get_cache_stats() output in this cache's stats"""
+        self.stats_sources[name] = source
+
     def get_cache_stats(self):
         """Get cache statistics"""
-        return {
-            'airlines_cached': len(self.cache['airlines']),
-            'airports_cached': len(self.cache['airports']),
-            'last_updated': self.cache['last_updated'],
-            'cache_updated_this_run': self.cache_updated
-        }
-    
-    def preload_common_data(self):
-        """Preload common airports and airlines to reduce API calls"""
-        common_airlines = ['LH', 'BA', 'AF', 'KL', 'TK', 'EK', 'QR', 'LY', 'W6', 'FR', 'U2', 'OS', 'LX', 'SN', 'AY', 'SK', 'FI', 'EL']
-        common_airports = ['TLV', 'KEF', 'LHR', 'CDG', 'FRA', 'AMS', 'IST', 'DXB', 'VIE', 'ZUR', 'CPH', 'OSL']
-        
-        for airline in common_airlines:
-            if airline not in self.cache['airlines']:
-                self._get_airline_fallback(airline)
-        
-        for airport in common_airports:
-            if airport not in self.cache['airports']:
-                self._get_airport_fallback(airport)
-        
-        logging.info("Preloaded common airport and airline data")
+        with self._lock:
+            stats = {
+                'airlines_cached': self.store.count('airlines'),
+                'airports_cached': self.store.count('airports'),
+                'cities_cached': self.store.count('cities'),
+                'last_updated': self.store.last_updated(),
+                'cache_updated_this_run': self.cache_updated,
+                'hits': self.hits,
+                'misses': self.misses,
+                'reference_hits': self.reference_hits
+            }
+        for name, source in self.stats_sources.items():
+            stats[name] = source.get_cache_stats()
+        return stats
 
 # Global cache instance
 cache = AirportAirlineCache()
@@ -5,7 +5,95 @@ ORIGIN = "TLV"             # city or airport code
 DESTINATION = "KEF"        # city or airport code
 DEPARTURE_DATE = "2026-08-11"
 RETURN_DATE = "2026-08-12"
-ALLOW_DEPARTURE_NEXT_DAY = True   # Search departure date +1 day
-ALLOW_RETURN_NEXT_DAY = True      # Search return date +1 day
-MAX_RESULTS = 20
-MAX_STOPS = 2              # Maximum number of stops (0=direct only, 1=max 1 stop, 2=max 2 stops, etc.)
+DEPARTURE_FLEX_DAYS = 1    # Search departure date ±N days
+RETURN_FLEX_DAYS = 1       # Search return date ±N days
+MIN_STAY_DAYS = 0          # Minimum nights between departure and return
+MAX_STAY_DAYS = 14         # Maximum nights between departure and return (None = no limit)
+MAX_DATE_COMBINATIONS = 50 # Maximum number of date combinations searched per run
+MAX_RESULTS = 20           # Offers requested per date combination
+TOP_OFFERS = 10            # Offers kept for the summary and email after de-duplication
+RANK_BY = "price"          # "price", "duration" or "score" (weighted by RANK_WEIGHTS)
+RANK_WEIGHTS = {"price": 0.6, "duration": 0.3, "stops": 0.1}  # Also used for the "best value" pick
+USE_AI_NARRATIVE = True    # Add a Claude narrative on top of the local cheapest/fastest/best value analysis
+SUMMARY_CACHE_TTL_HOURS = 36     # Reuse a Claude narrative for identical results within this window, longer than the daily run interval
+SUMMARY_CACHE_MAX_ENTRIES = 200  # Least recently used narratives are evicted beyond this
+SEARCH_CACHE_TTL_MINUTES = 30    # Reuse identical flight searches within this window, fares go stale quickly (0 = off)
+SEARCH_CACHE_MAX_ENTRIES = 300   # Least recently used search responses are evicted beyond this
+MAX_STOPS = 2              # Maximum number of stops each way (0=direct only, 1=max 1 stop, 2=max 2 stops, etc.)
+MIN_CONNECTION_MINUTES = 60  # Layovers shorter than this are flagged as risky connections
+MIN_CONNECTION_MINUTES_BY_AIRPORT = {}  # Per connecting airport, e.g. {"LHR": 90, "CDG": 90}
+MAX_CONCURRENT_SEARCHES = 4  # Number of date combinations searched in parallel
+MAX_CONCURRENT_LOOKUPS = 4   # Number of airport name lookups run in parallel
+EXPAND_CITY_CODES = True     # Search a city code (NYC, LON) as every pair of its member airports
+MAX_AIRPORTS_PER_CITY = 3    # Busiest member airports searched per city code
+
+# Reference data cache settings
+CACHE_BACKEND = "json"     # "json" (single JSON file) or "sqlite" (indexed, with per-entry expiry)
+CACHE_TTL_DAYS = 90        # Refresh cached airport/airline names after N days (sqlite backend, None = never)
+REFERENCE_INDEX_FILE = "reference_data/iata_index.bin"  # Bundled airline/airport/city names, used before the API (None = off)
+
+# Watchlist: search several routes in one run, sharing one Amadeus client, cache and SMTP session.
+# Each entry needs origin and destination and may override any of the settings above
+# (departure_date, return_date, departure_flex_days, return_flex_days, min_stay_days,
+# max_stay_days, max_date_combinations, max_results, max_stops).
+# "recipients" (a list or comma separated string) sends a route to those addresses
+# instead of EMAIL_RECEIVER; in the combined report every recipient gets one digest
+# of their own routes.
+# Leave empty to search only ORIGIN → DESTINATION.
+WATCHLIST = [
+    # {"origin": "TLV", "destination": "LHR", "departure_date": "2026-09-01", "return_date": "2026-09-08"},
+]
+WATCHLIST_REPORT = "combined"  # "combined" (one email for all routes) or "per_route" (one email per route)
+
+# Email delivery settings, the SMTP_HOST, SMTP_PORT and SMTP_SECURITY environment variables override these
+SMTP_HOST = "smtp.gmail.com"
+SMTP_PORT = 465
+SMTP_SECURITY = "ssl"               # "ssl" (implicit TLS), "starttls" or "none" (local test servers)
+SMTP_TIMEOUT_SECONDS = 30
+SMTP_MAX_RETRIES = 3                # Reconnect and retry per email for disconnects, timeouts and 4xx replies
+SMTP_BACKOFF_BASE_SECONDS = 2.0     # Jittered exponential backoff between retries
+EMAIL_QUEUE_DIR = "email_queue"     # Emails that could not be sent wait here and go out first on the next run
+EMAIL_QUEUE_MAX_AGE_HOURS = 72      # Queued emails older than this are dropped
+
+# Amadeus API settings
+AMADEUS_ENVIRONMENT = "test"        # "test" (10 calls/s) or "production" (40 calls/s), sets the client-side rate limit
+AMADEUS_MAX_RETRIES = 4             # Retries for rate-limited (429), server and network errors
+AMADEUS_BACKOFF_BASE_SECONDS = 0.5  # Jittered exponential backoff, unless the API sends Retry-After
+AMADEUS_BACKOFF_MAX_SECONDS = 20
+
+# Price history settings
+PRICE_HISTORY_FILE = "price_history.db"  # Every run's offers are recorded here
+PRICE_DROP_THRESHOLD_PCT = 5             # Report price drops of at least this many percent
+EMAIL_CHANGES_ONLY = True                # Show only new and cheaper offers once a previous run exists
+
+# Price alerts: a route's report (Claude narrative, email) is only built and sent when one of
+# these rules fires, or when its digest is due. Rules:
+#   {"rule": "price_below", "price": 450}     an offer cheaper than price
+#   {"rule": "price_drop", "percent": 10}     an itinerary at least percent cheaper than in the previous run
+#   {"rule": "new_direct"}                    a direct flight the previous run did not offer
+#   {"rule": "duration_under", "hours": 6}    an offer with a total travel time under hours
+# An empty list sends every run. Watchlist entries can set their own "alert_rules".
+ALERT_RULES = [
+    {"rule": "price_drop", "percent": 10},
+    {"rule": "new_direct"},
+]
+DIGEST_EVERY_DAYS = 7                    # Send the full report at least this often without alerts (None = alerts only)
+
+# Fare analytics settings
+FARE_STATS_WINDOW_DAYS = 30              # Min/median/percentiles cover this many recent days
+FARE_MIN_OBSERVATIONS = 3                # Observations a date combination needs before a buy/wait signal
+FARE_HISTORY_DAYS = 365                  # History loaded for the days-before-departure curve
+
+# Offline mode: set the AMADEUS_MODE environment variable to "record" to save
+# every Amadeus response, or to "replay" to run without network or credentials
+AMADEUS_FIXTURES_DIR = "fixtures/amadeus"  # Where recorded responses are stored
+REPLAY_LATENCY_MS = 0                      # Simulated response time per replayed call
+REPLAY_LATENCY_JITTER_MS = 0               # Random +/- variation of the simulated response time
+REPLAY_ERROR_RATE = 0.0                    # Fraction of replayed calls that fail with 429/500/503
+REPLAY_SEED = None                         # Set for repeatable injected latency and failures
+OFFLINE_OUTBOX_DIR = "outbox"              # Replay runs without email credentials write emails here
+REPLAY_STATE_DIR = "replay_state"          # Replay runs keep their price history, caches, metrics and email queue here
+
+# Metrics settings
+METRICS_FILE = "run_metrics.json"        # Spans, counters and cache/API stats of the last run
+PROMETHEUS_TEXTFILE = None               # e.g. "/var/lib/node_exporter/textfile_collector/flight_search.prom"
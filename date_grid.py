@@ -0,0 +1,99 @@
+import logging
+from datetime import datetime, timedelta
+
+DATE_FORMAT = "%Y-%m-%d"
+
+def _parse_date(date_str):
+    return datetime.strptime(date_str, DATE_FORMAT).date()
+
+def _date_window(center, flex_days):
+    """All dates within ±flex_days of center, in ascending order"""
+    return [center + timedelta(days=offset) for offset in range(-flex_days, flex_days + 1)]
+
+def build_date_grid(departure_date, return_date, departure_flex_days=0, return_flex_days=0,
+                    min_stay_days=0, max_stay_days=None, today=None, price_hints=None, max_cells=None):
+    """
+    Build the list of (departure_date, return_date) cells to search.
+
+    Invalid cells are pruned before any API call is made: departures in the
+    past, returns before departure and stays outside [min_stay_days, max_stay_days].
+    The remaining cells are scheduled cheapest-first: cells with a known price
+    hint come first in ascending price order, followed by the rest ordered by
+    their distance from the requested dates. If max_cells is set, only the
+    first max_cells cells are kept.
+    """
+    requested_dep = _parse_date(departure_date)
+    requested_ret = _parse_date(return_date)
+    today = today or datetime.now().date()
+    price_hints = price_hints or {}
+
+    return_window = _date_window(requested_ret, return_flex_days)
+    cells = []
+    pruned = {'past': 0, 'return_before_departure': 0, 'stay_out_of_range': 0}
+    for dep in _date_window(requested_dep, departure_flex_days):
+        if dep < today:
+            pruned['past'] += len(return_window)
+            continue
+        for ret in return_window:
+            stay = (ret - dep).days
+            if stay < 0:
+                pruned['return_before_departure'] += 1
+                continue
+            if stay < min_stay_days or (max_stay_days is not None and stay > max_stay_days):
+                pruned['stay_out_of_range'] += 1
+                continue
+            cells.append((dep.strftime(DATE_FORMAT), ret.strftime(DATE_FORMAT)))
+
+    def schedule_key(cell):
+        dep, ret = cell
+        distance = abs((_parse_date(dep) - requested_dep).days) + abs((_parse_date(ret) - requested_ret).days)
+        hint = price_hints.get(cell)
+        # Cells with a known price sort before unknown ones, cheapest first
+        return (hint is None, hint if hint is not None else 0, distance, dep, ret)
+
+    cells.sort(key=schedule_key)
+
+    total = len(cells) + sum(pruned.values())
+    logging.info(
+        f"Date grid: {total} cells, pruned {pruned['past']} in the past, "
+        f"{pruned['return_before_departure']} with return before departure, "
+        f"{pruned['stay_out_of_range']} outside the stay range"
+    )
+
+    if max_cells is not None and len(cells) > max_cells:
+        logging.info(f"Limiting date grid to the {max_cells} most promising of {len(cells)} cells")
+        cells = cells[:max_cells]
+
+    return cells
+
+def build_price_matrix(search_results):
+    """
+    Build a departure × return price matrix from run_searches_async results.
+
+    Returns a dict mapping (departure_date, return_date) to the best fare found
+    for that cell, or None when the search returned no flights. Several results
+    for the same cell, e.g. one per airport pair of a city code, are merged.
+    """
+    matrix = {}
+    for result in search_results:
+        cell = (result['departure_date'], result['return_date'])
+        best = matrix.get(cell)
+        for flight in result['flights']:
+            price = float(flight.price)
+            if best is None or price < best:
+                best = price
+        matrix[cell] = best
+    return matrix
+
+def matrix_axes(price_matrix):
+    """Sorted departure and return dates covered by a price matrix"""
+    departure_dates = sorted({dep for dep, _ in price_matrix})
+    return_dates = sorted({ret for _, ret in price_matrix})
+    return departure_dates, return_dates
+
+def cheapest_cell(price_matrix):
+    """The (departure_date, return_date) cell with the lowest fare, or None"""
+    priced = [(price, cell) for cell, price in price_matrix.items() if price is not None]
+    if not priced:
+        return None
+    return min(priced)[1]
@@ -1,94 +1,143 @@
 from datetime import datetime
-import logging
-import re
 from cache_manager import cache
+from config import MAX_CONCURRENT_LOOKUPS
+from metrics import metrics
 
-def _format_datetime(dt_str):
-    """Format ISO datetime to readable format"""
-    try:
-        dt = datetime.fromisoformat(dt_str.replace('Z', '+00:00'))
-        return dt.strftime("%a, %b %d - %H:%M")
-    except Exception:
-        return dt_str
+# Disappeared offers are listed for context only, the rest are summarized in one line
+MAX_DISAPPEARED_SHOWN = 5
 
-def _format_duration(duration_str):
-    """Convert PT4H30M to '4h 30m' format"""
-    try:
-        duration_str = duration_str.replace('PT', '')
-        
-        hours = 0
-        minutes = 0
-        
-        hour_match = re.search(r'(\d+)H', duration_str)
-        if hour_match:
-            hours = int(hour_match.group(1))
-        
-        min_match = re.search(r'(\d+)M', duration_str)
-        if min_match:
-            minutes = int(min_match.group(1))
-        
-        if hours and minutes:
-            return f"{hours}h {minutes}m"
-        elif hours:
-            return f"{hours}h"
-        elif minutes:
-            return f"{minutes}m"
-        else:
-            return duration_str
-    except Exception:
-        return duration_str
+def _format_datetime(dt):
+    """Format a parsed datetime to readable format"""
+    return dt.strftime("%a, %b %d - %H:%M")
 
-def _calculate_layover_duration(arrival_time, departure_time):
-    """Calculate layover duration between two flights"""
+def _format_short_date(date_str):
+    """Format YYYY-MM-DD to 'Tue, Aug 11'"""
     try:
-        arr_dt = datetime.fromisoformat(arrival_time.replace('Z', '+00:00'))
-        dep_dt = datetime.fromisoformat(departure_time.replace('Z', '+00:00'))
-        
-        layover_duration = dep_dt - arr_dt
-        total_minutes = int(layover_duration.total_seconds() / 60)
-        
-        hours = total_minutes // 60
-        minutes = total_minutes % 60
-        
-        if hours and minutes:
-            return f"{hours}h {minutes}m"
-        elif hours:
-            return f"{hours}h"
-        elif minutes:
-            return f"{minutes}m"
-        else:
-            return "0m"
+        return datetime.strptime(date_str, "%Y-%m-%d").strftime("%a, %b %d")
     except Exception:
-        return "Unknown"
+        return date_str
 
-def _get_stop_information(segments):
-    """Extract detailed stop information from flight segments"""
-    if len(segments) <= 1:
-        return []
+def _format_duration(total_minutes):
+    """Convert a duration in minutes to '4h 30m' format"""
+    hours, minutes = divmod(total_minutes, 60)
     
-    stops = []
-    for i in range(len(segments) - 1):
-        current_segment = segments[i]
-        next_segment = segments[i + 1]
-        
-        stop_airport = current_segment['arrival']['iataCode']
-        arrival_time = current_segment['arrival']['at']
-        departure_time = next_segment['departure']['at']
-        layover_duration = _calculate_layover_duration(arrival_time, departure_time)
-        
-        stops.append({
-            'airport': stop_airport,
-            'duration': layover_duration
-        })
-    
-    return stops
+    if hours and minutes:
+        return f"{hours}h {minutes}m"
+    elif hours:
+        return f"{hours}h"
+    else:
+        return f"{minutes}m"
 
-def build_email_body(flights, departure_dates, return_dates, ai_summary, origin, destination, amadeus_client=None):
-    """
-    Build a well-formatted HTML email body with improved design
+def _get_stop_information(leg):
+    """Stop details of one leg from its precomputed layovers and connection flags"""
+    return [
+        {
+            'airport': airport,
+            'duration': _format_duration(layover),
+            'overnight': overnight,
+            'short_connection': short_connection,
+        }
+        for airport, layover, overnight, short_connection in zip(leg.stop_airports, leg.layover_minutes, leg.overnight, leg.short_connection)
+    ]
+
+def _build_price_matrix_html(price_matrix, departure_dates, return_dates):
+    """Render the departure × return best-fare table"""
+    if not price_matrix or (len(departure_dates) < 2 and len(return_dates) < 2):
+        return ""
+
+    priced = [price for price in price_matrix.values() if price is not None]
+    cheapest = min(priced) if priced else None
+
+    header_cells = "".join(
+        f'<th style="padding:8px; font-size:12px; color:#6b7280; font-weight:600;">{_format_short_date(ret)}</th>'
+        for ret in return_dates
+    )
+    rows = []
+    for dep in departure_dates:
+        cells = []
+        for ret in return_dates:
+            price = price_matrix.get((dep, ret))
+            if price is None:
+                text, style = "—", "color:#d1d5db;"
+            elif price == cheapest:
+                text, style = f"${price:,.0f}", "background:#d1fae5; color:#065f46; font-weight:700;"
+            else:
+                text, style = f"${price:,.0f}", "color:#374151;"
+            cells.append(f'<td style="padding:8px; text-align:center; font-size:13px; border-radius:6px; {style}">{text}</td>')
+        rows.append(
+            f'<tr><th style="padding:8px; font-size:12px; color:#6b7280; font-weight:600; text-align:left;">{_format_short_date(dep)}</th>{"".join(cells)}</tr>'
+        )
+
+    return f"""
+                <div style="margin-bottom:32px;">
+                    <h2 style="margin:0 0 16px; font-size:18px; font-weight:600; color:#374151;">📅 Best Fare by Dates</h2>
+                    <table style="width:100%; border-collapse:separate; border-spacing:4px;">
+                        <tr><th style="padding:8px; font-size:11px; color:#9ca3af; text-align:left;">Depart ↓ / Return →</th>{header_cells}</tr>
+                        {"".join(rows)}
+                    </table>
+                </div>
     """
-    if not flights:
-        return """
+
+def _format_cents(cents):
+    return f"${cents / 100:,.2f}".replace('.00', '')
+
+def _build_changes_html(changes, airline_names):
+    """Render the new / cheaper / disappeared offers since the previous run"""
+    if changes is None:
+        return ""
+
+    drops = changes['price_drops']
+    disappeared = changes['disappeared']
+    rows = []
+    for offer, previous_cents in drops:
+        segment = offer.first_segment
+        percent = (previous_cents - offer.price_cents) * 100 / previous_cents
+        rows.append(_CHANGE_ROW_TEMPLATE.format(
+            icon="📉",
+            flight=f"{airline_names[segment.carrier_code]} {segment.carrier_code}{segment.number}",
+            dates=f"{_format_short_date(offer.departure_date)} → {_format_short_date(offer.return_date)}",
+            detail=f'<s style="color:#9ca3af;">{_format_cents(previous_cents)}</s> {_format_cents(offer.price_cents)} (−{percent:.0f}%)',
+        ))
+    for row in disappeared[:MAX_DISAPPEARED_SHOWN]:
+        rows.append(_CHANGE_ROW_TEMPLATE.format(
+            icon="✖️",
+            flight=f"{airline_names[row['carrier_code']]} {row['carrier_code']}{row['flight_number']}",
+            dates=f"{_format_short_date(row['departure_date'])} → {_format_short_date(row['return_date'])}",
+            detail=f"no longer offered (was {_format_cents(row['price_cents'])})",
+        ))
+    if len(disappeared) > MAX_DISAPPEARED_SHOWN:
+        rows.append(_CHANGE_NOTE_TEMPLATE.format(text=f"…and {len(disappeared) - MAX_DISAPPEARED_SHOWN} more offers no longer offered"))
+    if not changes['new'] and not drops:
+        rows.append(_CHANGE_NOTE_TEMPLATE.format(text="No new offers or price drops since the last run."))
+
+    return _CHANGES_TEMPLATE.format(
+        previous=_format_datetime(datetime.fromisoformat(changes['previous_observed_at'])),
+        new_count=len(changes['new']),
+        drop_count=len(drops),
+        gone_count=len(disappeared),
+        rows="".join(rows),
+    )
+
+def _collect_reference_codes(flights, origin, destination, changes=None):
+    """Collect every carrier and airport code the email will display"""
+    airline_codes = set()
+    airport_codes = {origin, destination}
+    for flight in flights:
+        for leg in flight.legs:
+            airline_codes.add(leg.first_segment.carrier_code)
+            airport_codes.add(leg.first_segment.departure_airport)
+            for segment in leg.segments:
+                airport_codes.add(segment.arrival_airport)
+    if changes is not None:
+        airline_codes.update(offer.first_segment.carrier_code for offer, _ in changes['price_drops'])
+        airline_codes.update(row['carrier_code'] for row in changes['disappeared'][:MAX_DISAPPEARED_SHOWN])
+    return airline_codes, airport_codes
+
+# --- Templates ---
+# The static chrome of the email is compiled once at import time, each render
+# only substitutes the per-flight values.
+
+_NO_FLIGHTS_HTML = """
         <html>
         <body style="font-family: -apple-system, BlinkMacSystemFont, 'Segoe UI', Roboto, Arial, sans-serif; background:#f5f7fa; margin:0; padding:20px;">
             <div style="max-width:700px; margin:0 auto; background:white; border-radius:16px; box-shadow:0 4px 24px rgba(0,0,0,0.08); overflow:hidden;">
@@ -101,11 +150,7 @@ def build_email_body(flights, departure_dates, return_dates, ai_summary, origin,
         </html>
         """
 
-    # Get origin and destination airport names using cache
-    origin_name = cache.get_airport_name(origin, amadeus_client)
-    destination_name = cache.get_airport_name(destination, amadeus_client)
-    
-    html = f"""
+_HEADER_TEMPLATE = """
     <!DOCTYPE html>
     <html>
     <head>
@@ -120,69 +165,63 @@ def build_email_body(flights, departure_dates, return_dates, ai_summary, origin,
             
             <!-- Header -->
             <div style="background:linear-gradient(135deg, #667eea 0%, #764ba2 100%); padding:40px; text-align:center; color:white;">
-                <h1 style="margin:0; font-size:32px; font-weight:600;">✈️ Flight Search Results</h1>
+                <h1 style="margin:0; font-size:32px; font-weight:600;">✈️ {title}</h1>
                 <div style="margin:20px 0; font-size:18px; font-weight:500;">
-                    {origin_name.split(',')[0]} → {destination_name.split(',')[0]}
+                    {subtitle}
                 </div>
                 <div style="font-size:14px; opacity:0.8;">
-                    {len(flights)} options found • All prices in USD
+                    {flight_count} options found • All prices in USD
                 </div>
             </div>
 
-            <!-- AI Summary -->
             <div style="padding:32px;">
+    """
+
+_ROUTE_HEADING_TEMPLATE = """
+                <h2 style="margin:0 0 24px; padding-bottom:12px; border-bottom:2px solid #e5e7eb; font-size:22px; font-weight:700; color:#111827;">{route_name}</h2>
+    """
+
+_ROUTE_SUMMARY_TEMPLATE = """
+                <!-- Summary -->
                 <div style="background:linear-gradient(135deg, #f3f4f6 0%, #e5e7eb 100%); border-radius:12px; padding:24px; margin-bottom:32px;">
-                    <h2 style="margin:0 0 16px; font-size:18px; font-weight:600; color:#374151;">🤖 AI Flight Analysis</h2>
+                    <h2 style="margin:0 0 16px; font-size:18px; font-weight:600; color:#374151;">📊 Flight Analysis</h2>
                     <div style="color:#4b5563; line-height:1.6;">
                         {ai_summary}
                     </div>
                 </div>
-                
-                <h2 style="margin:0 0 24px; font-size:20px; font-weight:600; color:#374151;">Flight Options</h2>
+                {price_matrix_html}
+                {changes_html}
+                <h2 style="margin:0 0 24px; font-size:20px; font-weight:600; color:#374151;">{options_heading}</h2>
     """
 
-    for idx, flight in enumerate(flights, start=1):
-        segments = flight['itineraries'][0]['segments']
-        dep_seg = segments[0]
-        arr_seg = segments[-1]
-        
-        # Extract flight details using cache
-        airline_code = dep_seg['carrierCode']
-        airline_name = cache.get_airline_name(airline_code, amadeus_client)
-        flight_number = dep_seg['number']
-        
-        dep_airport = dep_seg['departure']['iataCode']
-        arr_airport = arr_seg['arrival']['iataCode']
-        dep_time = _format_datetime(dep_seg['departure']['at'])
-        arr_time = _format_datetime(arr_seg['arrival']['at'])
-        
-        duration = _format_duration(flight['itineraries'][0]['duration'])
-        price = float(flight['price']['total'])
-        stops_info = _get_stop_information(segments)
-        stops_count = len(stops_info)
-        
-        # Format price nicely
-        price_display = f"${price:,.2f}".replace('.00', '')
-        
-        # Determine stops styling
-        if stops_count == 0:
-            stops_badge = f'<span style="background:#10b981; color:white; padding:6px 12px; border-radius:20px; font-size:12px; font-weight:600;">Direct</span>'
-            stops_detail = ""
-        else:
-            stop_color = "#f59e0b" if stops_count == 1 else "#ef4444"
-            stops_text = f"{stops_count} Stop{'s' if stops_count > 1 else ''}"
-            stops_badge = f'<span style="background:{stop_color}; color:white; padding:6px 12px; border-radius:20px; font-size:12px; font-weight:600;">{stops_text}</span>'
-            
-            if stops_count == 1:
-                stop = stops_info[0]
-                stop_name = cache.get_airport_name(stop['airport'], amadeus_client).split(',')[0]
-                stops_detail = f'<div style="font-size:13px; color:#6b7280; margin-top:8px;">via {stop_name} ({stop["duration"]} layover)</div>'
-            else:
-                stop_names = [cache.get_airport_name(stop['airport'], amadeus_client).split(',')[0] for stop in stops_info]
-                stops_detail = f'<div style="font-size:13px; color:#6b7280; margin-top:8px;">via {", ".join(stop_names)}</div>'
+_CHANGES_TEMPLATE = """
+                <!-- Changes since the previous run -->
+                <div style="border:1px solid #c7d2fe; background:#eef2ff; border-radius:12px; padding:24px; margin-bottom:32px;">
+                    <h2 style="margin:0 0 8px; font-size:18px; font-weight:600; color:#3730a3;">🔔 Since {previous}</h2>
+                    <div style="margin-bottom:12px; font-size:14px; color:#4338ca;">
+                        {new_count} new • {drop_count} cheaper • {gone_count} gone
+                    </div>
+                    {rows}
+                </div>
+    """
+
+_CHANGE_ROW_TEMPLATE = """
+                    <div style="padding:6px 0; font-size:13px; color:#374151; border-top:1px solid #e0e7ff;">
+                        {icon} <strong>{flight}</strong> · {dates} · {detail}
+                    </div>
+    """
+
+_CHANGE_NOTE_TEMPLATE = '<div style="padding:6px 0; font-size:13px; color:#6b7280; border-top:1px solid #e0e7ff;">{text}</div>'
 
-        # Create flight card with improved design
-        html += f"""
+_ROUTE_EMPTY_TEMPLATE = """
+                <p style="margin:0 0 32px; color:#6b7280;">No flights found for this route.</p>
+    """
+
+_DIRECT_BADGE = '<span style="background:#10b981; color:white; padding:6px 12px; border-radius:20px; font-size:12px; font-weight:600;">Direct</span>'
+_STOPS_BADGE_TEMPLATE = '<span style="background:{color}; color:white; padding:6px 12px; border-radius:20px; font-size:12px; font-weight:600;">{text}</span>'
+_STOPS_DETAIL_TEMPLATE = '<div style="font-size:13px; color:#6b7280; margin-top:8px;">via {text}</div>'
+
+_CARD_TEMPLATE = """
                 <div style="border:1px solid #e5e7eb; border-radius:12px; margin-bottom:20px; background:white; box-shadow:0 1px 3px rgba(0,0,0,0.1);">
                     
                     <!-- Flight Header -->
@@ -195,12 +234,18 @@ def build_email_body(flights, departure_dates, return_dates, ai_summary, origin,
                         </div>
                         <div style="text-align:right;">
                             <div style="font-size:24px; font-weight:700; color:#111827;">{price_display}</div>
-                            <div style="font-size:11px; color:#6b7280; font-weight:500;">USD</div>
+                            <div style="font-size:11px; color:#6b7280; font-weight:500;">USD{trip_duration}</div>
                         </div>
                     </div>
                     
                     <!-- Flight Route -->
                     <div style="padding:24px;">
+        """
+
+_LEG_LABEL_TEMPLATE = '<div style="font-size:12px; font-weight:600; color:#6b7280; text-transform:uppercase; letter-spacing:0.5px; margin-bottom:8px;">{label}</div>'
+
+_LEG_TEMPLATE = """
+                        {leg_label}
                         <div style="display:flex; align-items:center; margin-bottom:20px;">
                             
                             <!-- Departure -->
@@ -208,7 +253,7 @@ def build_email_body(flights, departure_dates, return_dates, ai_summary, origin,
                                 <div style="font-size:28px; font-weight:700; color:#111827; letter-spacing:-0.5px;">{dep_airport}</div>
                                 <div style="font-size:14px; color:#374151; margin:4px 0;">{dep_time}</div>
                                 <div style="font-size:12px; color:#9ca3af;">
-                                    {cache.get_airport_name(dep_airport, amadeus_client).split(',')[0]}
+                                    {dep_airport_name}
                                 </div>
                             </div>
                             
@@ -232,31 +277,29 @@ def build_email_body(flights, departure_dates, return_dates, ai_summary, origin,
                                 <div style="font-size:28px; font-weight:700; color:#111827; letter-spacing:-0.5px;">{arr_airport}</div>
                                 <div style="font-size:14px; color:#374151; margin:4px 0;">{arr_time}</div>
                                 <div style="font-size:12px; color:#9ca3af;">
-                                    {cache.get_airport_name(arr_airport, amadeus_client).split(',')[0]}
+                                    {arr_airport_name}
                                 </div>
                             </div>
                             
                         </div>
         """
 
-        # Add detailed stop information if there are stops
-        if stops_info:
-            html += '''
+_STOP_DETAILS_OPEN = '''
                         <div style="background:#f9fafb; border-radius:8px; padding:16px; margin:20px 0;">
                             <div style="font-weight:600; color:#374151; font-size:14px; margin-bottom:12px;">✈️ Stop Details</div>
             '''
-            for stop in stops_info:
-                airport_name = cache.get_airport_name(stop['airport'], amadeus_client)
-                html += f'''
+
+_STOP_DETAIL_TEMPLATE = '''
                             <div style="background:white; border:1px solid #e5e7eb; border-radius:6px; padding:12px; margin-bottom:8px; font-size:13px;">
-                                <strong style="color:#111827;">{stop['airport']}</strong> - {airport_name.split(',')[0]}
-                                <span style="color:#6b7280;">({stop['duration']} layover)</span>
+                                {leg_label}<strong style="color:#111827;">{airport}</strong> - {airport_name}
+                                <span style="color:#6b7280;">({duration} layover)</span>{flags}
                             </div>
                 '''
-            html += '</div>'
 
-        # Booking button
-        html += f'''
+_OVERNIGHT_FLAG = ' <span style="color:#6366f1; font-weight:600;">🌙 Overnight</span>'
+_SHORT_CONNECTION_FLAG = ' <span style="color:#dc2626; font-weight:600;">⚠️ Short connection</span>'
+
+_BOOKING_TEMPLATE = '''
                         <div style="text-align:center; margin-top:20px;">
                             <a href="https://www.kayak.com/flights/{dep_airport}-{arr_airport}" 
                                style="background:linear-gradient(135deg, #667eea 0%, #764ba2 100%); color:white; padding:14px 28px; text-decoration:none; border-radius:25px; font-weight:600; font-size:14px; display:inline-block; box-shadow:0 2px 8px rgba(102, 126, 234, 0.3);">
@@ -267,16 +310,14 @@ def build_email_body(flights, departure_dates, return_dates, ai_summary, origin,
                 </div>
         '''
 
-    # Footer with cache stats
-    cache_stats = cache.get_cache_stats()
-    html += f"""
+_FOOTER_TEMPLATE = """
             </div>
             
             <!-- Footer -->
             <div style="background:#f9fafb; padding:24px; text-align:center; border-top:1px solid #e5e7eb;">
                 <div style="color:#6b7280; font-size:13px; line-height:1.5;">
                     🤖 Automated flight search powered by Amadeus API<br>
-                    <span style="font-size:11px;">Cache: {cache_stats['airlines_cached']} airlines, {cache_stats['airports_cached']} airports stored</span>
+                    <span style="font-size:11px;">Cache: {airlines_cached} airlines, {airports_cached} airports stored</span>
                 </div>
             </div>
         </div>
@@ -284,4 +325,198 @@ def build_email_body(flights, departure_dates, return_dates, ai_summary, origin,
     </html>
     """
 
-    return html
+def _render_leg(leg, label, airline_names, short_names):
+    """The departure → arrival row of one leg, and its stop details"""
+    dep_seg = leg.first_segment
+    arr_seg = leg.last_segment
+    stops_info = _get_stop_information(leg)
+    stops_count = len(stops_info)
+
+    # Determine stops styling
+    if stops_count == 0:
+        stops_badge = _DIRECT_BADGE
+        stops_detail = ""
+    else:
+        stop_color = "#f59e0b" if stops_count == 1 else "#ef4444"
+        stops_text = f"{stops_count} Stop{'s' if stops_count > 1 else ''}"
+        stops_badge = _STOPS_BADGE_TEMPLATE.format(color=stop_color, text=stops_text)
+
+        if stops_count == 1:
+            stop = stops_info[0]
+            stops_detail = _STOPS_DETAIL_TEMPLATE.format(text=f"{short_names[stop['airport']]} ({stop['duration']} layover)")
+        else:
+            stops_detail = _STOPS_DETAIL_TEMPLATE.format(text=", ".join(short_names[stop['airport']] for stop in stops_info))
+
+    return _LEG_TEMPLATE.format(
+        leg_label=_LEG_LABEL_TEMPLATE.format(label=f"{label} · {airline_names[dep_seg.carrier_code]} {dep_seg.number}") if label else "",
+        dep_airport=dep_seg.departure_airport,
+        dep_time=_format_datetime(dep_seg.departure_at),
+        dep_airport_name=short_names[dep_seg.departure_airport],
+        duration=_format_duration(leg.duration_minutes),
+        stops_badge=stops_badge,
+        stops_detail=stops_detail,
+        arr_airport=arr_seg.arrival_airport,
+        arr_time=_format_datetime(arr_seg.arrival_at),
+        arr_airport_name=short_names[arr_seg.arrival_airport],
+    ), stops_info
+
+def _render_flight_card(idx, flight, airline_names, short_names):
+    """Yield the HTML fragments for a single flight card, one row per leg"""
+    dep_seg = flight.first_segment
+    round_trip = flight.inbound is not None
+
+    yield _CARD_TEMPLATE.format(
+        idx=idx,
+        airline_name=airline_names[dep_seg.carrier_code],
+        flight_number=dep_seg.number,
+        price_display=f"${flight.price:,.2f}".replace('.00', ''),
+        trip_duration=f" • {_format_duration(flight.duration_minutes)} total" if round_trip else "",
+    )
+
+    stop_rows = []
+    for label, leg in zip(("Outbound", "Return") if round_trip else (None,), flight.legs):
+        leg_html, stops_info = _render_leg(leg, label, airline_names, short_names)
+        yield leg_html
+        stop_rows.extend((label, stop) for stop in stops_info)
+
+    # Add detailed stop information if there are stops
+    if stop_rows:
+        yield _STOP_DETAILS_OPEN
+        for label, stop in stop_rows:
+            yield _STOP_DETAIL_TEMPLATE.format(
+                leg_label=f'<span style="color:#6b7280;">{label}:</span> ' if label else "",
+                airport=stop['airport'],
+                airport_name=short_names[stop['airport']],
+                duration=stop['duration'],
+                flags=(_OVERNIGHT_FLAG if stop['overnight'] else "") + (_SHORT_CONNECTION_FLAG if stop['short_connection'] else ""),
+            )
+        yield '</div>'
+
+    outbound = flight.outbound
+    yield _BOOKING_TEMPLATE.format(dep_airport=outbound.first_segment.departure_airport, arr_airport=outbound.last_segment.arrival_airport)
+
+def prefetch_reference_names(reports, amadeus_client=None):
+    """
+    Resolve every airline and airport name the reports' emails will show.
+
+    Rendering calls this itself; calling it earlier, e.g. while the summary
+    is still being written, leaves only cache hits for the render.
+    Returns (airline_names, airport_names).
+    """
+    airline_codes, airport_codes = set(), set()
+    for report in reports:
+        report_airlines, report_airports = _collect_reference_codes(
+            report['flights'], report['origin'], report['destination'], report.get('changes')
+        )
+        airline_codes |= report_airlines
+        airport_codes |= report_airports
+    with metrics.span('reference_prefetch'):
+        return cache.prefetch(airline_codes, airport_codes, amadeus_client, max_workers=MAX_CONCURRENT_LOOKUPS)
+
+def _iter_document(reports, title, subtitle, amadeus_client, show_route_headings):
+    """Render one email document containing one section per route report"""
+    # Resolve every airline and airport name up front, rendering below does no lookups
+    airline_names, airport_names = prefetch_reference_names(reports, amadeus_client)
+    short_names = {code: name.split(',')[0] for code, name in airport_names.items()}
+
+    yield _HEADER_TEMPLATE.format(
+        title=title,
+        subtitle=subtitle(short_names),
+        flight_count=sum(len(report['flights']) for report in reports),
+    )
+
+    for report in reports:
+        if show_route_headings:
+            yield _ROUTE_HEADING_TEMPLATE.format(
+                route_name=f"{short_names[report['origin']]} → {short_names[report['destination']]}"
+            )
+        changes = report.get('changes')
+        if not report['flights'] and changes is None:
+            yield _ROUTE_EMPTY_TEMPLATE
+            continue
+
+        yield _ROUTE_SUMMARY_TEMPLATE.format(
+            ai_summary=report['summary'],
+            price_matrix_html=_build_price_matrix_html(report['price_matrix'], report['departure_dates'], report['return_dates']),
+            changes_html=_build_changes_html(changes, airline_names),
+            options_heading="New & Cheaper Options" if report.get('changes_only', changes is not None) else "Flight Options",
+        )
+        for idx, flight in enumerate(report['flights'], start=1):
+            yield from _render_flight_card(idx, flight, airline_names, short_names)
+
+    # Footer with cache stats
+    cache_stats = cache.get_cache_stats()
+    yield _FOOTER_TEMPLATE.format(airlines_cached=cache_stats['airlines_cached'], airports_cached=cache_stats['airports_cached'])
+
+def iter_email_body(flights, departure_dates, return_dates, ai_summary, origin, destination, amadeus_client=None, price_matrix=None, changes=None, changes_only=None):
+    """
+    Render the HTML email body as a stream of string fragments.
+
+    Names are resolved once before the first fragment is produced, after that
+    every flight card is rendered and yielded on its own, so callers can write
+    the output to a file or socket without holding the whole document in memory.
+
+    When changes from the price history are given, the email opens with what
+    changed since the previous run and flights are expected to be the new and
+    cheaper offers only, unless changes_only is False.
+    """
+    if not flights and changes is None:
+        yield _NO_FLIGHTS_HTML
+        return
+
+    report = {
+        'origin': origin,
+        'destination': destination,
+        'flights': flights,
+        'departure_dates': departure_dates,
+        'return_dates': return_dates,
+        'summary': ai_summary,
+        'price_matrix': price_matrix,
+        'changes': changes,
+        'changes_only': changes is not None if changes_only is None else changes_only,
+    }
+    yield from _iter_document(
+        [report],
+        title="Flight Search Results",
+        subtitle=lambda short_names: f"{short_names[origin]} → {short_names[destination]}",
+        amadeus_client=amadeus_client,
+        show_route_headings=False,
+    )
+
+def iter_watchlist_email_body(reports, amadeus_client=None):
+    """
+    Render a combined email for several routes as a stream of string fragments.
+
+    Each report is a dict with origin, destination, flights, departure_dates,
+    return_dates, summary and price_matrix, and optionally the changes since
+    the previous run. Names for all routes are resolved in one prefetch pass.
+    """
+    if not any(report['flights'] or report.get('changes') is not None for report in reports):
+        yield _NO_FLIGHTS_HTML
+        return
+
+    yield from _iter_document(
+        reports,
+        title="Flight Watchlist Results",
+        subtitle=lambda short_names: f"{len(reports)} routes watched",
+        amadeus_client=amadeus_client,
+        show_route_headings=True,
+    )
+
+def write_email_body(sink, *args, **kwargs):
+    """Stream the HTML email body into a file-like sink, returns the number of characters written"""
+    written = 0
+    for fragment in iter_email_body(*args, **kwargs):
+        sink.write(fragment)
+        written += len(fragment)
+    return written
+
+def build_watchlist_email_body(reports, amadeus_client=None):
+    """Build one HTML email covering every route in the watchlist"""
+    return "".join(iter_watchlist_email_body(reports, amadeus_client))
+
+def build_email_body(flights, departure_dates, return_dates, ai_summary, origin, destination, amadeus_client=None, price_matrix=None, changes=None, changes_only=None):
+    """
+    Build a well-formatted HTML email body with improved design
+    """
+    return "".join(iter_email_body(flights, departure_dates, return_dates, ai_summary, origin, destination, amadeus_client, price_matrix, changes, changes_only))
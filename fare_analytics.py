@@ -0,0 +1,185 @@
+import logging
+from datetime import datetime, timedelta
+import numpy as np
+
+# Days-before-departure buckets: 0-7, 8-14, 15-30, 31-60, 61-90 and 90+ days out
+DAYS_BEFORE_EDGES = np.array([7, 14, 30, 60, 90])
+DAYS_BEFORE_LABELS = ("0-7", "8-14", "15-30", "31-60", "61-90", "90+")
+
+# A cheaper bucket closer to departure only counts as a reason to wait when it
+# is this much below the current bucket, relative to the typical fare
+WAIT_MARGIN = 0.03
+
+def load_history_arrays(price_history, origin, destination, since=None):
+    """Load a route's per-run cell prices from the price history into columnar arrays"""
+    rows = price_history.cell_history(origin, destination, since)
+    if not rows:
+        return None
+    departure_dates, return_dates, observed_at, price_cents = zip(*rows)
+    return {
+        'departure_date': np.array(departure_dates, dtype='datetime64[D]'),
+        'return_date': np.array(return_dates, dtype='datetime64[D]'),
+        'observed_at': np.array(observed_at, dtype='datetime64[s]'),
+        'price': np.array(price_cents, dtype=np.float64) / 100,
+    }
+
+def _group_bounds(sorted_ids):
+    """Start index and length of each run of equal ids in a sorted array"""
+    starts = np.flatnonzero(np.r_[True, sorted_ids[1:] != sorted_ids[:-1]])
+    counts = np.diff(np.r_[starts, len(sorted_ids)])
+    return starts, counts
+
+def grouped_percentiles(group_ids, values, quantiles, group_count):
+    """
+    Linearly interpolated quantiles of values within each group, in one sort.
+
+    Returns a (group_count, len(quantiles)) array, NaN for groups without values.
+    """
+    result = np.full((group_count, len(quantiles)), np.nan)
+    if len(values) == 0:
+        return result
+    order = np.lexsort((values, group_ids))
+    sorted_ids = group_ids[order]
+    sorted_values = values[order]
+    starts, counts = _group_bounds(sorted_ids)
+    for column, quantile in enumerate(quantiles):
+        position = starts + quantile * (counts - 1)
+        low = np.floor(position).astype(np.intp)
+        high = np.ceil(position).astype(np.intp)
+        result[sorted_ids[starts], column] = sorted_values[low] + (sorted_values[high] - sorted_values[low]) * (position - low)
+    return result
+
+def compute_fare_stats(history, window_days=30, min_observations=3):
+    """
+    Per-cell fare statistics and a route-wide days-before-departure curve.
+
+    Window statistics (min, quartiles) cover the last window_days before the
+    latest observation. The curve gives the median fare in each
+    days-before-departure bucket relative to the cell's typical fare, which is
+    what the buy now / wait signal compares against.
+    """
+    if history is None:
+        return None
+
+    departure = history['departure_date']
+    observed_at = history['observed_at']
+    price = history['price']
+    latest_observation = observed_at.max()
+
+    # Number the cells so every aggregate below is a grouped array operation
+    cell_keys = np.stack([departure.astype(np.int64), history['return_date'].astype(np.int64)], axis=1)
+    cells, cell_idx = np.unique(cell_keys, axis=0, return_inverse=True)
+    cell_idx = cell_idx.reshape(-1)
+    cell_count = len(cells)
+
+    # Latest price per cell: last entry of each group when sorted by observation time
+    order = np.lexsort((observed_at, cell_idx))
+    starts, counts = _group_bounds(cell_idx[order])
+    latest = order[starts + counts - 1]
+    latest_price = price[latest]
+    latest_days_before = (departure[latest] - observed_at[latest].astype('datetime64[D]')).astype(np.int64)
+
+    in_window = observed_at >= latest_observation - np.timedelta64(window_days, 'D')
+    window_stats = grouped_percentiles(cell_idx[in_window], price[in_window], (0.0, 0.25, 0.5, 0.75), cell_count)
+    window_counts = np.bincount(cell_idx[in_window], minlength=cell_count)
+
+    # Days-before-departure curve over the whole history, prices relative to each cell's median
+    cell_median = grouped_percentiles(cell_idx, price, (0.5,), cell_count)[:, 0]
+    relative = price / cell_median[cell_idx]
+    days_before = (departure - observed_at.astype('datetime64[D]')).astype(np.int64)
+    bucket = np.digitize(days_before, DAYS_BEFORE_EDGES, right=True)
+    bucket_count = len(DAYS_BEFORE_LABELS)
+    curve = grouped_percentiles(bucket, relative, (0.5,), bucket_count)[:, 0]
+    curve_counts = np.bincount(bucket, minlength=bucket_count)
+
+    # Cheapest relative fare in any bucket closer to departure than each bucket
+    closer_best = np.r_[np.nan, np.fmin.accumulate(curve)[:-1]]
+    current_bucket = np.digitize(latest_days_before, DAYS_BEFORE_EDGES, right=True)
+    expected_now = curve[current_bucket]
+    expected_later = closer_best[current_bucket]
+
+    p25, median = window_stats[:, 1], window_stats[:, 2]
+    enough = window_counts >= min_observations
+    # A flat history has no cheap quarter to be in
+    buy = enough & (latest_price <= p25) & (p25 < window_stats[:, 3])
+    wait = enough & ~buy & (latest_price > median) & (expected_later < expected_now - WAIT_MARGIN)
+    rising = enough & ~buy & ~wait & (expected_later > expected_now + WAIT_MARGIN)
+
+    cell_dates = cells.astype('datetime64[D]').astype(str).tolist()
+    result_cells = {}
+    for i, (dep, ret) in enumerate(cell_dates):
+        if not enough[i]:
+            signal, reason = "watch", f"only {window_counts[i]} observations so far"
+        elif buy[i]:
+            signal, reason = "buy", f"in the cheapest quarter of the last {window_days} days"
+        elif wait[i]:
+            signal, reason = "wait", "fares on these dates usually drop closer to departure"
+        elif rising[i]:
+            signal, reason = "buy", "fares on these dates usually rise from here"
+        else:
+            signal, reason = "watch", "close to the usual price"
+        result_cells[(dep, ret)] = {
+            'latest': float(latest_price[i]),
+            'min': float(window_stats[i, 0]),
+            'p25': float(window_stats[i, 1]),
+            'median': float(window_stats[i, 2]),
+            'p75': float(window_stats[i, 3]),
+            'observations': int(window_counts[i]),
+            'days_before': int(latest_days_before[i]),
+            'signal': signal,
+            'reason': reason,
+        }
+
+    logging.info(f"Fare analytics: {len(price)} cell observations across {cell_count} date combinations")
+    return {
+        'observations': int(len(price)),
+        'window_days': window_days,
+        'cells': result_cells,
+        'curve': [
+            {'days_before': label, 'relative_price': float(curve[i]), 'observations': int(curve_counts[i])}
+            for i, label in enumerate(DAYS_BEFORE_LABELS) if curve_counts[i]
+        ],
+    }
+
+def route_fare_stats(price_history, origin, destination, window_days=30, min_observations=3, history_days=None):
+    """Load a route's recent history and compute its fare statistics, None without history"""
+    since = datetime.now() - timedelta(days=history_days) if history_days is not None else None
+    history = load_history_arrays(price_history, origin, destination, since)
+    return compute_fare_stats(history, window_days, min_observations)
+
+def fare_insights(stats, price_matrix):
+    """Observations from the fare history for the email summary and the Claude prompt"""
+    if not stats:
+        return []
+
+    insights = []
+    priced = {cell: price for cell, price in (price_matrix or {}).items() if price is not None}
+    if priced:
+        cell = min(priced, key=priced.get)
+        cell_stats = stats['cells'].get(cell)
+        if cell_stats and cell_stats['observations'] >= 2:
+            advice = {"buy": "book now", "wait": "consider waiting", "watch": "keep watching"}[cell_stats['signal']]
+            if cell_stats['min'] < cell_stats['p75']:
+                spread = f"ranged ${cell_stats['min']:,.0f}–${cell_stats['p75']:,.0f} (median ${cell_stats['median']:,.0f})"
+            else:
+                spread = f"held at ${cell_stats['min']:,.0f}"
+            insights.append(
+                f"Over the last {stats['window_days']} days the cheapest dates ({cell[0]} → {cell[1]}) {spread}, "
+                f"today ${cell_stats['latest']:,.0f}: {advice}, {cell_stats['reason']}."
+            )
+
+        buy_count = sum(1 for cell in priced if stats['cells'].get(cell, {}).get('signal') == "buy")
+        if buy_count and len(priced) > 1:
+            insights.append(f"{buy_count} of {len(priced)} date combinations are at a buy-now price.")
+
+    curve = [point for point in stats['curve'] if point['observations'] >= 3]
+    if len(curve) >= 2:
+        cheapest = min(curve, key=lambda point: point['relative_price'])
+        priciest = max(curve, key=lambda point: point['relative_price'])
+        spread = (priciest['relative_price'] - cheapest['relative_price']) * 100
+        if spread >= 5:
+            insights.append(
+                f"On this route fares have been lowest {cheapest['days_before']} days before departure "
+                f"and {spread:.0f}% higher {priciest['days_before']} days out."
+            )
+    return insights
@@ -0,0 +1,139 @@
+import logging
+from date_grid import cheapest_cell
+from offer_ranking import value_scorer
+
+def _dominates(a, b):
+    """True if offer a is at least as good as b on price, duration and stops, and better on one"""
+    at_least_as_good = (
+        a.price_cents <= b.price_cents
+        and a.duration_minutes <= b.duration_minutes
+        and a.stops <= b.stops
+    )
+    strictly_better = (
+        a.price_cents < b.price_cents
+        or a.duration_minutes < b.duration_minutes
+        or a.stops < b.stops
+    )
+    return at_least_as_good and strictly_better
+
+def pareto_frontier(offers):
+    """
+    Offers that no other offer beats on price, duration and stops at once,
+    ordered by price.
+    """
+    candidates = sorted(offers, key=lambda offer: (offer.price_cents, offer.duration_minutes, offer.stops))
+    frontier = []
+    for offer in candidates:
+        # Sorted by price, so only offers already on the frontier can dominate this one
+        if not any(_dominates(kept, offer) for kept in frontier):
+            frontier.append(offer)
+    return frontier
+
+def _date_insights(price_matrix, requested_cell):
+    """Observations about how the fare changes across the date grid"""
+    insights = []
+    priced = {cell: price for cell, price in (price_matrix or {}).items() if price is not None}
+    if len(priced) < 2:
+        return insights
+
+    best = cheapest_cell(priced)
+    best_price = priced[best]
+    highest = max(priced.values())
+    if highest > best_price:
+        insights.append(
+            f"Fares across the {len(priced)} date combinations range from ${best_price:,.0f} to ${highest:,.0f}; "
+            f"the cheapest dates are {best[0]} → {best[1]}."
+        )
+
+    requested_price = priced.get(requested_cell)
+    if requested_price is not None and best != requested_cell and requested_price > best_price:
+        insights.append(
+            f"Shifting from your requested dates ({requested_cell[0]} → {requested_cell[1]}) "
+            f"saves ${requested_price - best_price:,.0f}."
+        )
+    return insights
+
+def _offer_insights(offers, cheapest):
+    """Observations about direct flights and the cost of connections"""
+    insights = []
+    # Direct means direct both ways
+    direct = [offer for offer in offers if offer.stops == 0]
+    if direct:
+        cheapest_direct = min(direct, key=lambda offer: offer.price_cents)
+        premium = cheapest_direct.price - cheapest.price
+        if premium > 0:
+            insights.append(f"{len(direct)} direct option(s) available, the cheapest costs ${premium:,.0f} more than the overall cheapest fare.")
+        else:
+            insights.append(f"{len(direct)} direct option(s) available, including the cheapest fare.")
+    else:
+        insights.append("No direct flights were found for these dates.")
+
+    overnight = sum(1 for offer in offers if offer.overnight_stops)
+    if overnight:
+        insights.append(f"{overnight} option(s) include an overnight connection.")
+    short = sum(1 for offer in offers if offer.short_connections)
+    if short:
+        insights.append(f"{short} option(s) include a connection shorter than the minimum connection time, a delay could mean a missed flight.")
+    return insights
+
+def analyze_offers(offers, price_matrix=None, weights=None, requested_cell=None):
+    """
+    Compute the cheapest, fastest and best-value picks locally.
+
+    Best value is the Pareto-optimal offer with the lowest weighted score, so it
+    never recommends an offer that another one beats on every criterion.
+    Returns None when there are no offers.
+    """
+    if not offers:
+        return None
+
+    frontier = pareto_frontier(offers)
+    score = value_scorer(offers, weights or {})
+    cheapest = min(offers, key=lambda offer: (offer.price_cents, offer.duration_minutes))
+    fastest = min(offers, key=lambda offer: (offer.duration_minutes, offer.price_cents))
+    best_value = min(frontier, key=lambda offer: (score(offer), offer.price_cents))
+
+    insights = _date_insights(price_matrix, requested_cell) + _offer_insights(offers, cheapest)
+    if len(frontier) > 1:
+        insights.append(f"{len(frontier)} offers are not beaten on price, duration and stops by any other option.")
+
+    logging.info(f"Local analysis: {len(offers)} offers, {len(frontier)} on the Pareto frontier")
+    return {
+        'cheapest': cheapest,
+        'fastest': fastest,
+        'best_value': best_value,
+        'frontier': frontier,
+        'insights': insights,
+    }
+
+def _describe_offer(offer, option_numbers):
+    """One-line description of an offer, referring to its card in the email when shown"""
+    segment = offer.first_segment
+    hours, minutes = divmod(offer.duration_minutes, 60)
+    stops = " + ".join("direct" if leg.stops == 0 else f"{leg.stops} stop{'s' if leg.stops > 1 else ''}" for leg in offer.legs)
+    label = f"Option {option_numbers[id(offer)]}" if id(offer) in option_numbers else "Not in the list below"
+    return (
+        f"{label}: {segment.carrier_code} {segment.number}, "
+        f"{offer.departure_date or segment.departure_at.date().isoformat()} → {offer.return_date or '—'}, "
+        f"${offer.price:,.2f}, {hours}h {minutes}m, {stops}"
+    )
+
+def render_analysis_html(analysis, displayed_offers=()):
+    """Render the local picks and insights for the email summary slot"""
+    if not analysis:
+        return "No flights found."
+
+    option_numbers = {id(offer): idx for idx, offer in enumerate(displayed_offers, start=1)}
+    picks = [
+        ('💰 Cheapest Option', analysis['cheapest']),
+        ('⚡ Fastest Option', analysis['fastest']),
+        ('⭐ Best Overall Value', analysis['best_value']),
+    ]
+    html = "".join(
+        f"<strong>{title}:</strong> {_describe_offer(offer, option_numbers)}<br>"
+        for title, offer in picks
+    )
+    if analysis['insights']:
+        items = "".join(f"<li>{insight}</li>" for insight in analysis['insights'])
+        html += f"<strong>🔎 Key Insights:</strong><ul style=\"margin:8px 0 0; padding-left:20px;\">{items}</ul>"
+    return html
@@ -1,23 +1,52 @@
 import os
+import sys
+import asyncio
+import json
 import logging
-import smtplib
-from datetime import datetime, timedelta
-from email.mime.text import MIMEText
-from amadeus import Client, ResponseError
-import anthropic
-from config import ORIGIN, DESTINATION, DEPARTURE_DATE, RETURN_DATE, ALLOW_DEPARTURE_NEXT_DAY, ALLOW_RETURN_NEXT_DAY, MAX_RESULTS, MAX_STOPS
-from email_formatter import build_email_body
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from config import (
+    MAX_CONCURRENT_SEARCHES, EXPAND_CITY_CODES, MAX_AIRPORTS_PER_CITY, TOP_OFFERS, RANK_BY, RANK_WEIGHTS, USE_AI_NARRATIVE,
+    SUMMARY_CACHE_TTL_HOURS, SUMMARY_CACHE_MAX_ENTRIES, SEARCH_CACHE_TTL_MINUTES, SEARCH_CACHE_MAX_ENTRIES,
+    WATCHLIST_REPORT, AMADEUS_ENVIRONMENT,
+    AMADEUS_MAX_RETRIES, AMADEUS_BACKOFF_BASE_SECONDS, AMADEUS_BACKOFF_MAX_SECONDS,
+    PRICE_HISTORY_FILE, PRICE_DROP_THRESHOLD_PCT, EMAIL_CHANGES_ONLY, DIGEST_EVERY_DAYS,
+    FARE_STATS_WINDOW_DAYS, FARE_MIN_OBSERVATIONS, FARE_HISTORY_DAYS,
+    AMADEUS_FIXTURES_DIR, REPLAY_LATENCY_MS, REPLAY_LATENCY_JITTER_MS, REPLAY_ERROR_RATE, REPLAY_SEED,
+    OFFLINE_OUTBOX_DIR, REPLAY_STATE_DIR, METRICS_FILE, PROMETHEUS_TEXTFILE,
+    SMTP_HOST, SMTP_PORT, SMTP_SECURITY, SMTP_TIMEOUT_SECONDS, SMTP_MAX_RETRIES, SMTP_BACKOFF_BASE_SECONDS,
+    EMAIL_QUEUE_DIR, EMAIL_QUEUE_MAX_AGE_HOURS
+)
+from email_formatter import build_email_body, build_watchlist_email_body, prefetch_reference_names
 from cache_manager import cache
+from search_executor import run_searches_async
+from date_grid import build_date_grid, build_price_matrix, matrix_axes
+from models import parse_offers
+from offer_ranking import RANK_KEYS, dedupe_offers, select_top_offers
+from flight_analysis import analyze_offers, render_analysis_html
+from ttl_cache import PersistentTTLCache, canonical_hash
+from routes import load_routes, validate_route
+from rate_limiter import GuardedClient, amadeus_guard
+from price_history import PriceHistory, itinerary_id
+from alert_rules import evaluate_rules, render_alerts_html
+from amadeus_replay import ReplayResponseError, create_amadeus_client
+from metrics import metrics
+from mailer import Mailer, MailQueue, OutboxMailer, parse_recipients
 
-# --- Logging ---
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s [%(levelname)s] %(message)s",
-    handlers=[
-        logging.FileHandler("flight_search.log"),
-        logging.StreamHandler()
-    ]
-)
+# Importing this module has no side effects: logging is configured by main(),
+# the environment is checked when a run starts, the SDK clients are built on
+# first use and the caches and price history are read on first access.
+
+def configure_logging():
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s [%(levelname)s] %(message)s",
+        handlers=[
+            logging.FileHandler("flight_search.log"),
+            logging.StreamHandler()
+        ]
+    )
 
 # --- Environment Variables ---
 AMADEUS_API_KEY = os.getenv("AMADEUS_API_KEY")
@@ -25,70 +54,179 @@ AMADEUS_API_SECRET = os.getenv("AMADEUS_API_SECRET")
 ANTHROPIC_API_KEY = os.getenv("ANTHROPIC_API_KEY")
 EMAIL_USER = os.getenv("EMAIL_USER")
 EMAIL_PASS = os.getenv("EMAIL_PASS")
-SEND_TO = os.getenv("EMAIL_RECEIVER")
+AMADEUS_MODE = os.getenv("AMADEUS_MODE", "live").lower()
+# Replay runs need no credentials: no key disables the narrative, no email login writes to the outbox
+OFFLINE = AMADEUS_MODE == "replay"
+SEND_TO = parse_recipients(os.getenv("EMAIL_RECEIVER")) or (["offline@localhost"] if OFFLINE else [])
+AI_NARRATIVE_ENABLED = USE_AI_NARRATIVE and (bool(ANTHROPIC_API_KEY) or not OFFLINE)
 
-# Validate required environment variables
-if not SEND_TO:
-    raise ValueError("EMAIL_RECEIVER environment variable not set")
-if not ANTHROPIC_API_KEY:
-    raise ValueError("ANTHROPIC_API_KEY environment variable not set")
-    
-logging.info(f"ANTHROPIC_API_KEY present: {bool(ANTHROPIC_API_KEY)}")
-logging.info(f"ANTHROPIC_API_KEY starts with sk-ant-: {ANTHROPIC_API_KEY.startswith('sk-ant-') if ANTHROPIC_API_KEY else False}")
+def state_path(path):
+    """Where a run keeps a state file, replay runs use REPLAY_STATE_DIR so they never touch the live history and caches"""
+    return os.path.join(REPLAY_STATE_DIR, path) if OFFLINE else path
+
+def check_environment():
+    """Validate required environment variables, raises ValueError before any API call is made"""
+    if not SEND_TO:
+        raise ValueError("EMAIL_RECEIVER environment variable not set")
+    if AI_NARRATIVE_ENABLED and not ANTHROPIC_API_KEY:
+        raise ValueError("ANTHROPIC_API_KEY environment variable not set (or disable USE_AI_NARRATIVE)")
+
+    logging.info(f"ANTHROPIC_API_KEY present: {bool(ANTHROPIC_API_KEY)}")
+    logging.info(f"ANTHROPIC_API_KEY starts with sk-ant-: {ANTHROPIC_API_KEY.startswith('sk-ant-') if ANTHROPIC_API_KEY else False}")
 
 # --- Clients ---
-amadeus = Client(client_id=AMADEUS_API_KEY, client_secret=AMADEUS_API_SECRET)
+# Every Amadeus call, including reference data lookups, goes through one shared rate limiter
+amadeus_api_guard = amadeus_guard(
+    AMADEUS_ENVIRONMENT,
+    max_retries=AMADEUS_MAX_RETRIES,
+    base_delay=AMADEUS_BACKOFF_BASE_SECONDS,
+    max_delay=AMADEUS_BACKOFF_MAX_SECONDS
+)
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+def get_amadeus():
+    """The shared rate limited Amadeus client, built on first use"""
+    with _clients_lock:
+        if 'amadeus' not in _clients:
+            _clients['amadeus'] = GuardedClient(
+                create_amadeus_client(
+                    AMADEUS_MODE, AMADEUS_API_KEY, AMADEUS_API_SECRET, AMADEUS_ENVIRONMENT, AMADEUS_FIXTURES_DIR,
+                    latency_ms=REPLAY_LATENCY_MS, latency_jitter_ms=REPLAY_LATENCY_JITTER_MS,
+                    error_rate=REPLAY_ERROR_RATE, seed=REPLAY_SEED
+                ),
+                amadeus_api_guard
+            )
+        return _clients['amadeus']
+
+def get_claude_client():
+    """The Claude client, built on first use, or None when the narrative is disabled or setup failed"""
+    with _clients_lock:
+        if 'claude' not in _clients:
+            _clients['claude'] = None
+            if AI_NARRATIVE_ENABLED:
+                try:
+                    import anthropic
+                    _clients['claude'] = anthropic.Anthropic(api_key=ANTHROPIC_API_KEY)
+                    logging.info("Claude client initialized successfully")
+                except Exception as e:
+                    logging.error(f"Failed to initialize Claude client: {e}")
+        return _clients['claude']
+
+def set_clients(amadeus=None, claude=None):
+    """Use pre-built clients instead of the ones built from the environment, e.g. stubs"""
+    with _clients_lock:
+        if amadeus is not None:
+            _clients['amadeus'] = amadeus
+        if claude is not None:
+            _clients['claude'] = claude
+
+CLAUDE_MODEL = "claude-3-haiku-20240307"  # Free tier friendly model
+CLAUDE_MAX_TOKENS = 300
 
-# Initialize Claude client with explicit error handling
-try:
-    claude_client = anthropic.Anthropic(api_key=ANTHROPIC_API_KEY)
-    logging.info("Claude client initialized successfully")
-except Exception as e:
-    logging.error(f"Failed to initialize Claude client: {e}")
-    claude_client = None
+NARRATIVE_PROMPT_TEMPLATE = """Please analyze these flight options for a traveler. Each option covers the whole trip
+and its price includes every leg. All prices are in USD.
 
-def validate_search_parameters():
+Flight Options:
+{flight_details}{date_section}{analysis_section}
+
+The cheapest, fastest and best value options are already shown to the traveler.
+Please add 2-3 sentences of booking advice that go beyond them, such as trade-offs
+between the options, timing of departures and arrivals, or which dates to prefer.
+
+Format your response with HTML tags like <strong> and <br> for readability. Keep it concise."""
+
+# --- Caches ---
+summary_cache = PersistentTTLCache(
+    state_path("claude_summary_cache.json"),
+    ttl_seconds=SUMMARY_CACHE_TTL_HOURS * 3600,
+    max_entries=SUMMARY_CACHE_MAX_ENTRIES,
+    name="summary cache"
+)
+cache.register_stats_source('summary_cache', summary_cache)
+
+# Raw flight search responses, so reruns and overlapping date windows skip identical requests.
+# Record mode always calls the API, otherwise cached searches would never be written as fixtures.
+search_cache = PersistentTTLCache(
+    state_path("flight_search_cache.json"),
+    ttl_seconds=SEARCH_CACHE_TTL_MINUTES * 60,
+    max_entries=SEARCH_CACHE_MAX_ENTRIES,
+    name="search cache"
+)
+SEARCH_CACHE_ENABLED = SEARCH_CACHE_TTL_MINUTES > 0 and AMADEUS_MODE != "record"
+cache.register_stats_source('search_cache', search_cache)
+metrics.register_source('reference_cache', cache)
+metrics.register_source('amadeus_api', amadeus_api_guard)
+
+price_history = PriceHistory(state_path(PRICE_HISTORY_FILE))
+
+def create_mailer():
+    """SMTP delivery with a disk queue, or HTML files in the outbox for replay runs without email credentials"""
+    if OFFLINE and not (EMAIL_USER and EMAIL_PASS):
+        return OutboxMailer(OFFLINE_OUTBOX_DIR)
+    return Mailer(
+        os.getenv("SMTP_HOST", SMTP_HOST), int(os.getenv("SMTP_PORT", SMTP_PORT)), EMAIL_USER, EMAIL_PASS,
+        security=os.getenv("SMTP_SECURITY", SMTP_SECURITY), timeout=SMTP_TIMEOUT_SECONDS,
+        max_retries=SMTP_MAX_RETRIES, backoff_base=SMTP_BACKOFF_BASE_SECONDS,
+        queue=MailQueue(state_path(EMAIL_QUEUE_DIR), EMAIL_QUEUE_MAX_AGE_HOURS)
+    )
+
+def get_mailer():
+    """The run's mailer, built on first use: one SMTP session, opened by the first email and closed when run_job ends"""
+    with _clients_lock:
+        if 'mailer' not in _clients:
+            _clients['mailer'] = create_mailer()
+            metrics.register_source('mailer', _clients['mailer'])
+        return _clients['mailer']
+
+def close_mailer():
+    """End the run's SMTP session, if an email opened one"""
+    with _clients_lock:
+        mailer = _clients.get('mailer')
+    if mailer is not None:
+        mailer.close()
+
+def validate_search_parameters(routes):
     """Validate search parameters before making API calls"""
-    from datetime import datetime
-    
     errors = []
+    for route in routes:
+        errors.extend(validate_route(route))
     
-    # Validate airport codes (should be 3 letters)
-    if not ORIGIN or len(ORIGIN) != 3:
-        errors.append(f"Invalid origin airport code: {ORIGIN}")
-    if not DESTINATION or len(DESTINATION) != 3:
-        errors.append(f"Invalid destination airport code: {DESTINATION}")
-    
-    # Validate dates
-    try:
-        dep_date = datetime.strptime(DEPARTURE_DATE, "%Y-%m-%d")
-        ret_date = datetime.strptime(RETURN_DATE, "%Y-%m-%d")
-        today = datetime.now()
-        
-        if dep_date < today:
-            errors.append(f"Departure date {DEPARTURE_DATE} is in the past")
-        if ret_date < dep_date:
-            errors.append(f"Return date {RETURN_DATE} is before departure date {DEPARTURE_DATE}")
-            
-    except ValueError as e:
-        errors.append(f"Invalid date format: {e}")
-    
-    # Validate other parameters
-    if MAX_RESULTS <= 0 or MAX_RESULTS > 100:
-        errors.append(f"MAX_RESULTS should be between 1 and 100, got {MAX_RESULTS}")
-    if MAX_STOPS < 0:
-        errors.append(f"MAX_STOPS should be 0 or positive, got {MAX_STOPS}")
+    # Validate global parameters
+    if TOP_OFFERS < 1:
+        errors.append(f"TOP_OFFERS should be at least 1, got {TOP_OFFERS}")
+    if RANK_BY not in RANK_KEYS:
+        errors.append(f"RANK_BY should be one of {', '.join(RANK_KEYS)}, got {RANK_BY}")
+    if MAX_CONCURRENT_SEARCHES < 1:
+        errors.append(f"MAX_CONCURRENT_SEARCHES should be at least 1, got {MAX_CONCURRENT_SEARCHES}")
+    if WATCHLIST_REPORT not in ('combined', 'per_route'):
+        errors.append(f"WATCHLIST_REPORT should be 'combined' or 'per_route', got {WATCHLIST_REPORT}")
     
     return errors
 
 # --- Helper Functions ---
-def search_flights(origin, destination, departure_date, return_date, max_results):
-    """Search for flights using Amadeus API"""
+def _is_sdk_error(error, module_name, class_name):
+    """isinstance check against an SDK exception class without importing the SDK"""
+    # An SDK that was never imported cannot have raised the error
+    module = sys.modules.get(module_name)
+    error_class = getattr(module, class_name, None)
+    return error_class is not None and isinstance(error, error_class)
+
+def search_flights(origin, destination, departure_date, return_date, max_results, max_stops):
+    """
+    Search for flights using Amadeus API.
+
+    Returns (flights, cached_at), cached_at is when the offers were fetched
+    if they came from the search cache and None if they were fetched now.
+    Returns None when the search failed, so callers can tell it apart from a
+    search that found no flights.
+    """
     try:
         # Log the search parameters for debugging
         logging.info(f"Searching flights: {origin} → {destination}")
         logging.info(f"Departure: {departure_date}, Return: {return_date}")
-        logging.info(f"Max results: {max_results}, Max stops: {MAX_STOPS}")
+        logging.info(f"Max results: {max_results}, Max stops: {max_stops}")
         
         # Build the request parameters
         search_params = {
@@ -101,174 +239,594 @@ def search_flights(origin, destination, departure_date, return_date, max_results
         }
         
         # Only add nonStop if we want direct flights only
-        if MAX_STOPS == 0:
+        if max_stops == 0:
             search_params['nonStop'] = True
             logging.info("Searching for direct flights only")
         
-        response = amadeus.shopping.flight_offers_search.get(**search_params)
-        flights = response.data
+        # Test and production return different fares, replayed fixtures must not answer live runs
+        cache_key = canonical_hash({
+            'environment': AMADEUS_ENVIRONMENT, 'mode': AMADEUS_MODE, 'params': search_params, 'format': 2
+        })
+        cached = search_cache.get_entry(cache_key) if SEARCH_CACHE_ENABLED else None
+        cached_at = None
+        if cached is not None:
+            stored_at, payload = cached
+            offers = json.loads(payload)
+            cached_at = datetime.fromtimestamp(stored_at)
+            logging.info(f"Served {len(offers)} offers from the search cache, fetched {cached_at:%H:%M:%S}")
+        else:
+            with metrics.span('flight_search', route=f"{origin}-{destination}"):
+                response = get_amadeus().shopping.flight_offers_search.get(**search_params)
+            offers = response.data
+            if SEARCH_CACHE_ENABLED:
+                # One compact string per search, the raw dicts are dropped once they are parsed
+                search_cache.put(cache_key, json.dumps(offers, separators=(',', ':'), ensure_ascii=False))
+        # Parse the raw offers once, every later stage works on the normalized model
+        flights = parse_offers(offers, departure_date, return_date)
         
-        # Filter flights by maximum stops if MAX_STOPS > 0
-        if MAX_STOPS > 0:
-            filtered_flights = []
-            for flight in flights:
-                stops = len(flight['itineraries'][0]['segments']) - 1
-                if stops <= MAX_STOPS:
-                    filtered_flights.append(flight)
-            flights = filtered_flights
-            logging.info(f"Filtered to {len(flights)} flights with max {MAX_STOPS} stops")
+        # Filter flights by maximum stops if max_stops > 0, the limit applies to each leg of the trip
+        if max_stops > 0:
+            flights = [flight for flight in flights if flight.max_leg_stops <= max_stops]
+            logging.info(f"Filtered to {len(flights)} flights with max {max_stops} stops each way")
         
         logging.info(f"Found {len(flights)} flights for {departure_date} → {return_date}")
-        return flights
+        return flights, cached_at
         
-    except ResponseError as e:
+    except Exception as e:
+        if not _is_sdk_error(e, 'amadeus', 'ResponseError') and not isinstance(e, ReplayResponseError):
+            logging.error(f"Unexpected error in flight search: {e}")
+            return None
         # More detailed error logging
         logging.error(f"Amadeus API error: {e}")
         logging.error(f"Error details: {e.response.body if hasattr(e, 'response') else 'No response body'}")
         logging.error(f"Search parameters were: origin={origin}, destination={destination}, departure={departure_date}, return={return_date}")
-        return []
-    except Exception as e:
-        logging.error(f"Unexpected error in flight search: {e}")
-        return []
+        return None
 
-def summarize_with_claude(flights):
-    if not flights:
-        return "No flights found."
+def summarize_with_claude(flights, price_matrix=None, analysis=None):
+    """
+    Ask Claude for a short narrative on top of the locally computed analysis.
 
-    # Check if Claude client is available
-    if not claude_client:
-        logging.error("Claude client not initialized - API key issue")
-        return "AI summary unavailable - API key configuration issue."
+    Returns None when there is nothing to add or the call fails, the local
+    analysis is always shown regardless.
+    """
+    if not flights:
+        return None
 
     try:
         # Create detailed flight information for Claude
         flight_details = []
         for i, flight in enumerate(flights, 1):
-            dep_seg = flight['itineraries'][0]['segments'][0]
-            arr_seg = flight['itineraries'][0]['segments'][-1]
-            
-            # Extract flight details
-            airline = dep_seg['carrierCode']
-            departure_airport = dep_seg['departure']['iataCode']
-            arrival_airport = arr_seg['arrival']['iataCode']
-            departure_time = dep_seg['departure']['at']
-            arrival_time = arr_seg['arrival']['at']
-            duration = flight['itineraries'][0]['duration']
-            price = flight['price']['total']
-            stops = len(flight['itineraries'][0]['segments']) - 1
-            
-            flight_info = (
-                f"Flight {i}: {airline} {departure_airport}→{arrival_airport}, "
-                f"Departs: {departure_time}, Arrives: {arrival_time}, "
-                f"Duration: {duration}, Stops: {stops}, "
-                f"Price: ${price} USD"
+            duration = f"{flight.duration_minutes // 60}h {flight.duration_minutes % 60}m"
+            legs = "; ".join(
+                f"{label}: {_describe_leg(leg)}"
+                for label, leg in zip(("Outbound", "Return"), flight.legs)
             )
+            flight_info = f"Flight {i}: {legs}; Total travel time: {duration}, Price: ${flight.price} USD"
             flight_details.append(flight_info)
 
-        # Create prompt for Claude
-        prompt = f"""Please analyze these flight options for a traveler. All prices are in USD.
+        # Best fare per date combination, so Claude can comment on date flexibility
+        date_details = []
+        for (dep, ret), best_price in sorted((price_matrix or {}).items()):
+            fare = f"${best_price:,.2f} USD" if best_price is not None else "no flights"
+            date_details.append(f"{dep} → {ret}: {fare}")
+        date_section = f"\n\nBest Fare by Dates:\n{chr(10).join(date_details)}" if date_details else ""
 
-Flight Options:
-{chr(10).join(flight_details)}
+        # The picks are computed locally, Claude only adds the narrative
+        analysis_section = ""
+        pick_lines = []
+        if analysis:
+            option_numbers = {id(flight): i for i, flight in enumerate(flights, 1)}
+            picks = [
+                ('Cheapest', analysis['cheapest']),
+                ('Fastest', analysis['fastest']),
+                ('Best value', analysis['best_value']),
+            ]
+            pick_lines = [
+                f"{title}: Flight {option_numbers[id(offer)]}" if id(offer) in option_numbers
+                else f"{title}: {offer.first_segment.carrier_code} {offer.first_segment.number} at ${offer.price} USD (not listed)"
+                for title, offer in picks
+            ]
+            analysis_section = f"\n\nAlready Computed:\n{chr(10).join(pick_lines + analysis['insights'])}"
+
+        # Create prompt for Claude
+        prompt = NARRATIVE_PROMPT_TEMPLATE.format(
+            flight_details=chr(10).join(flight_details),
+            date_section=date_section,
+            analysis_section=analysis_section
+        )
 
-Please provide a well-formatted HTML summary with:
-1. **Cheapest Option:** (mention flight number and key details)
-2. **Fastest Option:** (mention flight number and key details)  
-3. **Best Overall Value:** (considering price, time, and stops)
-4. **Key Insights:** Any patterns or recommendations
+        # The narrative is about the offers and picks, so identical ones reuse it. The date grid and
+        # fare insights shift a little with every run and would otherwise defeat the cache.
+        summary_key = canonical_hash({
+            'model': CLAUDE_MODEL,
+            'max_tokens': CLAUDE_MAX_TOKENS,
+            'template': NARRATIVE_PROMPT_TEMPLATE,
+            'flights': [[flight.itinerary_key, flight.price_cents, flight.duration_minutes] for flight in flights],
+            'picks': pick_lines
+        })
+        cached_summary = summary_cache.get(summary_key)
+        if cached_summary is not None:
+            logging.info("Claude AI narrative served from summary cache")
+            return cached_summary
 
-Format your response with HTML tags like <strong>, <br>, and bullet points for readability. Keep it concise but helpful for booking decisions."""
+        # Check if Claude client is available
+        claude_client = get_claude_client()
+        if not claude_client:
+            logging.error("Claude client not initialized - API key issue")
+            return None
 
         # Call Claude API
         logging.info("Calling Claude API...")
-        response = claude_client.messages.create(
-            model="claude-3-haiku-20240307",  # Free tier friendly model
-            max_tokens=300,  # Increased for better summaries
-            messages=[{
-                "role": "user",
-                "content": prompt
-            }]
-        )
+        with metrics.span('llm_call', model=CLAUDE_MODEL):
+            response = claude_client.messages.create(
+                model=CLAUDE_MODEL,
+                max_tokens=CLAUDE_MAX_TOKENS,
+                messages=[{
+                    "role": "user",
+                    "content": prompt
+                }]
+            )
+        usage = getattr(response, 'usage', None)
+        if usage is not None:
+            metrics.increment('llm_input_tokens', getattr(usage, 'input_tokens', 0) or 0)
+            metrics.increment('llm_output_tokens', getattr(usage, 'output_tokens', 0) or 0)
 
         summary = response.content[0].text
-        logging.info("Claude AI summary generated successfully")
+        summary_cache.put(summary_key, summary)
+        logging.info("Claude AI narrative generated successfully")
         return summary
 
-    except anthropic.RateLimitError:
-        logging.warning("Claude API rate limit exceeded, skipping AI summary.")
-        return "AI summary unavailable due to Claude API rate limits."
-    except anthropic.APIError as e:
-        logging.error(f"Claude API error: {e}")
-        return f"AI summary failed due to API error: {str(e)}"
     except Exception as e:
-        logging.error(f"Unexpected error in Claude summary: {e}")
-        return f"AI summary failed due to unexpected error: {str(e)}"
+        if _is_sdk_error(e, 'anthropic', 'RateLimitError'):
+            logging.warning("Claude API rate limit exceeded, skipping AI narrative.")
+        elif _is_sdk_error(e, 'anthropic', 'APIError'):
+            logging.error(f"Claude API error: {e}")
+        else:
+            logging.error(f"Unexpected error in Claude summary: {e}")
+        return None
 
-def send_email(subject, html_body, recipient):
-    try:
-        msg = MIMEText(html_body, "html")
-        msg["Subject"] = subject
-        msg["From"] = EMAIL_USER
-        msg["To"] = recipient
+def _describe_leg(leg):
+    """One leg for the Claude prompt, with any overnight or short connections"""
+    dep_seg = leg.first_segment
+    arr_seg = leg.last_segment
+    connections = [
+        f"{airport} {minutes // 60}h {minutes % 60}m"
+        + (" overnight" if overnight else "")
+        + (" below minimum connection time" if short else "")
+        for airport, minutes, overnight, short in zip(leg.stop_airports, leg.layover_minutes, leg.overnight, leg.short_connection)
+    ]
+    return (
+        f"{dep_seg.carrier_code} {dep_seg.departure_airport}→{arr_seg.arrival_airport}, "
+        f"Departs: {dep_seg.departure_at.isoformat(timespec='minutes')}, Arrives: {arr_seg.arrival_at.isoformat(timespec='minutes')}, "
+        f"Duration: {leg.duration_minutes // 60}h {leg.duration_minutes % 60}m, Stops: {leg.stops}"
+        + (f" (via {', '.join(connections)})" if connections else "")
+    )
+
+def build_summary(route, flights, all_flights, price_matrix, fare_stats=None):
+    """Local cheapest/fastest/best-value analysis and fare history, with an optional Claude narrative"""
+    analysis = analyze_offers(all_flights, price_matrix, RANK_WEIGHTS, (route.departure_date, route.return_date))
+    if analysis and fare_stats:
+        from fare_analytics import fare_insights
+        analysis['insights'].extend(fare_insights(fare_stats, price_matrix))
+    summary = render_analysis_html(analysis, flights)
 
-        with smtplib.SMTP_SSL("smtp.gmail.com", 465) as server:
-            server.login(EMAIL_USER, EMAIL_PASS)
-            server.sendmail(EMAIL_USER, recipient, msg.as_string())
+    if AI_NARRATIVE_ENABLED:
+        narrative = summarize_with_claude(flights, price_matrix, analysis)
+        if narrative:
+            summary += f'<div style="margin-top:16px; padding-top:16px; border-top:1px solid #d1d5db;"><strong>🤖 AI Insights:</strong><br>{narrative}</div>'
+    return summary
 
-        logging.info(f"Email sent to {recipient}")
+def send_emails(messages):
+    """
+    Send (subject, html_body, recipients) messages over the run's SMTP session.
+    Returns 'sent', 'queued' or 'failed' for each message.
+    """
+    if not messages:
+        return []
+    try:
+        return get_mailer().send(messages)
     except Exception as e:
+        metrics.increment('email_failures')
         logging.error(f"Email sending failed: {e}")
+        return ['failed'] * len(messages)
+
+def send_email(subject, html_body, recipients):
+    send_emails([(subject, html_body, recipients)])
+
+def route_recipients(route):
+    return list(route.recipients) or SEND_TO
+
+def build_messages(reports):
+    """
+    Render a run's emails as (subject, html_body, recipients), returns the
+    messages and, for each message, the reports it covers.
+
+    Per-route reports send each route to its recipients. The combined report
+    sends every recipient one digest of their routes; recipients with the same
+    routes share one message.
+    """
+    route_bodies = {}
+
+    def route_email(report):
+        route = report['route']
+        if route not in route_bodies:
+            route_bodies[route] = build_email_body(
+                report['flights'], report['departure_dates'], report['return_dates'], report['summary'],
+                report['origin'], report['destination'], get_amadeus(), report['price_matrix'], report['changes'],
+                report['changes_only']
+            )
+        return route_bodies[route]
+
+    def title(selected):
+        return "Flight Price Alert" if any(report['alerts'] for report in selected) else "Flight Search Results"
+
+    if len(reports) == 1:
+        report = reports[0]
+        return [(title(reports), route_email(report), route_recipients(report['route']))], [reports]
+    if WATCHLIST_REPORT == 'per_route':
+        sent_reports = [report for report in reports if report['offer_count']]
+        return [
+            (f"{title([report])} - {report['route'].name}", route_email(report), route_recipients(report['route']))
+            for report in sent_reports
+        ], [[report] for report in sent_reports]
+
+    digests = {}
+    for recipient in parse_recipients([address for report in reports for address in route_recipients(report['route'])]):
+        routes = tuple(i for i, report in enumerate(reports) if recipient in route_recipients(report['route']))
+        digests.setdefault(routes, []).append(recipient)
+    messages, message_reports = [], []
+    for routes, recipients in digests.items():
+        selected = [reports[i] for i in routes]
+        message_reports.append(selected)
+        if len(selected) == 1:
+            messages.append((f"{title(selected)} - {selected[0]['route'].name}", route_email(selected[0]), recipients))
+        else:
+            subject = "Flight Watchlist Alert" if any(report['alerts'] for report in selected) else "Flight Watchlist Results"
+            messages.append((f"{subject} - {len(selected)} routes", build_watchlist_email_body(selected, get_amadeus()), recipients))
+    return messages, message_reports
 
 # --- Main Job ---
-def run_job():
+def prepare_route_report(route, search_results):
+    """
+    Everything in a route report except the summary: ranking, price history,
+    fare statistics, changes and alerts. Uses the price history, so it runs on
+    the thread that owns its connection.
+    """
+    price_matrix = build_price_matrix(search_results)
+    departure_dates, return_dates = matrix_axes(price_matrix)
+
+    all_flights = []
+    for result in search_results:
+        all_flights.extend(result['flights'])
+
+    report = {
+        'route': route,
+        'origin': route.origin,
+        'destination': route.destination,
+        'flights': [],
+        'departure_dates': departure_dates,
+        'return_dates': return_dates,
+        'summary': None,
+        'price_matrix': price_matrix,
+        'offer_count': 0,
+        'changes': None,
+        'changes_only': False,  # Whether flights holds only the new and cheaper offers
+        'fare_stats': None,
+        'top_flights': [],
+        'unique_flights': [],
+        'alerts': [],
+        'notify': not route.alert_rules,  # Whether the summary and email are built for this route
+    }
+    if not all_flights:
+        logging.warning(f"No flights found for any date combination on {route.name}")
+        return report
+
+    # Only the best offers across all date combinations reach the summary and email
+    unique_flights = dedupe_offers(all_flights)
+    report['offer_count'] = len(unique_flights)
+    report['unique_flights'] = unique_flights
+    report['top_flights'] = report['flights'] = select_top_offers(unique_flights, TOP_OFFERS, RANK_BY, RANK_WEIGHTS)
+
+    # Cached searches were recorded by the run that fetched them, only fresh cells are new observations.
+    # A failed search says nothing about its cell, so its previous offers are not reported as gone.
+    fresh_results = [result for result in search_results if result['cached_at'] is None and not result['failed']]
+    fresh_flights = [flight for result in fresh_results for flight in result['flights']]
+    run_id = None
+    if fresh_results:
+        run_id = price_history.record_run(route.origin, route.destination, fresh_flights)
+    else:
+        logging.info(f"Every search for {route.name} was served from the search cache or failed, no new observations to record")
+    # fare_analytics pulls in NumPy, so it is imported once there is history to analyze
+    from fare_analytics import route_fare_stats
+    report['fare_stats'] = route_fare_stats(
+        price_history, route.origin, route.destination,
+        window_days=FARE_STATS_WINDOW_DAYS, min_observations=FARE_MIN_OBSERVATIONS, history_days=FARE_HISTORY_DAYS
+    )
+
+    fresh_cells = {(result['departure_date'], result['return_date']) for result in fresh_results}
+    changes = price_history.compute_changes(run_id, PRICE_DROP_THRESHOLD_PCT, fresh_cells) if run_id is not None else None
+    if changes is not None:
+        report['changes'] = resolve_changes(changes, all_flights)
+        if EMAIL_CHANGES_ONLY:
+            changed = list(report['changes']['new'])
+            changed += [offer for offer, _ in report['changes']['price_drops']]
+            report['flights'] = select_top_offers(dedupe_offers(changed), TOP_OFFERS, RANK_BY, RANK_WEIGHTS)
+            report['changes_only'] = True
+
+    report['alerts'], report['notify'] = check_alerts(route, fresh_flights, run_id, fresh_cells)
+    if report['notify'] and route.alert_rules and not report['alerts']:
+        # A due digest shows the full top offers, the changes stay in the "Since" block
+        report['flights'] = report['top_flights']
+        report['changes_only'] = False
+    # The offer each alert names gets a card, even an unchanged one left out by EMAIL_CHANGES_ONLY
+    shown = {offer.itinerary_key for offer in report['flights']}
+    alerted = []
+    for alert in report['alerts']:
+        offer = alert['offers'][0]
+        if offer.itinerary_key not in shown:
+            shown.add(offer.itinerary_key)
+            alerted.append(offer)
+    if alerted:
+        report['flights'] = report['flights'] + alerted
+    return report
+
+def check_alerts(route, offers, run_id, cells=None):
+    """
+    The route's alerts that fired and whether its report should be sent:
+    always without alert rules, otherwise when a rule fired or the digest is due.
+    Without a new run (run_id None) the offers were already checked when they were fetched.
+    """
+    if not route.alert_rules:
+        return [], True
+    alerts = []
+    if run_id is not None:
+        alerts = evaluate_rules(route.alert_rules, offers, price_history.previous_prices(run_id, cells))
+    for alert in alerts:
+        metrics.increment('alerts_fired', rule=alert['rule'].rule)
+        logging.info(f"Alert on {route.name}: {alert['rule'].description} ({len(alert['offers'])} offers)")
+    if alerts:
+        return alerts, True
+    return alerts, digest_due(route)
+
+def digest_due(route):
+    """True when the route's report has not been sent for DIGEST_EVERY_DAYS days"""
+    if DIGEST_EVERY_DAYS is None:
+        logging.info(f"No alerts on {route.name}, skipping its report")
+        return False
+    last_notified = price_history.last_notified_at(route.origin, route.destination)
+    if last_notified is None or (datetime.now().date() - last_notified.date()).days >= DIGEST_EVERY_DAYS:
+        logging.info(f"No alerts on {route.name}, sending the digest (last sent {last_notified or 'never'})")
+        return True
+    logging.info(f"No alerts on {route.name} and the digest is not due (last sent {last_notified:%Y-%m-%d}), skipping its report")
+    return False
+
+def summarize_route_report(report):
+    """
+    Add the alerts, local analysis and Claude narrative to a report that will be sent.
+    Option numbers refer to the flights the email shows, which are only the changes with EMAIL_CHANGES_ONLY.
+    """
+    if report['offer_count'] and report['notify']:
+        report['summary'] = render_alerts_html(report['alerts']) + build_summary(
+            report['route'], report['flights'], report['unique_flights'], report['price_matrix'], report['fare_stats']
+        )
+    return report
+
+def resolve_changes(changes, offers):
+    """Map the keys returned by PriceHistory.compute_changes back to this run's offers"""
+    by_key = {}
+    for offer in offers:
+        key = (offer.departure_date, offer.return_date, itinerary_id(offer))
+        if key not in by_key or offer.price_cents < by_key[key].price_cents:
+            by_key[key] = offer
+
+    new = [by_key[key] for key in changes['new'] if key in by_key]
+    drops = [(by_key[key], previous) for key, previous in changes['price_drops'].items() if key in by_key]
+    drops.sort(key=lambda drop: drop[0].price_cents - drop[1])
+    logging.info(
+        f"Since {changes['previous_observed_at']}: {len(new)} new offers, {len(drops)} price drops, "
+        f"{len(changes['disappeared'])} offers gone"
+    )
+    return {
+        'previous_observed_at': changes['previous_observed_at'],
+        'new': new,
+        'price_drops': drops,
+        'disappeared': changes['disappeared'],
+    }
+
+def export_metrics():
+    """Write this run's metrics JSON and, if configured, the Prometheus textfile"""
+    try:
+        snapshot = metrics.snapshot()
+        metrics.write_json(state_path(METRICS_FILE), snapshot)
+        # Replay runs are not reported to monitoring
+        if PROMETHEUS_TEXTFILE and not OFFLINE:
+            metrics.write_prometheus(PROMETHEUS_TEXTFILE, snapshot)
+    except Exception as e:
+        logging.error(f"Could not write run metrics: {e}")
+
+def build_search_grids(routes):
+    """{route: date combinations} for every route, cells with a known price history first"""
+    grids = {}
+    for route in routes:
+        grids[route] = build_date_grid(
+            route.departure_date, route.return_date,
+            departure_flex_days=route.departure_flex_days,
+            return_flex_days=route.return_flex_days,
+            min_stay_days=route.min_stay_days,
+            max_stay_days=route.max_stay_days,
+            max_cells=route.max_date_combinations,
+            price_hints=price_history.latest_cell_prices(route.origin, route.destination)
+        )
+        if not grids[route]:
+            logging.warning(f"No valid date combinations left for {route.name} after applying the date window and stay limits")
+    return grids
+
+async def expand_city_codes_async(routes):
+    """
+    {code: airports} for every origin and destination, with city codes
+    resolved to their busiest member airports concurrently.
+    """
+    codes = sorted({code for route in routes for code in (route.origin, route.destination)})
+    if not EXPAND_CITY_CODES:
+        return {code: [code] for code in codes}
+
+    with metrics.span('stage', stage='expand'):
+        resolved = await asyncio.gather(*(
+            asyncio.to_thread(cache.get_city_airports, code, get_amadeus()) for code in codes
+        ))
+    airports = {code: members[:MAX_AIRPORTS_PER_CITY] for code, members in zip(codes, resolved)}
+    for code, members in airports.items():
+        if members != [code]:
+            logging.info(f"City code {code} expanded to {', '.join(members)}")
+    return airports
+
+def airport_pairs(route, airports):
+    """Every origin × destination airport pair to search for a route"""
+    return [
+        (origin, destination)
+        for origin in airports[route.origin]
+        for destination in airports[route.destination]
+        if origin != destination
+    ]
+
+async def route_report_async(route, combinations, pairs, executor):
+    """
+    Search one route and build its report, overlapping what does not depend on each other.
+
+    Every airport pair and date combination goes to the shared executor along
+    with every other route's searches, and the results are merged into one
+    ranking. Once they are back, and only if an alert fired or the digest is
+    due, the Claude narrative and the airline/airport name prefetch for the
+    email run side by side in worker threads.
+    """
+    with metrics.span('stage', stage='search'):
+        search_results = await run_searches_async(
+            lambda route, origin, destination, dep, ret: search_flights(origin, destination, dep, ret, route.max_results, route.max_stops),
+            [(route, origin, destination, dep, ret) for origin, destination in pairs for dep, ret in combinations],
+            executor
+        )
+    metrics.increment('searches', len(search_results))
+    failed = sum(result['failed'] for result in search_results)
+    if failed:
+        metrics.increment('searches_failed', failed)
+        logging.warning(f"{failed} of {len(search_results)} searches for {route.name} failed, their dates are left out of the changes and alerts")
+
+    with metrics.span('stage', stage='summarize'):
+        # Price history and analytics are local and quick, they stay on the event loop thread
+        report = prepare_route_report(route, search_results)
+        if report['offer_count'] and report['notify']:
+            await asyncio.gather(
+                asyncio.to_thread(summarize_route_report, report),
+                asyncio.to_thread(prefetch_reference_names, [report], get_amadeus()),
+            )
+    return report
+
+async def run_job_async():
+    """
+    Run the search job with independent stages running concurrently.
+
+    Every date search of every route is submitted at once, with
+    MAX_CONCURRENT_SEARCHES running at a time. Each route's report is built as
+    soon as its own searches finish, while other routes are still searching.
+    The Amadeus, Anthropic and SMTP clients are blocking, so their calls run
+    in worker threads. From code that already runs an event loop, await this
+    instead of calling run_job().
+    """
+    check_environment()
+    metrics.reset()
     try:
+        routes = load_routes()
+
         # Validate parameters first
-        validation_errors = validate_search_parameters()
+        validation_errors = validate_search_parameters(routes)
         if validation_errors:
             error_msg = "Configuration errors found:\n" + "\n".join(validation_errors)
             logging.error(error_msg)
-            send_email("Flight Search FAILED - Configuration Error", f"<p>{error_msg.replace(chr(10), '<br>')}</p>", SEND_TO)
+            await asyncio.to_thread(send_email, "Flight Search FAILED - Configuration Error", f"<p>{error_msg.replace(chr(10), '<br>')}</p>", SEND_TO)
             return
 
-        departure_dates = [DEPARTURE_DATE]
-        return_dates = [RETURN_DATE]
-        
-        # Add next day options separately for departure and return
-        if ALLOW_DEPARTURE_NEXT_DAY:
-            dep_plus = (datetime.strptime(DEPARTURE_DATE, "%Y-%m-%d") + timedelta(days=1)).strftime("%Y-%m-%d")
-            departure_dates.append(dep_plus)
-            
-        if ALLOW_RETURN_NEXT_DAY:
-            ret_plus = (datetime.strptime(RETURN_DATE, "%Y-%m-%d") + timedelta(days=1)).strftime("%Y-%m-%d")
-            return_dates.append(ret_plus)
-
-        logging.info(f"Searching {len(departure_dates)} departure dates × {len(return_dates)} return dates = {len(departure_dates) * len(return_dates)} combinations")
-
-        all_flights = []
-        for dep in departure_dates:
-            for ret in return_dates:
-                flights = search_flights(ORIGIN, DESTINATION, dep, ret, MAX_RESULTS)
-                all_flights.extend(flights)
-
-        if not all_flights:
+        grids = build_search_grids(routes)
+        airports = await expand_city_codes_async(routes)
+        pairs = {route: airport_pairs(route, airports) for route in routes}
+        search_count = sum(len(grids[route]) * len(pairs[route]) for route in routes)
+        if not search_count:
+            error_msg = "No valid date combinations left after applying the date window and stay limits"
+            logging.error(error_msg)
+            await asyncio.to_thread(send_email, "Flight Search FAILED - Configuration Error", f"<p>{error_msg}</p>", SEND_TO)
+            return
+
+        logging.info(f"Searching {search_count} airport pair and date combinations across {len(routes)} route(s)")
+
+        # One pool for every route's searches, so the concurrency limit applies to the whole watchlist
+        with ThreadPoolExecutor(max_workers=MAX_CONCURRENT_SEARCHES, thread_name_prefix="flight-search") as executor:
+            reports = await asyncio.gather(*(route_report_async(route, grids[route], pairs[route], executor) for route in routes))
+
+        if not any(report['offer_count'] for report in reports):
             logging.warning("No flights found for any date combination")
-            send_email("Flight Search Results - No Flights Found", 
-                      "<p>No flights found for your search criteria. Try adjusting your dates or increasing MAX_STOPS.</p>", 
-                      SEND_TO)
+            await asyncio.to_thread(
+                send_email, "Flight Search Results - No Flights Found",
+                "<p>No flights found for your search criteria. Try adjusting your dates or increasing MAX_STOPS.</p>",
+                parse_recipients([address for route in routes for address in route_recipients(route)])
+            )
             return
 
-        summary = summarize_with_claude(all_flights)
-        html_body = build_email_body(all_flights, departure_dates, return_dates, summary, ORIGIN, DESTINATION, amadeus)
+        # Quiet routes skip the summary, rendering and sending altogether
+        notify_reports = [report for report in reports if report['notify']]
+        metrics.increment('reports_skipped', len(reports) - len(notify_reports))
+        messages, message_reports = [], []
+        if notify_reports:
+            with metrics.span('stage', stage='render'):
+                messages, message_reports = await asyncio.to_thread(build_messages, notify_reports)
+            metrics.increment('rendered_bytes', sum(len(html_body.encode('utf-8')) for _, html_body, _ in messages))
+        else:
+            logging.info("No alerts fired and no digest is due, nothing to send")
         
+        # Persist any airport/airline names and summaries learned during this run
+        cache.flush()
+        summary_cache.flush()
+        search_cache.flush()
+
         # Log cache statistics
         cache_stats = cache.get_cache_stats()
         logging.info(f"Cache stats: {cache_stats['airlines_cached']} airlines, {cache_stats['airports_cached']} airports cached")
+        summary_stats = cache_stats['summary_cache']
+        logging.info(f"Summary cache: {summary_stats['hits']} hits, {summary_stats['misses']} misses, {summary_stats['entries']} entries")
+        search_stats = cache_stats['search_cache']
+        logging.info(
+            f"Search cache: {search_stats['hits']} hits, {search_stats['misses']} misses "
+            f"({search_stats['hit_rate']:.0%} hit rate), {search_stats['entries']} entries"
+        )
+        api_stats = amadeus_api_guard.get_stats()
+        logging.info(
+            f"Amadeus calls: {api_stats['calls']} attempts, {api_stats['throttled']} throttled, "
+            f"{api_stats['retried']} retried, {api_stats['failed']} failed, {api_stats['wait_seconds']:.2f}s waiting for rate limit"
+        )
         
-        send_email("Flight Search Results", html_body, SEND_TO)
+        if messages:
+            with metrics.span('stage', stage='send'):
+                outcomes = await asyncio.to_thread(send_emails, messages)
+            # A route counts as notified once one of its messages is delivered or queued, failed ones are retried next run
+            notified = {
+                report['route'] for outcome, reports_sent in zip(outcomes, message_reports)
+                if outcome in ('sent', 'queued') for report in reports_sent
+            }
+            for route in notified:
+                price_history.record_notification(route.origin, route.destination)
 
     except Exception as e:
         logging.critical(f"Unexpected failure: {e}")
-        send_email("Flight Search FAILED", f"<p>Error: {e}</p>", SEND_TO)
+        await asyncio.to_thread(send_email, "Flight Search FAILED", f"<p>Error: {e}</p>", SEND_TO)
+    finally:
+        close_mailer()
+        export_metrics()
 
-if __name__ == "__main__":
+def run_job():
+    """Run the search job to completion, see run_job_async()"""
+    asyncio.run(run_job_async())
+
+def main():
+    configure_logging()
     run_job()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,336 @@
+import json
+import logging
+import os
+import random
+import smtplib
+import ssl
+import threading
+import time
+from datetime import datetime, timedelta
+from email.mime.text import MIMEText
+from email.utils import formatdate
+from cache_manager import write_json_atomic
+from ttl_cache import canonical_hash
+from metrics import metrics
+
+SMTP_SECURITY_MODES = ('ssl', 'starttls', 'none')
+
+def parse_recipients(value):
+    """Addresses from a comma or semicolon separated string (as in EMAIL_RECEIVER) or a list, without duplicates"""
+    if not value:
+        return []
+    if isinstance(value, str):
+        value = value.replace(';', ',').split(',')
+    recipients = []
+    for address in value:
+        address = address.strip()
+        if address and address not in recipients:
+            recipients.append(address)
+    return recipients
+
+def is_transient(error):
+    """Disconnects, timeouts and 4xx replies may succeed on a new attempt, 5xx replies will not"""
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return all(400 <= code < 500 for code, _ in error.recipients.values())
+    if isinstance(error, smtplib.SMTPNotSupportedError):
+        return False
+    code = getattr(error, 'smtp_code', None)
+    if code is not None:
+        return 400 <= code < 500
+    # SMTPServerDisconnected, refused connections, timeouts and DNS failures are all OSErrors
+    return isinstance(error, OSError)
+
+def rejects_message(error):
+    """The server refused this message or its recipients, sending it again later would not help"""
+    if isinstance(error, (smtplib.SMTPRecipientsRefused, smtplib.SMTPSenderRefused, smtplib.SMTPDataError)):
+        return not is_transient(error)
+    return False
+
+def build_mime(subject, html_body, sender, recipients):
+    msg = MIMEText(html_body, "html")
+    msg["Subject"] = subject
+    msg["From"] = sender
+    msg["To"] = ", ".join(recipients)
+    msg["Date"] = formatdate(localtime=True)
+    return msg.as_string()
+
+class MailQueue:
+    """
+    Messages that could not be delivered, one JSON file each.
+
+    The next run sends them before its own messages. Messages older than
+    max_age_hours are dropped instead, a stale price alert is worse than none.
+    """
+
+    def __init__(self, directory, max_age_hours=72):
+        self.directory = directory
+        self.max_age = timedelta(hours=max_age_hours)
+
+    def put(self, subject, html_body, recipients, error, path=None):
+        """Queue a message, or record another failed attempt of the queued message at path"""
+        record = {
+            'subject': subject,
+            'html_body': html_body,
+            'recipients': list(recipients),
+            'queued_at': datetime.now().isoformat(timespec='seconds'),
+            'attempts': 1,
+        }
+        if path:
+            record.update(self._read(path) or {})
+            record['attempts'] += 1
+        else:
+            name = f"{datetime.now():%Y%m%d-%H%M%S-%f}-{canonical_hash([subject, record['recipients'], html_body])[:12]}.json"
+            path = os.path.join(self.directory, name)
+        record['last_error'] = str(error)
+        write_json_atomic(path, record)
+        return path
+
+    def _read(self, path):
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            logging.warning(f"Skipping unreadable queued email {path}: {e}")
+            return None
+
+    def pending(self):
+        """(path, record) of every queued message, oldest first; expired ones are removed"""
+        if not os.path.isdir(self.directory):
+            return []
+        cutoff = datetime.now() - self.max_age
+        messages = []
+        for name in sorted(os.listdir(self.directory)):
+            if not name.endswith('.json'):
+                continue
+            path = os.path.join(self.directory, name)
+            record = self._read(path)
+            if record is None:
+                continue
+            if datetime.fromisoformat(record['queued_at']) < cutoff:
+                logging.warning(f"Dropping queued email older than {self.max_age}: {record['subject']}")
+                self.remove(path)
+                continue
+            messages.append((path, record))
+        return messages
+
+    def remove(self, path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def __len__(self):
+        if not os.path.isdir(self.directory):
+            return 0
+        return sum(1 for name in os.listdir(self.directory) if name.endswith('.json'))
+
+class Mailer:
+    """
+    Sends emails over one authenticated SMTP session, opened by the first
+    message and reused until close().
+
+    Transient failures reconnect and retry with jittered exponential backoff.
+    When the server stays unavailable, this message and the rest of the run's
+    messages go to the queue and are sent first by the next run. Messages the
+    server rejects outright are logged and dropped. Safe to use from many
+    threads, messages are sent one at a time.
+    """
+
+    def __init__(self, host, port, user, password, security='ssl', timeout=30, max_retries=3, backoff_base=2.0, queue=None):
+        if security not in SMTP_SECURITY_MODES:
+            raise ValueError(f"SMTP_SECURITY should be one of {', '.join(SMTP_SECURITY_MODES)}, got {security}")
+        self.host = host
+        self.port = port
+        self.user = user
+        self.password = password
+        self.security = security
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.queue = queue
+        self.counters = {'sessions': 0, 'sent': 0, 'retried': 0, 'queued': 0, 'failed': 0, 'sent_from_queue': 0}
+        self._server = None
+        self._unavailable = None
+        self._queue_checked = False
+        self._lock = threading.RLock()
+
+    def _connect(self):
+        with metrics.span('smtp_connect'):
+            if self.security == 'ssl':
+                server = smtplib.SMTP_SSL(self.host, self.port, timeout=self.timeout)
+            else:
+                server = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+                server.ehlo_or_helo_if_needed()
+                if self.security == 'starttls':
+                    server.starttls(context=ssl.create_default_context())
+            try:
+                # Local test servers often do not offer AUTH at all
+                if self.password and (self.security != 'none' or server.has_extn('auth')):
+                    server.login(self.user, self.password)
+            except BaseException:
+                _close_quietly(server)
+                raise
+        self.counters['sessions'] += 1
+        logging.info(f"SMTP session opened to {self.host}:{self.port}")
+        return server
+
+    def _close_session(self):
+        if self._server is not None:
+            _close_quietly(self._server)
+            self._server = None
+
+    def _deliver(self, subject, html_body, recipients):
+        """Send one message, reconnecting and retrying transient failures; raises the last error"""
+        payload = build_mime(subject, html_body, self.user, recipients)
+        attempt = 0
+        while True:
+            try:
+                if self._server is None:
+                    self._server = self._connect()
+                with metrics.span('smtp_send'):
+                    refused = self._server.sendmail(self.user, recipients, payload)
+                break
+            except Exception as e:
+                # After a reply the session is still usable, anything else leaves it in an unknown state
+                if getattr(e, 'smtp_code', None) is None and not isinstance(e, smtplib.SMTPRecipientsRefused):
+                    self._close_session()
+                if attempt >= self.max_retries or not is_transient(e):
+                    raise
+                delay = random.uniform(0, self.backoff_base * 2 ** attempt)
+                attempt += 1
+                self.counters['retried'] += 1
+                logging.warning(f"SMTP error ({e}), retry {attempt}/{self.max_retries} in {delay:.1f}s")
+                time.sleep(delay)
+
+        for address, (code, reply) in (refused or {}).items():
+            logging.error(f"Recipient {address} refused ({code}): {reply}")
+        self.counters['sent'] += 1
+        metrics.increment('emails_sent')
+        metrics.increment('email_bytes_sent', len(payload))
+        logging.info(f"Email sent to {', '.join(recipients)}: {subject}")
+
+    def _pending(self):
+        """Queued messages from earlier runs, checked once per session"""
+        if self.queue is None or self._queue_checked:
+            return []
+        self._queue_checked = True
+        pending = self.queue.pending()
+        if pending:
+            logging.info(f"Sending {len(pending)} queued email(s) from earlier runs")
+        return [(record['subject'], record['html_body'], record['recipients'], path) for path, record in pending]
+
+    def send(self, messages):
+        """
+        Deliver (subject, html_body, recipients) messages after any queued ones.
+        Returns 'sent', 'queued' or 'failed' for each of messages, in order.
+        """
+        with self._lock:
+            for subject, html_body, recipients, queued_path in self._pending():
+                self._send_one(subject, html_body, recipients, queued_path)
+            return [self._send_one(subject, html_body, recipients) for subject, html_body, recipients in messages]
+
+    def _send_one(self, subject, html_body, recipients, queued_path=None):
+        recipients = parse_recipients(recipients)
+        if not recipients:
+            logging.error(f"No recipients for email: {subject}")
+            return 'failed'
+        error = self._unavailable
+        if error is None:
+            try:
+                self._deliver(subject, html_body, recipients)
+                if queued_path:
+                    self.counters['sent_from_queue'] += 1
+                    self.queue.remove(queued_path)
+                return 'sent'
+            except Exception as e:
+                error = e
+            if rejects_message(error):
+                self.counters['failed'] += 1
+                metrics.increment('email_failures')
+                logging.error(f"Email to {', '.join(recipients)} rejected, not retrying: {error}")
+                if queued_path:
+                    self.queue.remove(queued_path)
+                return 'failed'
+            # Do not wait through the retries again for every remaining message
+            self._unavailable = error
+            logging.error(f"SMTP server unavailable: {error}")
+        return self._enqueue(subject, html_body, recipients, error, queued_path)
+
+    def _enqueue(self, subject, html_body, recipients, error, queued_path):
+        if self.queue is None:
+            self.counters['failed'] += 1
+            metrics.increment('email_failures')
+            logging.error(f"Email to {', '.join(recipients)} not sent: {subject}")
+            return 'failed'
+        try:
+            path = self.queue.put(subject, html_body, recipients, error, queued_path)
+        except OSError as e:
+            self.counters['failed'] += 1
+            metrics.increment('email_failures')
+            logging.error(f"Could not queue email to {', '.join(recipients)}: {e}")
+            return 'failed'
+        if not queued_path:
+            self.counters['queued'] += 1
+            metrics.increment('emails_queued')
+            logging.warning(f"Email to {', '.join(recipients)} queued in {path}: {subject}")
+        return 'queued'
+
+    def close(self):
+        """End the session; the next send() opens a new one and checks the queue again"""
+        with self._lock:
+            self._close_session()
+            self._unavailable = None
+            self._queue_checked = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+    def get_stats(self):
+        stats = dict(self.counters)
+        if self.queue is not None:
+            stats['queue_pending'] = len(self.queue)
+        return stats
+
+class OutboxMailer:
+    """Drop-in for Mailer that writes each email to an HTML file instead of sending it"""
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.counters = {'written': 0}
+
+    def send(self, messages):
+        """Write each message to its own file, returns 'sent' for each"""
+        os.makedirs(self.directory, exist_ok=True)
+        stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+        for subject, html_body, recipients in messages:
+            self.counters['written'] += 1
+            path = os.path.join(self.directory, f"{stamp}-{self.counters['written']}.html")
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write(html_body)
+            logging.info(f"Email for {', '.join(parse_recipients(recipients))} written to {path}: {subject}")
+        return ['sent'] * len(messages)
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def get_stats(self):
+        return dict(self.counters)
+
+def _close_quietly(server):
+    try:
+        server.quit()
+    except Exception:
+        try:
+            server.close()
+        except Exception:
+            pass
@@ -0,0 +1,210 @@
+import contextvars
+import logging
+import math
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from functools import wraps
+from cache_manager import write_json_atomic
+
+METRIC_PREFIX = "flight_search"
+
+# Individual spans kept for the trace section of the JSON, aggregates are always complete
+MAX_TRACE_SPANS = 2000
+
+def _label_key(labels):
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+def _metric_name(name):
+    return f"{METRIC_PREFIX}_{''.join(c if c.isalnum() else '_' for c in name)}"
+
+def _escape_label_value(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _format_labels(pairs):
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape_label_value(value)}"' for key, value in pairs) + "}"
+
+class MetricsRegistry:
+    """
+    Per-run spans and counters, written out once at the end of a run.
+
+    span() times a block and aggregates count/total/max per name and label
+    set, and keeps the individual spans with their parent for a simple trace.
+    increment() adds to a counter. Objects registered with register_source()
+    are asked for their get_cache_stats()/get_stats() numbers at export time,
+    the same way AirportAirlineCache collects its stats sources. Safe to use
+    from many threads; the current span is tracked per thread and per asyncio
+    task, so concurrent tasks get the right parents.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._current_span = contextvars.ContextVar(f"metrics_span_{id(self)}", default=None)
+        self.sources = {}
+        self.reset()
+
+    def reset(self):
+        """Start a new run"""
+        with self._lock:
+            self.started_at = datetime.now()
+            self._started = time.perf_counter()
+            self.span_totals = {}
+            self.counters = {}
+            self.spans = []
+            self.dropped_spans = 0
+
+    @contextmanager
+    def span(self, name, **labels):
+        parent = self._current_span.get()
+        token = self._current_span.set(name)
+        started = time.perf_counter()
+        error = None
+        try:
+            yield
+        except BaseException as e:
+            error = type(e).__name__
+            raise
+        finally:
+            duration = time.perf_counter() - started
+            self._current_span.reset(token)
+            self._record_span(name, labels, parent, started, duration, error)
+
+    def timed(self, name, **labels):
+        """Decorator form of span()"""
+        def decorator(fn):
+            @wraps(fn)
+            def wrapper(*args, **kwargs):
+                with self.span(name, **labels):
+                    return fn(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def _record_span(self, name, labels, parent, started, duration, error):
+        key = (name, _label_key(labels))
+        with self._lock:
+            total = self.span_totals.setdefault(key, {'count': 0, 'seconds': 0.0, 'max_seconds': 0.0, 'errors': 0})
+            total['count'] += 1
+            total['seconds'] += duration
+            total['max_seconds'] = max(total['max_seconds'], duration)
+            if error:
+                total['errors'] += 1
+            if len(self.spans) < MAX_TRACE_SPANS:
+                self.spans.append({
+                    'name': name,
+                    'labels': dict(key[1]),
+                    'parent': parent,
+                    'thread': threading.current_thread().name,
+                    'start_seconds': round(started - self._started, 6),
+                    'duration_seconds': round(duration, 6),
+                    **({'error': error} if error else {}),
+                })
+            else:
+                self.dropped_spans += 1
+
+    def increment(self, name, amount=1, **labels):
+        key = (name, _label_key(labels))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+    def register_source(self, name, source):
+        """Export the numbers of an object with get_cache_stats() or get_stats()"""
+        self.sources[name] = source
+
+    def _source_stats(self):
+        stats = {}
+        for name, source in self.sources.items():
+            getter = getattr(source, 'get_cache_stats', None) or getattr(source, 'get_stats')
+            try:
+                stats[name] = getter()
+            except Exception as e:
+                logging.warning(f"Could not collect metrics from {name}: {e}")
+        return stats
+
+    def snapshot(self):
+        """All metrics of the current run as a JSON-serializable dict"""
+        sources = self._source_stats()
+        with self._lock:
+            return {
+                'started_at': self.started_at.isoformat(timespec='seconds'),
+                'duration_seconds': round(time.perf_counter() - self._started, 6),
+                'spans': [
+                    {'name': name, 'labels': dict(labels), **total}
+                    for (name, labels), total in sorted(self.span_totals.items())
+                ],
+                'counters': [
+                    {'name': name, 'labels': dict(labels), 'value': value}
+                    for (name, labels), value in sorted(self.counters.items())
+                ],
+                'sources': sources,
+                'trace': list(self.spans),
+                'dropped_spans': self.dropped_spans,
+            }
+
+    def write_json(self, path, snapshot=None):
+        write_json_atomic(path, snapshot or self.snapshot())
+        logging.info(f"Run metrics written to {path}")
+
+    def prometheus_text(self, snapshot=None):
+        """Render a snapshot in the Prometheus text exposition format"""
+        snapshot = snapshot or self.snapshot()
+        lines = [
+            f"# TYPE {METRIC_PREFIX}_last_run_timestamp_seconds gauge",
+            f"{METRIC_PREFIX}_last_run_timestamp_seconds {self.started_at.timestamp():.0f}",
+            f"# TYPE {METRIC_PREFIX}_last_run_duration_seconds gauge",
+            f"{METRIC_PREFIX}_last_run_duration_seconds {snapshot['duration_seconds']}",
+            f"# TYPE {METRIC_PREFIX}_span_seconds summary",
+        ]
+        for span in snapshot['spans']:
+            labels = (('span', span['name']), *sorted(span['labels'].items()))
+            lines.append(f"{METRIC_PREFIX}_span_seconds_count{_format_labels(labels)} {span['count']}")
+            lines.append(f"{METRIC_PREFIX}_span_seconds_sum{_format_labels(labels)} {span['seconds']:.6f}")
+        lines.append(f"# TYPE {METRIC_PREFIX}_span_max_seconds gauge")
+        for span in snapshot['spans']:
+            labels = (('span', span['name']), *sorted(span['labels'].items()))
+            lines.append(f"{METRIC_PREFIX}_span_max_seconds{_format_labels(labels)} {span['max_seconds']:.6f}")
+
+        counter_names = sorted({counter['name'] for counter in snapshot['counters']})
+        for name in counter_names:
+            metric = f"{_metric_name(name)}_total"
+            lines.append(f"# TYPE {metric} counter")
+            for counter in snapshot['counters']:
+                if counter['name'] == name:
+                    lines.append(f"{metric}{_format_labels(tuple(sorted(counter['labels'].items())))} {counter['value']}")
+
+        for source, stats in sorted(snapshot['sources'].items()):
+            for key, value in _flatten(stats):
+                if isinstance(value, bool) or not isinstance(value, (int, float)) or math.isnan(value):
+                    continue
+                metric = _metric_name(f"{source}_{key}")
+                lines.append(f"# TYPE {metric} gauge")
+                lines.append(f"{metric} {value}")
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path, snapshot=None):
+        """Write a textfile for the node_exporter textfile collector, atomically"""
+        directory = os.path.dirname(path) or "."
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                f.write(self.prometheus_text(snapshot))
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+        logging.info(f"Prometheus metrics written to {path}")
+
+def _flatten(stats, prefix=""):
+    for key, value in stats.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            yield from _flatten(value, f"{name}_")
+        else:
+            yield name, value
+
+metrics = MetricsRegistry()
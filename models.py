@@ -0,0 +1,186 @@
+import logging
+import re
+from dataclasses import dataclass
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+from config import MIN_CONNECTION_MINUTES, MIN_CONNECTION_MINUTES_BY_AIRPORT
+
+_DURATION_PATTERN = re.compile(r'^P(?:(\d+)D)?(?:T(?:(\d+)H)?(?:(\d+)M)?)?$')
+
+def parse_duration_minutes(duration_str):
+    """Convert an ISO 8601 duration like PT4H30M or P1DT2H to minutes"""
+    match = _DURATION_PATTERN.match(duration_str or '')
+    if not match:
+        raise ValueError(f"Invalid duration: {duration_str}")
+    days, hours, minutes = (int(part) if part else 0 for part in match.groups())
+    return days * 1440 + hours * 60 + minutes
+
+def parse_datetime(dt_str):
+    """
+    Parse an Amadeus timestamp.
+
+    Amadeus reports segment times in the local time of each airport without an
+    offset, so these stay naive. Timestamps that do carry an offset (or Z) are
+    returned timezone-aware.
+    """
+    return datetime.fromisoformat(dt_str.replace('Z', '+00:00'))
+
+def parse_price_cents(amount):
+    """Convert a decimal price string like '1204.16' to integer cents"""
+    try:
+        return int((Decimal(amount) * 100).to_integral_value())
+    except (InvalidOperation, TypeError) as e:
+        raise ValueError(f"Invalid price: {amount}") from e
+
+@dataclass(slots=True)
+class Segment:
+    carrier_code: str
+    number: str
+    departure_airport: str
+    arrival_airport: str
+    departure_at: datetime
+    arrival_at: datetime
+
+    @classmethod
+    def from_amadeus(cls, segment):
+        return cls(
+            carrier_code=segment['carrierCode'],
+            number=segment['number'],
+            departure_airport=segment['departure']['iataCode'],
+            arrival_airport=segment['arrival']['iataCode'],
+            departure_at=parse_datetime(segment['departure']['at']),
+            arrival_at=parse_datetime(segment['arrival']['at']),
+        )
+
+@dataclass(slots=True)
+class Leg:
+    """
+    One itinerary of an offer, the outbound or the return flight.
+
+    Layovers and the connection flags are measured once, when the offer is
+    parsed, so filtering, ranking and rendering only read them.
+    """
+    segments: tuple
+    duration_minutes: int
+    layover_minutes: tuple   # One entry per stop, aligned with segments[:-1]
+    overnight: tuple         # Per stop: the connection spans midnight at the stop airport
+    short_connection: tuple  # Per stop: the layover is under the minimum connection time
+
+    @classmethod
+    def from_amadeus(cls, itinerary):
+        segments = tuple(Segment.from_amadeus(segment) for segment in itinerary['segments'])
+        if not segments:
+            raise ValueError("itinerary has no segments")
+        layovers, overnight, short_connection = [], [], []
+        for current, following in zip(segments, segments[1:]):
+            layover = int((following.departure_at - current.arrival_at).total_seconds() // 60)
+            layovers.append(layover)
+            overnight.append(following.departure_at.date() > current.arrival_at.date())
+            short_connection.append(layover < MIN_CONNECTION_MINUTES_BY_AIRPORT.get(current.arrival_airport, MIN_CONNECTION_MINUTES))
+        return cls(
+            segments=segments,
+            duration_minutes=parse_duration_minutes(itinerary['duration']),
+            layover_minutes=tuple(layovers),
+            overnight=tuple(overnight),
+            short_connection=tuple(short_connection),
+        )
+
+    @property
+    def stops(self):
+        return len(self.segments) - 1
+
+    @property
+    def first_segment(self):
+        return self.segments[0]
+
+    @property
+    def last_segment(self):
+        return self.segments[-1]
+
+    @property
+    def stop_airports(self):
+        return tuple(segment.arrival_airport for segment in self.segments[:-1])
+
+@dataclass(slots=True)
+class Offer:
+    """
+    A flight offer normalized from the Amadeus response, parsed once per search.
+
+    legs holds the outbound flight and, for round trips, the return flight.
+    The totals cover the whole trip, so filtering and ranking compare round
+    trips rather than outbound flights.
+    """
+    offer_id: str
+    price_cents: int
+    currency: str
+    legs: tuple
+    duration_minutes: int   # Total travel time of all legs
+    stops: int              # Stops of all legs
+    overnight_stops: int    # Connections that span midnight, all legs
+    short_connections: int  # Connections under the minimum connection time, all legs
+    departure_date: str     # Search dates this offer was returned for
+    return_date: str
+    segments: tuple         # Every segment of the trip, outbound first
+    itinerary_key: tuple    # Identifies the same flights, both ways, regardless of which search returned them
+
+    @classmethod
+    def from_amadeus(cls, offer, departure_date=None, return_date=None):
+        legs = tuple(Leg.from_amadeus(itinerary) for itinerary in offer['itineraries'])
+        if not legs:
+            raise ValueError("offer has no itineraries")
+        duration = stops = overnight = short = 0
+        for leg in legs:
+            duration += leg.duration_minutes
+            stops += len(leg.segments) - 1
+            overnight += leg.overnight.count(True)
+            short += leg.short_connection.count(True)
+        segments = tuple(segment for leg in legs for segment in leg.segments)
+        return cls(
+            offer_id=str(offer.get('id', '')),
+            price_cents=parse_price_cents(offer['price']['total']),
+            currency=offer['price'].get('currency', 'USD'),
+            legs=legs,
+            duration_minutes=duration,
+            stops=stops,
+            overnight_stops=overnight,
+            short_connections=short,
+            departure_date=departure_date,
+            return_date=return_date,
+            segments=segments,
+            itinerary_key=tuple(
+                (segment.carrier_code, segment.number, segment.departure_at.isoformat(), segment.arrival_at.isoformat())
+                for segment in segments
+            ),
+        )
+
+    @property
+    def price(self):
+        return Decimal(self.price_cents) / 100
+
+    @property
+    def outbound(self):
+        return self.legs[0]
+
+    @property
+    def inbound(self):
+        """The return leg, None for one-way offers"""
+        return self.legs[1] if len(self.legs) > 1 else None
+
+    @property
+    def max_leg_stops(self):
+        """Stops of the leg with the most, what MAX_STOPS limits"""
+        return max(leg.stops for leg in self.legs)
+
+    @property
+    def first_segment(self):
+        return self.legs[0].segments[0]
+
+def parse_offers(data, departure_date=None, return_date=None):
+    """Normalize a list of raw Amadeus offers, skipping any that are malformed"""
+    offers = []
+    for raw_offer in data or []:
+        try:
+            offers.append(Offer.from_amadeus(raw_offer, departure_date, return_date))
+        except (KeyError, IndexError, TypeError, ValueError) as e:
+            logging.warning(f"Skipping malformed offer {raw_offer.get('id', '?') if isinstance(raw_offer, dict) else '?'}: {e}")
+    return offers
@@ -0,0 +1,66 @@
+import heapq
+import logging
+
+RANK_KEYS = ('price', 'duration', 'score')
+
+def dedupe_offers(offers):
+    """
+    Collapse offers for the same flights returned by different searches.
+
+    Offers are keyed on the carrier, flight number and times of every segment.
+    The cheapest offer per key is kept, in the order the keys were first seen.
+    """
+    best = {}
+    for offer in offers:
+        key = offer.itinerary_key
+        current = best.get(key)
+        if current is None or offer.price_cents < current.price_cents:
+            best[key] = offer
+
+    deduped = list(best.values())
+    if len(deduped) < len(offers):
+        logging.info(f"Removed {len(offers) - len(deduped)} duplicate offers, {len(deduped)} unique offers left")
+    return deduped
+
+def value_scorer(offers, weights):
+    """
+    Build a scoring function for the weighted "best value" ranking.
+
+    Price and duration are scaled by the best value in the candidate set so the
+    weights are comparable; each stop adds its weight directly. Lower is better.
+    """
+    if not offers:
+        return lambda offer: 0.0
+    min_price = max(1, min(offer.price_cents for offer in offers))
+    min_duration = max(1, min(offer.duration_minutes for offer in offers))
+    price_weight = weights.get('price', 0)
+    duration_weight = weights.get('duration', 0)
+    stops_weight = weights.get('stops', 0)
+
+    def score(offer):
+        return (
+            price_weight * offer.price_cents / min_price
+            + duration_weight * offer.duration_minutes / min_duration
+            + stops_weight * offer.stops
+        )
+    return score
+
+def ranking_key(offers, rank_by='price', weights=None):
+    """Sort key for offers, ties are broken by price then duration"""
+    if rank_by == 'price':
+        return lambda offer: (offer.price_cents, offer.duration_minutes)
+    if rank_by == 'duration':
+        return lambda offer: (offer.duration_minutes, offer.price_cents)
+    if rank_by == 'score':
+        score = value_scorer(offers, weights or {})
+        return lambda offer: (score(offer), offer.price_cents, offer.duration_minutes)
+    raise ValueError(f"Unknown ranking {rank_by}, expected one of {', '.join(RANK_KEYS)}")
+
+def select_top_offers(offers, k, rank_by='price', weights=None):
+    """Return the best k offers in ranked order, using a heap instead of a full sort"""
+    key = ranking_key(offers, rank_by, weights)
+    # The index keeps equal keys in input order and avoids comparing offers directly
+    ranked = heapq.nsmallest(k, ((key(offer), index, offer) for index, offer in enumerate(offers)))
+    top = [offer for _, _, offer in ranked]
+    logging.info(f"Selected top {len(top)} of {len(offers)} offers by {rank_by}")
+    return top
@@ -0,0 +1,242 @@
+import logging
+import os
+import sqlite3
+from datetime import datetime
+
+def itinerary_id(offer):
+    """Compact string form of Offer.itinerary_key for storage"""
+    return "|".join(
+        f"{segment.carrier_code}{segment.number}@{segment.departure_at.isoformat(timespec='minutes')}"
+        for segment in offer.segments
+    )
+
+def route_id(origin, destination):
+    return f"{origin}-{destination}"
+
+class PriceHistory:
+    """
+    Append-only record of every offer seen, one run per route per execution.
+
+    Observations are keyed on (run_id, departure_date, return_date, itinerary),
+    so comparing a run with the previous observation of each of its cells reads
+    a few primary key ranges rather than scanning the whole history.
+    """
+
+    def __init__(self, db_file="price_history.db"):
+        self.db_file = db_file
+        self._conn = None
+
+    @property
+    def conn(self):
+        """The database connection, opened and migrated on first use"""
+        if self._conn is None:
+            self._conn = self._connect()
+        return self._conn
+
+    def _connect(self):
+        directory = os.path.dirname(self.db_file)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = sqlite3.connect(self.db_file)
+        conn.row_factory = sqlite3.Row
+        conn.executescript("""
+            CREATE TABLE IF NOT EXISTS runs (
+                run_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                route TEXT NOT NULL,
+                observed_at TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_runs_route ON runs (route, run_id);
+
+            CREATE TABLE IF NOT EXISTS observations (
+                run_id INTEGER NOT NULL REFERENCES runs (run_id),
+                route TEXT NOT NULL,
+                departure_date TEXT NOT NULL,
+                return_date TEXT NOT NULL,
+                itinerary TEXT NOT NULL,
+                observed_at TEXT NOT NULL,
+                price_cents INTEGER NOT NULL,
+                duration_minutes INTEGER NOT NULL,
+                stops INTEGER NOT NULL,
+                carrier_code TEXT NOT NULL,
+                flight_number TEXT NOT NULL,
+                departure_at TEXT NOT NULL,
+                PRIMARY KEY (run_id, departure_date, return_date, itinerary)
+            ) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS idx_observations_cell
+                ON observations (route, departure_date, return_date, observed_at);
+            CREATE INDEX IF NOT EXISTS idx_observations_itinerary
+                ON observations (route, itinerary, observed_at);
+
+            CREATE TABLE IF NOT EXISTS notifications (
+                route TEXT PRIMARY KEY,
+                notified_at TEXT NOT NULL
+            );
+        """)
+        conn.commit()
+        return conn
+
+    def record_run(self, origin, destination, offers, observed_at=None):
+        """Store the offers of one route search, returns the new run_id"""
+        route = route_id(origin, destination)
+        observed_at = (observed_at or datetime.now()).isoformat(timespec='seconds')
+        with self.conn:
+            cursor = self.conn.execute("INSERT INTO runs (route, observed_at) VALUES (?, ?)", (route, observed_at))
+            run_id = cursor.lastrowid
+            # The same itinerary can be returned for a cell more than once, keep its lowest price
+            self.conn.executemany("""
+                INSERT INTO observations VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (run_id, departure_date, return_date, itinerary)
+                DO UPDATE SET price_cents = MIN(price_cents, excluded.price_cents)
+            """, [
+                (
+                    run_id, route, offer.departure_date, offer.return_date, itinerary_id(offer), observed_at,
+                    offer.price_cents, offer.duration_minutes, offer.stops,
+                    offer.first_segment.carrier_code, offer.first_segment.number,
+                    offer.first_segment.departure_at.isoformat(timespec='minutes'),
+                )
+                for offer in offers
+            ])
+        logging.info(f"Recorded {len(offers)} offers for {route} in price history (run {run_id})")
+        return run_id
+
+    def previous_run(self, run_id):
+        """The run before run_id for the same route, or None"""
+        return self.conn.execute("""
+            SELECT prev.run_id, prev.observed_at FROM runs cur
+            JOIN runs prev ON prev.route = cur.route AND prev.run_id < cur.run_id
+            WHERE cur.run_id = ?
+            ORDER BY prev.run_id DESC LIMIT 1
+        """, (run_id,)).fetchone()
+
+    def latest_cell_prices(self, origin, destination):
+        """Best price per (departure_date, return_date) in the latest run, for scheduling the date grid"""
+        rows = self.conn.execute("""
+            SELECT departure_date, return_date, MIN(price_cents) AS price_cents FROM observations
+            WHERE run_id = (SELECT MAX(run_id) FROM runs WHERE route = ?)
+            GROUP BY departure_date, return_date
+        """, (route_id(origin, destination),))
+        return {(row['departure_date'], row['return_date']): row['price_cents'] / 100 for row in rows}
+
+    def cell_history(self, origin, destination, since=None):
+        """
+        Best price of every (departure_date, return_date) cell in every run of a route,
+        as (departure_date, return_date, observed_at, price_cents) rows.
+        """
+        query = """
+            SELECT departure_date, return_date, observed_at, MIN(price_cents) FROM observations
+            WHERE route = ?{since_clause}
+            GROUP BY run_id, departure_date, return_date
+        """
+        params = [route_id(origin, destination)]
+        if since is not None:
+            params.append(since.isoformat(timespec='seconds'))
+        return self.conn.execute(
+            query.format(since_clause=" AND observed_at >= ?" if since is not None else ""), params
+        ).fetchall()
+
+    def _previous_cells(self, run_id, cells=None):
+        """
+        {(departure_date, return_date): (run_id, observed_at)} of the latest
+        earlier run that observed each cell, for the cells of run_id or the
+        given cells. Runs served partly from the search cache only record the
+        cells that were searched again, so a cell's previous observation can
+        be older than the previous run.
+        """
+        current = self.conn.execute("SELECT route FROM runs WHERE run_id = ?", (run_id,)).fetchone()
+        if current is None:
+            return {}
+        if cells is None:
+            cells = [tuple(row) for row in self.conn.execute(
+                "SELECT DISTINCT departure_date, return_date FROM observations WHERE run_id = ?", (run_id,)
+            )]
+        previous = {}
+        for departure_date, return_date in cells:
+            row = self.conn.execute("""
+                SELECT run_id, observed_at FROM observations
+                WHERE route = ? AND departure_date = ? AND return_date = ? AND run_id < ?
+                ORDER BY observed_at DESC, run_id DESC LIMIT 1
+            """, (current['route'], departure_date, return_date, run_id)).fetchone()
+            if row is not None:
+                previous[(departure_date, return_date)] = (row['run_id'], row['observed_at'])
+        return previous
+
+    def _previous_observations(self, previous):
+        """Rows of each cell's previous observation, keyed like the observations primary key"""
+        rows = {}
+        for (departure_date, return_date), (prev_id, _) in previous.items():
+            for row in self.conn.execute("""
+                SELECT * FROM observations WHERE run_id = ? AND departure_date = ? AND return_date = ?
+            """, (prev_id, departure_date, return_date)):
+                rows[(row['departure_date'], row['return_date'], row['itinerary'])] = row
+        return rows
+
+    def compute_changes(self, run_id, drop_threshold_pct, cells=None):
+        """
+        Compare run_id with the previous observation of each of its cells.
+
+        cells are the (departure_date, return_date) pairs searched in this run,
+        by default those with offers in it. Returns None for the first run of a
+        route, otherwise a dict with the latest previous timestamp and the keys
+        of new offers, price drops of at least drop_threshold_pct percent and
+        the rows of offers that disappeared.
+        """
+        previous_run = self.previous_run(run_id)
+        if previous_run is None:
+            return None
+        previous = self._previous_cells(run_id, cells)
+        previous_rows = self._previous_observations(previous)
+        current = {
+            (row['departure_date'], row['return_date'], row['itinerary']): row['price_cents']
+            for row in self.conn.execute(
+                "SELECT departure_date, return_date, itinerary, price_cents FROM observations WHERE run_id = ?", (run_id,)
+            )
+        }
+
+        new, drops = set(), {}
+        for key, price_cents in current.items():
+            previous_row = previous_rows.get(key)
+            if previous_row is None:
+                new.add(key)
+            elif price_cents * 100 <= previous_row['price_cents'] * (100 - drop_threshold_pct):
+                drops[key] = previous_row['price_cents']
+        disappeared = sorted(
+            (dict(row) for key, row in previous_rows.items() if key not in current),
+            key=lambda row: row['price_cents']
+        )
+
+        return {
+            'previous_observed_at': max((observed_at for _, observed_at in previous.values()), default=previous_run['observed_at']),
+            'new': new,
+            'price_drops': drops,
+            'disappeared': disappeared,
+        }
+
+    def previous_prices(self, run_id, cells=None):
+        """
+        {(departure_date, return_date, itinerary): price_cents} of the previous
+        observation of each cell of run_id, or None for the first run of a route.
+        """
+        if self.previous_run(run_id) is None:
+            return None
+        rows = self._previous_observations(self._previous_cells(run_id, cells))
+        return {key: row['price_cents'] for key, row in rows.items()}
+
+    def last_notified_at(self, origin, destination):
+        """When a route's report was last emailed, or None"""
+        row = self.conn.execute(
+            "SELECT notified_at FROM notifications WHERE route = ?", (route_id(origin, destination),)
+        ).fetchone()
+        return datetime.fromisoformat(row['notified_at']) if row else None
+
+    def record_notification(self, origin, destination, notified_at=None):
+        notified_at = (notified_at or datetime.now()).isoformat(timespec='seconds')
+        with self.conn:
+            self.conn.execute("""
+                INSERT INTO notifications (route, notified_at) VALUES (?, ?)
+                ON CONFLICT (route) DO UPDATE SET notified_at = excluded.notified_at
+            """, (route_id(origin, destination), notified_at))
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
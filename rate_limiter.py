@@ -0,0 +1,159 @@
+import logging
+import random
+import threading
+import time
+from metrics import metrics
+
+# Published Amadeus Self-Service quotas: the test environment allows 10
+# transactions per second with no more than one request every 100ms, the
+# production environment allows 40 transactions per second.
+AMADEUS_QUOTAS = {
+    'test': {'rate': 10.0, 'burst': 1},
+    'production': {'rate': 40.0, 'burst': 5},
+}
+
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+class TokenBucket:
+    """Thread-safe token bucket, acquire() blocks until a token is available"""
+
+    def __init__(self, rate, capacity=1):
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        self.tokens = float(capacity)
+        self.updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def acquire(self):
+        """Take one token, returns the number of seconds spent waiting for it"""
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return waited
+                wait = (1 - self.tokens) / self.rate
+            # Sleep outside the lock so other threads can refill and check too
+            time.sleep(wait)
+            waited += wait
+
+def _status_code(error):
+    response = getattr(error, 'response', None)
+    return getattr(response, 'status_code', None)
+
+def _retry_after_seconds(error):
+    """Read a Retry-After header (in seconds) from an API error, if there is one"""
+    response = getattr(error, 'response', None)
+    headers = getattr(response, 'headers', None)
+    if headers is None:
+        headers = getattr(getattr(response, 'http_response', None), 'headers', None)
+    if not headers:
+        return None
+    try:
+        value = headers.get('Retry-After') or headers.get('retry-after')
+    except AttributeError:
+        value = dict(headers).get('Retry-After')
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        return None
+
+def is_retryable(error):
+    """Rate limits, server errors and network failures are worth retrying"""
+    if isinstance(error, (ConnectionError, TimeoutError)):
+        return True
+    if not hasattr(error, 'response'):
+        return False
+    status = _status_code(error)
+    # Amadeus network errors carry a response without a status code
+    return status is None or status in RETRYABLE_STATUS_CODES
+
+class ApiCallGuard:
+    """
+    Rate limit and retry wrapper shared by every caller of an API.
+
+    Each attempt takes a token from the shared bucket. Retryable failures are
+    retried with full-jitter exponential backoff, or after the server's
+    Retry-After delay when it sends one. Safe to use from many threads.
+    """
+
+    def __init__(self, bucket, max_retries=4, base_delay=0.5, max_delay=20.0, name="API"):
+        self.bucket = bucket
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.name = name
+        self.counters = {'calls': 0, 'throttled': 0, 'retried': 0, 'failed': 0, 'wait_seconds': 0.0}
+        self._lock = threading.Lock()
+
+    def _count(self, counter, amount=1):
+        with self._lock:
+            self.counters[counter] += amount
+
+    def _backoff(self, attempt, error):
+        retry_after = _retry_after_seconds(error)
+        if retry_after is not None:
+            return min(retry_after, self.max_delay)
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    def call(self, fn, *args, **kwargs):
+        """Call fn(*args, **kwargs) under the rate limit, retrying transient failures"""
+        with metrics.span('api_call', api=self.name):
+            return self._call(fn, *args, **kwargs)
+
+    def _call(self, fn, *args, **kwargs):
+        attempt = 0
+        while True:
+            self._count('wait_seconds', self.bucket.acquire())
+            self._count('calls')
+            try:
+                return fn(*args, **kwargs)
+            except Exception as e:
+                if _status_code(e) == 429:
+                    self._count('throttled')
+                if attempt >= self.max_retries or not is_retryable(e):
+                    self._count('failed')
+                    raise
+                delay = self._backoff(attempt, e)
+                attempt += 1
+                self._count('retried')
+                logging.warning(f"{self.name} call failed ({_status_code(e) or type(e).__name__}), retry {attempt}/{self.max_retries} in {delay:.2f}s")
+                time.sleep(delay)
+
+    def get_stats(self):
+        with self._lock:
+            return dict(self.counters)
+
+class GuardedClient:
+    """
+    Proxy that routes every .get()/.post() on an SDK client through a guard.
+
+    amadeus.shopping.flight_offers_search.get(...) and the reference_data
+    endpoints keep their usual call syntax, so the wrapped client can be passed
+    anywhere the raw client was used.
+    """
+
+    _GUARDED_METHODS = ('get', 'post')
+
+    def __init__(self, target, guard):
+        self._target = target
+        self._guard = guard
+
+    def __getattr__(self, name):
+        attr = getattr(self._target, name)
+        if name in self._GUARDED_METHODS and callable(attr):
+            return lambda *args, **kwargs: self._guard.call(attr, *args, **kwargs)
+        if isinstance(attr, (str, bytes, int, float, bool, type(None))):
+            return attr
+        return GuardedClient(attr, self._guard)
+
+def amadeus_guard(environment='test', **retry_options):
+    """Build a guard tuned to the quota of the given Amadeus environment"""
+    quota = AMADEUS_QUOTAS.get(environment, AMADEUS_QUOTAS['test'])
+    return ApiCallGuard(TokenBucket(quota['rate'], quota['burst']), name="Amadeus", **retry_options)
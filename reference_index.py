@@ -0,0 +1,228 @@
+"""
+Bundled IATA reference data: airline, airport and city names in one binary index.
+
+The index is compiled from the files in reference_data/ and committed next
+to them: airports.csv and cities.csv, generated from airportsdata (MIT, see
+reference_data/LICENSE-airportsdata), the OpenFlights airlines.dat (ODbL)
+when present, and airlines.csv, whose names are maintained here and take
+precedence.
+
+The index is memory-mapped on first use, so loading costs a single open()
+however many codes it holds, and each lookup is a binary search over the
+sorted fixed-width codes of a section. Nothing is turned into Python objects
+until a code is actually looked up.
+
+File layout, all integers little-endian uint32:
+
+    header   magic "IATAIDX1", section count
+    sections name (8 bytes), count, code width, codes offset, value offsets offset, values offset
+    codes    count * width ASCII bytes, sorted
+    offsets  count + 1 positions in the values blob, value i is blob[offsets[i]:offsets[i + 1]]
+    values   UTF-8 names
+
+Rebuild after editing or replacing the source files:  python reference_index.py
+"""
+import csv
+import logging
+import mmap
+import os
+import struct
+import sys
+import tempfile
+import threading
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+SOURCE_DIR = os.path.join(ROOT, "reference_data")
+
+MAGIC = b"IATAIDX1"
+HEADER = struct.Struct("<8sI")
+SECTION = struct.Struct("<8s5I")
+OFFSET = struct.Struct("<I")
+OFFSET_PAIR = struct.Struct("<2I")
+
+def airport_display_name(name, city):
+    """'Keflavik International Airport, Reykjavik', without repeating a city the name already contains"""
+    if not city or city.lower() in name.lower():
+        return name
+    return f"{name}, {city}"
+
+def load_openflights_airlines(path):
+    """
+    {iata: name} from an OpenFlights airlines.dat file.
+
+    IATA codes are reused once an airline stops flying, so an active airline
+    wins over defunct ones with the same code, otherwise the first listed.
+    """
+    airlines = {}
+    with open(path, 'r', encoding='utf-8', newline='') as f:
+        # Airline ID, Name, Alias, IATA, ICAO, Callsign, Country, Active, with \N for missing values
+        for row in csv.reader(f):
+            if len(row) < 8:
+                continue
+            name, code, active = row[1].strip(), row[3].strip().upper(), row[7].strip() == 'Y'
+            if len(code) != 2 or not code.isascii() or not code.isalnum() or name in ('', '\\N'):
+                continue
+            if code not in airlines or (active and not airlines[code][0]):
+                airlines[code] = (active, name)
+    return {code: name for code, (_, name) in airlines.items()}
+
+def load_sources(directory=SOURCE_DIR):
+    """{section: {code: value}} from airlines.dat, airlines.csv, airports.csv and cities.csv"""
+    def rows(name):
+        with open(os.path.join(directory, name), 'r', encoding='utf-8', newline='') as f:
+            return list(csv.DictReader(f))
+
+    airports = {row['iata']: airport_display_name(row['name'], row['city']) for row in rows('airports.csv')}
+    # Member airports busiest first, comma-joined like the 'cities' cache section. A code that is
+    # also an airport (DXB, IST) is left out, searching it means that airport only
+    city_rows = rows('cities.csv')
+    cities = {row['city']: ",".join(row['airports'].split()) for row in city_rows if row['city'] not in airports}
+    # City codes get their city name, as the API's CITY locations do
+    for row in city_rows:
+        airports.setdefault(row['city'], row['name'])
+    # airlines.csv corrects and extends the OpenFlights names
+    airlines = {}
+    if os.path.exists(os.path.join(directory, 'airlines.dat')):
+        airlines = load_openflights_airlines(os.path.join(directory, 'airlines.dat'))
+    airlines.update((row['iata'], row['name']) for row in rows('airlines.csv'))
+    return {
+        'airlines': airlines,
+        'airports': airports,
+        'cities': cities,
+    }
+
+def build_index(sections, path):
+    """Write {section: {code: value}} to path in the index format, atomically"""
+    names = sorted(sections)
+    table_size = HEADER.size + SECTION.size * len(names)
+    table = [HEADER.pack(MAGIC, len(names))]
+    body = []
+    position = table_size
+
+    for name in names:
+        entries = sorted(sections[name].items())
+        width = max((len(code) for code, _ in entries), default=0)
+        if any(len(code) != width or not code.isascii() for code, _ in entries):
+            raise ValueError(f"Codes in section {name} must be ASCII and all {width} characters long")
+
+        codes = b"".join(code.encode('ascii') for code, _ in entries)
+        values = [value.encode('utf-8') for _, value in entries]
+        offsets = [0]
+        for value in values:
+            offsets.append(offsets[-1] + len(value))
+        offsets = b"".join(OFFSET.pack(offset) for offset in offsets)
+
+        codes_at = position
+        offsets_at = codes_at + len(codes)
+        values_at = offsets_at + len(offsets)
+        table.append(SECTION.pack(name.encode('ascii'), len(entries), width, codes_at, offsets_at, values_at))
+        body.extend([codes, offsets, *values])
+        position = values_at + sum(len(value) for value in values)
+
+    directory = os.path.dirname(path) or '.'
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(b"".join(table + body))
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    return position
+
+class ReferenceIndex:
+    """
+    Read-only view of a compiled index file, mapped on first lookup.
+
+    A missing or unreadable file is logged once and behaves as an empty
+    index, every lookup then returns None.
+    """
+
+    def __init__(self, path):
+        self.path = path if os.path.isabs(path) else os.path.join(ROOT, path)
+        self._data = None
+        self._sections = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        if self._sections is not None:
+            return self._sections
+        with self._lock:
+            if self._sections is None:
+                try:
+                    with open(self.path, 'rb') as f:
+                        data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                    magic, count = HEADER.unpack_from(data, 0)
+                    if magic != MAGIC:
+                        raise ValueError("not a reference index file")
+                    sections = {}
+                    for i in range(count):
+                        name, *layout = SECTION.unpack_from(data, HEADER.size + i * SECTION.size)
+                        sections[name.rstrip(b"\0").decode('ascii')] = layout
+                    self._data = data
+                    self._sections = sections
+                    logging.debug(f"Reference index {self.path} loaded: {', '.join(f'{name} {layout[0]}' for name, layout in sections.items())}")
+                except (OSError, ValueError, struct.error) as e:
+                    logging.warning(f"Reference index {self.path} unavailable, names come from the cache and API only: {e}")
+                    self._sections = {}
+        return self._sections
+
+    def lookup(self, section, code):
+        """The value stored for code in section, or None"""
+        layout = self._load().get(section)
+        if layout is None or not code:
+            return None
+        count, width, codes_at, offsets_at, values_at = layout
+        try:
+            key = code.upper().encode('ascii')
+        except UnicodeEncodeError:
+            return None
+        if len(key) != width:
+            return None
+
+        data = self._data
+        low, high = 0, count
+        while low < high:
+            middle = (low + high) // 2
+            start = codes_at + middle * width
+            current = data[start:start + width]
+            if current < key:
+                low = middle + 1
+            elif current > key:
+                high = middle
+            else:
+                begin, end = OFFSET_PAIR.unpack_from(data, offsets_at + middle * OFFSET.size)
+                return data[values_at + begin:values_at + end].decode('utf-8')
+        return None
+
+    def airline_name(self, code):
+        return self.lookup('airlines', code)
+
+    def airport_name(self, code):
+        return self.lookup('airports', code)
+
+    def city_airports(self, code):
+        """Member airports of a city code, busiest first, or None for codes that are not multi-airport cities"""
+        airports = self.lookup('cities', code)
+        return airports.split(',') if airports else None
+
+    def count(self, section):
+        layout = self._load().get(section)
+        return layout[0] if layout else 0
+
+    def close(self):
+        with self._lock:
+            if self._data is not None:
+                self._data.close()
+            self._data = None
+            self._sections = None
+
+def main():
+    output = sys.argv[1] if len(sys.argv) > 1 else os.path.join(SOURCE_DIR, "iata_index.bin")
+    sections = load_sources()
+    size = build_index(sections, output)
+    print(f"Wrote {output} ({size / 1024:.0f} KB): " + ", ".join(f"{len(entries)} {name}" for name, entries in sorted(sections.items())))
+
+if __name__ == '__main__':
+    main()
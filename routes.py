@@ -0,0 +1,109 @@
+from dataclasses import dataclass
+from datetime import datetime
+from config import (
+    ORIGIN, DESTINATION, DEPARTURE_DATE, RETURN_DATE, DEPARTURE_FLEX_DAYS, RETURN_FLEX_DAYS,
+    MIN_STAY_DAYS, MAX_STAY_DAYS, MAX_DATE_COMBINATIONS, MAX_RESULTS, MAX_STOPS, WATCHLIST, ALERT_RULES
+)
+from mailer import parse_recipients
+from alert_rules import compile_rules
+
+@dataclass(frozen=True)
+class RouteSpec:
+    """One origin/destination search, with the date window and limits to apply"""
+    origin: str
+    destination: str
+    departure_date: str
+    return_date: str
+    departure_flex_days: int = DEPARTURE_FLEX_DAYS
+    return_flex_days: int = RETURN_FLEX_DAYS
+    min_stay_days: int = MIN_STAY_DAYS
+    max_stay_days: int = MAX_STAY_DAYS
+    max_date_combinations: int = MAX_DATE_COMBINATIONS
+    max_results: int = MAX_RESULTS
+    max_stops: int = MAX_STOPS
+    recipients: tuple = ()  # Empty means the EMAIL_RECEIVER addresses
+    alert_rules: tuple = ()  # Compiled AlertRules, empty means every run is sent
+    alert_rule_errors: tuple = ()  # Invalid alert rule specs, reported by validate_route
+
+    @property
+    def name(self):
+        return f"{self.origin} → {self.destination}"
+
+def load_routes(watchlist=WATCHLIST, alert_rules=ALERT_RULES):
+    """
+    Build the routes to search from the watchlist.
+
+    An empty watchlist means the single ORIGIN → DESTINATION search from
+    config.py. Watchlist entries only need the keys they change, anything
+    missing falls back to the global settings. Alert rules are compiled
+    here, once per run; invalid rules are kept on the route as errors for
+    validate_route, so they fail the configuration check.
+    """
+    rule_errors = []
+    rules = compile_rules(alert_rules, rule_errors)
+    if not watchlist:
+        return [RouteSpec(ORIGIN, DESTINATION, DEPARTURE_DATE, RETURN_DATE, alert_rules=rules, alert_rule_errors=tuple(rule_errors))]
+
+    routes = []
+    for entry in watchlist:
+        spec = {'departure_date': DEPARTURE_DATE, 'return_date': RETURN_DATE, **entry}
+        if 'recipients' in spec:
+            spec['recipients'] = tuple(parse_recipients(spec['recipients']))
+        if 'alert_rules' in spec:
+            entry_errors = []
+            spec['alert_rules'] = compile_rules(spec['alert_rules'], entry_errors)
+            spec['alert_rule_errors'] = tuple(entry_errors)
+        else:
+            spec['alert_rules'] = rules
+            spec['alert_rule_errors'] = tuple(rule_errors)
+        try:
+            routes.append(RouteSpec(**spec))
+        except TypeError as e:
+            raise ValueError(f"Invalid watchlist entry {entry}: {e}") from e
+    return routes
+
+def validate_route(route):
+    """Validate one route's parameters before making API calls"""
+    errors = []
+
+    # Validate airport and city codes (3 letters, city codes are expanded before searching)
+    if not route.origin or len(route.origin) != 3 or not route.origin.isalpha():
+        errors.append(f"Invalid origin airport code: {route.origin}")
+    if not route.destination or len(route.destination) != 3 or not route.destination.isalpha():
+        errors.append(f"Invalid destination airport code: {route.destination}")
+    if route.origin == route.destination:
+        errors.append(f"Origin and destination are the same: {route.origin}")
+
+    # Validate dates
+    try:
+        dep_date = datetime.strptime(route.departure_date, "%Y-%m-%d")
+        ret_date = datetime.strptime(route.return_date, "%Y-%m-%d")
+        today = datetime.now()
+
+        if dep_date < today:
+            errors.append(f"Departure date {route.departure_date} is in the past")
+        if ret_date < dep_date:
+            errors.append(f"Return date {route.return_date} is before departure date {route.departure_date}")
+
+    except ValueError as e:
+        errors.append(f"Invalid date format: {e}")
+
+    # Validate other parameters
+    if route.max_results <= 0 or route.max_results > 100:
+        errors.append(f"MAX_RESULTS should be between 1 and 100, got {route.max_results}")
+    if route.max_stops < 0:
+        errors.append(f"MAX_STOPS should be 0 or positive, got {route.max_stops}")
+    if route.departure_flex_days < 0 or route.return_flex_days < 0:
+        errors.append(f"Flex days should be 0 or positive, got departure={route.departure_flex_days}, return={route.return_flex_days}")
+    if route.min_stay_days < 0:
+        errors.append(f"MIN_STAY_DAYS should be 0 or positive, got {route.min_stay_days}")
+    if route.max_stay_days is not None and route.max_stay_days < route.min_stay_days:
+        errors.append(f"MAX_STAY_DAYS ({route.max_stay_days}) is smaller than MIN_STAY_DAYS ({route.min_stay_days})")
+    if route.max_date_combinations < 1:
+        errors.append(f"MAX_DATE_COMBINATIONS should be at least 1, got {route.max_date_combinations}")
+    for address in route.recipients:
+        if '@' not in address:
+            errors.append(f"Invalid recipient email address: {address}")
+    errors.extend(route.alert_rule_errors)
+
+    return [f"{route.name}: {error}" for error in errors]
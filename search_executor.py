@@ -0,0 +1,75 @@
+import asyncio
+import contextvars
+import logging
+import time
+
+def _timed_search(search_fn, combination):
+    """
+    Run a single search and record how long it took, the dates are the last two values of the combination.
+
+    search_fn returns the flights, or (flights, cached_at) where cached_at is
+    when a result served from a cache was originally fetched, None if it was
+    fetched now. It returns None when the search failed, which the result
+    marks as failed so it is not mistaken for a search that found nothing.
+    """
+    *route, departure_date, return_date = combination
+    started = time.perf_counter()
+    try:
+        flights = search_fn(*combination)
+    except Exception as e:
+        # search_flights already returns None on error, this guards custom search functions
+        logging.error(f"Search for {departure_date} → {return_date} failed: {e}")
+        flights = None
+    elapsed = time.perf_counter() - started
+    failed = flights is None
+    if failed:
+        flights, cached_at = [], None
+    else:
+        flights, cached_at = flights if isinstance(flights, tuple) else (flights, None)
+
+    return {
+        'route': route[0] if route else None,
+        'departure_date': departure_date,
+        'return_date': return_date,
+        'flights': flights,
+        'cached_at': cached_at,
+        'failed': failed,
+        'elapsed_seconds': elapsed
+    }
+
+async def run_searches_async(search_fn, combinations, executor):
+    """
+    Run search_fn(*combination) for every combination on a caller-owned executor.
+
+    Combinations end with the departure and return dates and may start with
+    the route, which is reported with each result. Every combination is
+    submitted at once and the executor's worker count bounds how many run at
+    a time, so several callers awaiting this with the same executor share one
+    concurrency limit. Results keep the order of the combinations. Each
+    search runs in a copy of the caller's context, so the metric spans it
+    opens keep the caller's span as their parent.
+    """
+    combinations = list(combinations)
+    if not combinations:
+        return []
+
+    loop = asyncio.get_running_loop()
+    started = time.perf_counter()
+    results = await asyncio.gather(*(
+        loop.run_in_executor(executor, contextvars.copy_context().run, _timed_search, search_fn, combination)
+        for combination in combinations
+    ))
+    _log_results(results, time.perf_counter() - started)
+    return results
+
+def _log_results(results, total_elapsed):
+    for result in results:
+        route_label = f"{result['route'].name} " if result['route'] else ""
+        logging.info(
+            f"Search {route_label}{result['departure_date']} → {result['return_date']}: "
+            f"{len(result['flights'])} flights in {result['elapsed_seconds']:.2f}s"
+            f"{' (cached)' if result['cached_at'] is not None else ''}{' (failed)' if result['failed'] else ''}"
+        )
+
+    search_time = sum(result['elapsed_seconds'] for result in results)
+    logging.info(f"Completed {len(results)} searches in {total_elapsed:.2f}s wall clock ({search_time:.2f}s total search time)")
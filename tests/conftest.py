@@ -0,0 +1,41 @@
+import os
+import sys
+
+import pytest
+
+# The modules live at the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models import Offer
+
+def raw_offer(legs, price="500.00", offer_id="1", leg_duration="PT5H"):
+    """An Amadeus flight offer with one itinerary per leg"""
+    return {
+        'id': offer_id,
+        'price': {'total': price, 'currency': 'USD'},
+        'itineraries': [
+            {
+                'duration': leg_duration,
+                'segments': [
+                    {
+                        'carrierCode': carrier,
+                        'number': number,
+                        'departure': {'iataCode': origin, 'at': departure_at},
+                        'arrival': {'iataCode': destination, 'at': arrival_at},
+                    }
+                    for carrier, number, origin, destination, departure_at, arrival_at in segments
+                ],
+            }
+            for segments in legs
+        ],
+    }
+
+@pytest.fixture
+def make_offer():
+    """
+    Build a parsed Offer, each positional argument is one leg given as
+    (carrier, number, origin, destination, departure_at, arrival_at) segments.
+    """
+    def make(*legs, price="500.00", offer_id="1", departure_date="2026-12-01", return_date="2026-12-08", leg_duration="PT5H"):
+        return Offer.from_amadeus(raw_offer(legs, price, offer_id, leg_duration), departure_date, return_date)
+    return make
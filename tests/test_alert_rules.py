@@ -0,0 +1,133 @@
+import pytest
+
+from alert_rules import AlertRule, compile_rules, evaluate_rules, render_alerts_html
+from price_history import itinerary_id
+
+def direct(number, hour=8):
+    return [("LY", number, "TLV", "KEF", f"2026-12-01T{hour:02d}:00", f"2026-12-01T{hour + 5:02d}:00")]
+
+def one_stop(number):
+    return [
+        ("LH", number, "TLV", "FRA", "2026-12-01T06:00", "2026-12-01T10:00"),
+        ("LH", f"{number}1", "FRA", "KEF", "2026-12-01T12:00", "2026-12-01T14:00"),
+    ]
+
+def key(offer):
+    return (offer.departure_date, offer.return_date, itinerary_id(offer))
+
+def test_compile_rules_converts_thresholds():
+    rules = compile_rules([
+        {"rule": "price_below", "price": 450},
+        {"rule": "price_drop", "percent": 12.5},
+        {"rule": "new_direct"},
+        {"rule": "duration_under", "hours": 7.5},
+    ])
+
+    assert rules == (
+        AlertRule("price_below", 450, 45000),
+        AlertRule("price_drop", 12.5, 12.5),
+        AlertRule("new_direct"),
+        AlertRule("duration_under", 7.5, 450),
+    )
+
+def test_compile_rules_accepts_nothing():
+    assert compile_rules(None) == ()
+    assert compile_rules([]) == ()
+
+@pytest.mark.parametrize("spec", [
+    {"rule": "price_under", "price": 450},
+    {"price": 450},
+    {"rule": "price_below"},
+    {"rule": "price_below", "price": "450"},
+    {"rule": "price_below", "price": True},
+    {"rule": "price_below", "price": 0},
+    {"rule": "price_drop", "percent": -5},
+    {"rule": "price_drop", "percent": 100},
+    {"rule": "duration_under", "minutes": 300},
+])
+def test_compile_rules_rejects_invalid_specs(spec):
+    with pytest.raises(ValueError):
+        compile_rules([spec])
+
+def test_no_rules_no_alerts(make_offer):
+    assert evaluate_rules((), [make_offer(direct("1"))]) == []
+
+def test_price_below_fires_cheapest_first(make_offer):
+    cheap = make_offer(direct("1"), price="300.00")
+    cheaper = make_offer(direct("2", 10), price="250.00")
+    expensive = make_offer(direct("3", 12), price="600.00")
+
+    alerts = evaluate_rules(compile_rules([{"rule": "price_below", "price": 450}]), [cheap, expensive, cheaper])
+
+    assert len(alerts) == 1
+    assert alerts[0]['rule'].rule == "price_below"
+    assert alerts[0]['offers'] == [cheaper, cheap]
+
+def test_price_drop_compares_with_the_previous_run(make_offer):
+    dropped = make_offer(direct("1"), price="400.00")
+    slight = make_offer(direct("2", 10), price="480.00")
+    unseen = make_offer(direct("3", 12), price="100.00")
+    previous = {key(dropped): 50000, key(slight): 50000}
+
+    alerts = evaluate_rules(compile_rules([{"rule": "price_drop", "percent": 10}]), [dropped, slight, unseen], previous)
+
+    assert [alert['offers'] for alert in alerts] == [[dropped]]
+
+def test_price_drop_threshold_is_inclusive(make_offer):
+    offer = make_offer(direct("1"), price="450.00")
+    alerts = evaluate_rules(compile_rules([{"rule": "price_drop", "percent": 10}]), [offer], {key(offer): 50000})
+    assert alerts[0]['offers'] == [offer]
+
+def test_new_direct_needs_a_previous_run(make_offer):
+    offer = make_offer(direct("1"))
+    rules = compile_rules([{"rule": "new_direct"}])
+
+    # On a route's first run every offer would be new, nothing fires
+    assert evaluate_rules(rules, [offer], None) == []
+    assert evaluate_rules(rules, [offer], {key(offer): 50000}) == []
+
+def test_new_direct_ignores_connections(make_offer):
+    new_direct = make_offer(direct("1"))
+    new_connection = make_offer(one_stop("2"))
+    known = make_offer(direct("3", 12))
+
+    alerts = evaluate_rules(compile_rules([{"rule": "new_direct"}]), [new_direct, new_connection, known], {key(known): 40000})
+
+    assert [alert['offers'] for alert in alerts] == [[new_direct]]
+
+def test_duration_under(make_offer):
+    short = make_offer(direct("1"), leg_duration="PT5H")
+    long = make_offer(one_stop("2"), leg_duration="PT8H")
+
+    alerts = evaluate_rules(compile_rules([{"rule": "duration_under", "hours": 6}]), [short, long])
+
+    assert alerts[0]['offers'] == [short]
+
+def test_rules_fire_independently(make_offer):
+    offer = make_offer(direct("1"), price="300.00", leg_duration="PT5H")
+    rules = compile_rules([
+        {"rule": "price_below", "price": 200},
+        {"rule": "price_below", "price": 350},
+        {"rule": "duration_under", "hours": 6},
+    ])
+
+    alerts = evaluate_rules(rules, [offer])
+
+    assert [alert['rule'] for alert in alerts] == [rules[1], rules[2]]
+
+def test_render_alerts_html(make_offer):
+    offers = [make_offer(direct("123"), price="300.00"), make_offer(direct("5", 12), price="320.00")]
+    html = render_alerts_html(evaluate_rules(compile_rules([{"rule": "price_below", "price": 450}]), offers))
+
+    assert "Price below $450" in html
+    assert "LY 123" in html
+    assert "$300.00 and 1 more" in html
+    assert render_alerts_html([]) == ""
+
+def test_compile_rules_collects_errors():
+    errors = []
+    rules = compile_rules([{"rule": "price_under", "price": 450}, {"rule": "new_direct"}, "new_direct"], errors)
+
+    assert rules == (AlertRule("new_direct"),)
+    assert len(errors) == 2
+    assert "price_under" in errors[0]
@@ -0,0 +1,90 @@
+from types import SimpleNamespace
+
+import pytest
+
+from amadeus_replay import (
+    FixtureStore, RecordingClient, ReplayClient, ReplayResponseError, create_amadeus_client
+)
+from conftest import raw_offer
+
+SEARCH = 'shopping.flight_offers_search'
+
+def search_params(departure_date="2026-12-01", return_date="2026-12-08", **extra):
+    return {
+        'originLocationCode': "TLV", 'destinationLocationCode': "KEF",
+        'departureDate': departure_date, 'returnDate': return_date, 'adults': 1, 'max': 5, **extra,
+    }
+
+def recorded_offers():
+    return [raw_offer([
+        [("LY", "123", "TLV", "KEF", "2026-12-01T08:00:00", "2026-12-01T13:00:00")],
+        [("LY", "124", "KEF", "TLV", "2026-12-08T15:00:00", "2026-12-08T23:00:00")],
+    ])]
+
+@pytest.fixture
+def store(tmp_path):
+    store = FixtureStore(str(tmp_path / "fixtures"))
+    store.save(SEARCH, search_params(), recorded_offers())
+    store.save('reference_data.airlines', {'airlineCodes': "LY,LH"}, [
+        {'iataCode': "LY", 'businessName': "El Al"}, {'iataCode': "LH", 'businessName': "Lufthansa"},
+    ])
+    return store
+
+def test_exact_request_is_replayed(store):
+    client = ReplayClient(store)
+    response = client.shopping.flight_offers_search.get(**search_params())
+    assert response.data == recorded_offers()
+    assert client.calls == 1
+
+def test_other_dates_are_shifted_from_the_nearest_recording(store):
+    data = ReplayClient(store).shopping.flight_offers_search.get(**search_params("2026-12-03", "2026-12-12")).data
+
+    outbound, inbound = data[0]['itineraries']
+    assert outbound['segments'][0]['departure']['at'] == "2026-12-03T08:00:00"
+    assert inbound['segments'][0]['arrival']['at'] == "2026-12-12T23:00:00"
+    # The recording itself is left as it was
+    assert store.load(SEARCH, search_params()) == recorded_offers()
+
+def test_direct_only_searches_do_not_borrow_connecting_recordings(store):
+    with pytest.raises(ReplayResponseError) as raised:
+        ReplayClient(store).shopping.flight_offers_search.get(**search_params(nonStop=True))
+    assert raised.value.response.status_code == 404
+
+def test_reference_data_is_gathered_from_every_recording(store):
+    client = ReplayClient(store)
+    airlines = client.reference_data.airlines.get(airlineCodes="LH,XX").data
+    assert airlines == [{'iataCode': "LH", 'businessName': "Lufthansa"}]
+
+def test_injected_failures_are_repeatable(store):
+    def outcomes(seed):
+        client = ReplayClient(store, error_rate=0.5, seed=seed)
+        results = []
+        for _ in range(20):
+            try:
+                client.shopping.flight_offers_search.get(**search_params())
+                results.append(200)
+            except ReplayResponseError as e:
+                results.append(e.response.status_code)
+        return results
+
+    first = outcomes(3)
+    assert first == outcomes(3)
+    assert set(first) - {200} <= {429, 500, 503}
+    assert 200 in first and len(set(first)) > 1
+
+def test_recording_client_saves_responses(tmp_path):
+    live = SimpleNamespace(shopping=SimpleNamespace(flight_offers_search=SimpleNamespace(
+        get=lambda **params: SimpleNamespace(data=recorded_offers())
+    )))
+    store = FixtureStore(str(tmp_path / "fixtures"))
+
+    response = RecordingClient(live, store).shopping.flight_offers_search.get(**search_params())
+
+    assert response.data == recorded_offers()
+    assert store.load(SEARCH, search_params()) == recorded_offers()
+    assert [fixture['params'] for fixture in store.fixtures(SEARCH)] == [search_params()]
+
+def test_create_client_modes(tmp_path):
+    assert isinstance(create_amadeus_client('replay', fixtures_dir=str(tmp_path)), ReplayClient)
+    with pytest.raises(ValueError):
+        create_amadeus_client('mock')
@@ -0,0 +1,227 @@
+import json
+
+import pytest
+
+from cache_manager import AirportAirlineCache, JsonCacheStore, SqliteCacheStore, write_json_atomic
+
+def make_cache(tmp_path, backend='json', write_back=True):
+    return AirportAirlineCache(str(tmp_path / "cache.json"), write_back=write_back, backend=backend,
+                               reference_index=None)
+
+def read_json(path):
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+class FakeAirlines:
+    def __init__(self, names):
+        self.names = names
+        self.calls = 0
+
+    def get(self, airlineCodes):
+        self.calls += 1
+        codes = airlineCodes.split(',')
+        return type("Response", (), {'data': [
+            {'iataCode': code, 'businessName': self.names[code]} for code in codes if code in self.names
+        ]})()
+
+class FakeLocations:
+    def __init__(self, locations):
+        self.locations = locations
+        self.calls = 0
+
+    def get(self, keyword, subType):
+        self.calls += 1
+        if self.locations is None:
+            raise ConnectionError("timed out")
+        return type("Response", (), {'data': self.locations})()
+
+class FakeAmadeus:
+    def __init__(self, airline_names, locations=()):
+        airlines = FakeAirlines(airline_names)
+        self.locations = FakeLocations(locations)
+        self.reference_data = type("ReferenceData", (), {'airlines': airlines, 'locations': self.locations})()
+
+def test_write_json_atomic_replaces_the_file(tmp_path):
+    path = tmp_path / "nested" / "data.json"
+    write_json_atomic(str(path), {'a': 1})
+    write_json_atomic(str(path), {'a': 2})
+    assert read_json(path) == {'a': 2}
+    assert [p.name for p in path.parent.iterdir()] == ["data.json"]
+
+def test_write_back_waits_for_flush(tmp_path):
+    cache = make_cache(tmp_path)
+    amadeus = FakeAmadeus({'LH': "Lufthansa"})
+
+    assert cache.get_airline_name('LH', amadeus) == "Lufthansa"
+    assert cache.cache_updated
+    assert not (tmp_path / "cache.json").exists()
+
+    cache.flush()
+    assert read_json(tmp_path / "cache.json")['airlines'] == {'LH': "Lufthansa"}
+    # The second lookup is a cache hit
+    assert cache.get_airline_name('LH', amadeus) == "Lufthansa"
+    assert amadeus.reference_data.airlines.calls == 1
+
+def test_context_manager_flushes(tmp_path):
+    with make_cache(tmp_path) as cache:
+        cache.get_airline_name('LH', FakeAmadeus({'LH': "Lufthansa"}))
+    assert read_json(tmp_path / "cache.json")['airlines'] == {'LH': "Lufthansa"}
+
+def test_write_through_saves_every_change(tmp_path):
+    cache = make_cache(tmp_path, write_back=False)
+    cache.get_airline_name('LH', FakeAmadeus({'LH': "Lufthansa"}))
+    assert read_json(tmp_path / "cache.json")['airlines'] == {'LH': "Lufthansa"}
+
+def test_fallback_names_are_not_cached(tmp_path):
+    cache = make_cache(tmp_path)
+    assert cache.get_airline_name('ZZ', FakeAmadeus({})) == "ZZ Airlines"
+    assert cache.get_airport_name('ZZZ') == "ZZZ Airport"
+    assert not cache.cache_updated
+    cache.flush()
+    assert not (tmp_path / "cache.json").exists()
+
+@pytest.mark.parametrize("backend", ['json', 'sqlite'])
+def test_set_reports_whether_the_cache_changed(tmp_path, backend):
+    cache = make_cache(tmp_path, backend=backend)
+    store = cache.store
+    assert store.set('airlines', 'LH', "Lufthansa")
+    assert not store.set('airlines', 'LH', "Lufthansa")
+    assert store.set('airlines', 'LH', "Lufthansa Group")
+    assert store.flush()
+    assert not store.flush()
+
+def test_sqlite_set_reports_a_failed_write(tmp_path):
+    store = SqliteCacheStore(str(tmp_path / "cache.db"), write_back=False)
+    store.conn.execute("CREATE TRIGGER read_only BEFORE INSERT ON entries BEGIN SELECT RAISE(ABORT, 'read only'); END")
+
+    assert not store.set('airlines', 'LH', "Lufthansa")
+    assert store.get('airlines', 'LH') is None
+    assert not store.flush()
+
+def test_json_set_reports_a_failed_write(tmp_path):
+    # The cache file's directory cannot be created, so the write-through save fails
+    (tmp_path / "blocker").write_text("", encoding='utf-8')
+    store = JsonCacheStore(str(tmp_path / "blocker" / "cache.json"), write_back=False)
+    assert not store.set('airlines', 'LH', "Lufthansa")
+
+def test_cache_stats(tmp_path):
+    cache = make_cache(tmp_path)
+    cache.get_airline_name('LH', FakeAmadeus({'LH': "Lufthansa"}))
+    cache.get_airline_name('LH')
+
+    stats = cache.get_cache_stats()
+    assert stats['airlines_cached'] == 1
+    assert stats['airports_cached'] == 0
+    assert stats['cache_updated_this_run']
+    assert (stats['hits'], stats['misses']) == (1, 1)
+
+# --- SQLite store ---
+
+def test_sqlite_get_many(tmp_path):
+    store = SqliteCacheStore(str(tmp_path / "cache.db"))
+    for code in ("LH", "BA", "AF"):
+        store.set('airlines', code, f"{code} name")
+    store.set('airports', 'LH', "not an airline")
+
+    assert store.get_many('airlines', ["BA", "XX", "LH", "BA"]) == {'BA': "BA name", 'LH': "LH name"}
+    assert store.get_many('airlines', []) == {}
+    assert store.count('airlines') == 3
+
+def test_sqlite_get_many_beyond_the_parameter_limit(tmp_path):
+    store = SqliteCacheStore(str(tmp_path / "cache.db"))
+    codes = [f"C{i:04d}" for i in range(1200)]
+    for code in codes:
+        store.set('airports', code, code.lower())
+    assert len(store.get_many('airports', codes)) == 1200
+
+def test_sqlite_entries_expire(tmp_path):
+    store = SqliteCacheStore(str(tmp_path / "cache.db"), ttl_days=1)
+    store.set('airlines', 'LH', "Lufthansa")
+    store.set('airlines', 'BA', "British Airways")
+    store.conn.execute("UPDATE entries SET updated_at = updated_at - 2 * 86400 WHERE code = 'LH'")
+
+    assert store.get('airlines', 'LH') is None
+    assert store.get_many('airlines', ["LH", "BA"]) == {'BA': "British Airways"}
+    # Storing the same name again renews the stale entry
+    assert store.set('airlines', 'LH', "Lufthansa")
+    assert store.get('airlines', 'LH') == "Lufthansa"
+
+def test_sqlite_write_back_commits_on_flush(tmp_path):
+    db_file = str(tmp_path / "cache.db")
+    store = SqliteCacheStore(db_file)
+    store.set('airlines', 'LH', "Lufthansa")
+    assert SqliteCacheStore(db_file).get('airlines', 'LH') is None
+
+    store.flush()
+    assert SqliteCacheStore(db_file).get('airlines', 'LH') == "Lufthansa"
+
+def test_sqlite_migrates_the_json_cache_once(tmp_path):
+    json_file = str(tmp_path / "cache.json")
+    write_json_atomic(json_file, {
+        'airlines': {'LH': "Lufthansa"},
+        'airports': {'FRA': "Frankfurt"},
+        'last_updated': "2026-01-01T00:00:00",
+    })
+    db_file = str(tmp_path / "cache.db")
+    store = SqliteCacheStore(db_file, json_file=json_file)
+    assert store.get('airlines', 'LH') == "Lufthansa"
+    assert store.get('airports', 'FRA') == "Frankfurt"
+    assert store.last_updated() == "2026-01-01T00:00:00"
+
+    # Later changes to the JSON file are not imported again
+    write_json_atomic(json_file, {'airlines': {'BA': "British Airways"}, 'airports': {}})
+    assert SqliteCacheStore(db_file, json_file=json_file).get('airlines', 'BA') is None
+
+def test_backend_selection(tmp_path):
+    cache = make_cache(tmp_path, backend='sqlite')
+    assert not cache.loaded
+    assert isinstance(cache.store, SqliteCacheStore)
+    assert cache.store.db_file == str(tmp_path / "cache.db")
+    assert isinstance(make_cache(tmp_path, backend='json').store, JsonCacheStore)
+    with pytest.raises(ValueError):
+        make_cache(tmp_path, backend='redis').store
+
+def test_get_many_counts_hits_and_misses(tmp_path):
+    cache = make_cache(tmp_path, backend='sqlite')
+    cache.store.set('airports', 'FRA', "Frankfurt")
+    assert cache.get_many('airports', ["FRA", "MUC", "FRA"]) == {'FRA': "Frankfurt"}
+    assert (cache.hits, cache.misses) == (1, 1)
+
+# --- City codes ---
+
+def location(sub_type, code, name, city_code=None, score=0):
+    return {'subType': sub_type, 'iataCode': code, 'name': name,
+            'address': {'cityCode': city_code or code}, 'analytics': {'travelers': {'score': score}}}
+
+NYC_LOCATIONS = [
+    location('CITY', "NYC", "NEW YORK"),
+    location('AIRPORT', "LGA", "LAGUARDIA", "NYC", score=20),
+    location('AIRPORT', "JFK", "JOHN F KENNEDY INTL", "NYC", score=45),
+    location('AIRPORT', "EWR", "NEWARK LIBERTY INTL", "NYC", score=30),
+]
+
+def test_city_code_resolves_to_its_busiest_airports(tmp_path):
+    cache = make_cache(tmp_path)
+    amadeus = FakeAmadeus({}, NYC_LOCATIONS)
+
+    assert cache.get_city_airports("NYC", amadeus) == ["JFK", "EWR", "LGA"]
+    # The member names come with the response, and the expansion is cached
+    assert cache.get_airport_name("EWR") == "NEWARK LIBERTY INTL"
+    assert cache.get_city_airports("NYC", amadeus) == ["JFK", "EWR", "LGA"]
+    assert amadeus.locations.calls == 1
+
+def test_airport_code_resolves_to_itself(tmp_path):
+    cache = make_cache(tmp_path)
+    amadeus = FakeAmadeus({}, [location('AIRPORT', "KEF", "KEFLAVIK INTL", "REK")])
+    assert cache.get_city_airports("KEF", amadeus) == ["KEF"]
+
+def test_failed_city_lookup_is_not_cached(tmp_path):
+    cache = make_cache(tmp_path)
+    assert cache.get_city_airports("NYC", FakeAmadeus({}, None)) == ["NYC"]
+    assert cache.get_city_airports("NYC", FakeAmadeus({}, NYC_LOCATIONS)) == ["JFK", "EWR", "LGA"]
+
+def test_bundled_index_expands_without_the_api(tmp_path):
+    cache = AirportAirlineCache(str(tmp_path / "cache.json"), backend='json')
+    airports = cache.get_city_airports("LON")
+    assert airports[0] == "LHR" and "LGW" in airports
+    assert cache.reference_hits == 1
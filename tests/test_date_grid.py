@@ -0,0 +1,55 @@
+from datetime import date
+
+from date_grid import build_date_grid, build_price_matrix, cheapest_cell, matrix_axes
+
+TODAY = date(2026, 11, 1)
+
+def test_single_cell_without_flex():
+    assert build_date_grid("2026-12-01", "2026-12-08", today=TODAY) == [("2026-12-01", "2026-12-08")]
+
+def test_flex_window_is_ordered_by_distance():
+    cells = build_date_grid("2026-12-01", "2026-12-08", departure_flex_days=1, return_flex_days=1, today=TODAY)
+
+    assert len(cells) == 9
+    assert cells[0] == ("2026-12-01", "2026-12-08")
+    # Cells one day off come before the corners
+    assert set(cells[1:5]) == {
+        ("2026-11-30", "2026-12-08"), ("2026-12-02", "2026-12-08"),
+        ("2026-12-01", "2026-12-07"), ("2026-12-01", "2026-12-09"),
+    }
+
+def test_invalid_cells_are_pruned():
+    cells = build_date_grid("2026-11-02", "2026-11-03", departure_flex_days=2, return_flex_days=1, today=TODAY)
+
+    # 2026-10-31 is in the past, returns before departure are dropped
+    assert all(dep >= "2026-11-01" for dep, _ in cells)
+    assert all(ret >= dep for dep, ret in cells)
+    assert ("2026-11-04", "2026-11-02") not in cells
+
+def test_stay_limits():
+    cells = build_date_grid("2026-12-01", "2026-12-08", departure_flex_days=3, return_flex_days=3,
+                            min_stay_days=6, max_stay_days=7, today=TODAY)
+    stays = {(date.fromisoformat(ret) - date.fromisoformat(dep)).days for dep, ret in cells}
+    assert stays == {6, 7}
+
+def test_price_hints_come_first_cheapest_first():
+    hints = {("2026-12-02", "2026-12-09"): 420.0, ("2026-11-30", "2026-12-07"): 380.0}
+    cells = build_date_grid("2026-12-01", "2026-12-08", departure_flex_days=1, return_flex_days=1,
+                            today=TODAY, price_hints=hints, max_cells=3)
+
+    assert cells == [("2026-11-30", "2026-12-07"), ("2026-12-02", "2026-12-09"), ("2026-12-01", "2026-12-08")]
+
+def test_price_matrix_merges_results_per_cell(make_offer):
+    out = [("LY", "1", "TLV", "KEF", "2026-12-01T08:00", "2026-12-01T13:00")]
+    results = [
+        {'departure_date': "2026-12-01", 'return_date': "2026-12-08", 'flights': [make_offer(out, price="500.00")]},
+        {'departure_date': "2026-12-01", 'return_date': "2026-12-08", 'flights': [make_offer(out, price="450.00")]},
+        {'departure_date': "2026-12-02", 'return_date': "2026-12-08", 'flights': []},
+    ]
+
+    matrix = build_price_matrix(results)
+
+    assert matrix == {("2026-12-01", "2026-12-08"): 450.0, ("2026-12-02", "2026-12-08"): None}
+    assert matrix_axes(matrix) == (["2026-12-01", "2026-12-02"], ["2026-12-08"])
+    assert cheapest_cell(matrix) == ("2026-12-01", "2026-12-08")
+    assert cheapest_cell({("2026-12-01", "2026-12-08"): None}) is None
@@ -0,0 +1,112 @@
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+
+from fare_analytics import (
+    compute_fare_stats, fare_insights, grouped_percentiles, load_history_arrays, route_fare_stats
+)
+from price_history import PriceHistory
+
+CELL = ("2026-12-01", "2026-12-08")
+OTHER_CELL = ("2026-12-02", "2026-12-09")
+
+def history(rows):
+    """Columnar history from (departure_date, return_date, observed_at, price) rows"""
+    departure_dates, return_dates, observed_at, prices = zip(*rows)
+    return {
+        'departure_date': np.array(departure_dates, dtype='datetime64[D]'),
+        'return_date': np.array(return_dates, dtype='datetime64[D]'),
+        'observed_at': np.array(observed_at, dtype='datetime64[s]'),
+        'price': np.array(prices, dtype=np.float64),
+    }
+
+def daily(cell, prices, first_day="2026-09-01"):
+    start = datetime.fromisoformat(first_day)
+    return [(*cell, (start + timedelta(days=i)).isoformat(), price) for i, price in enumerate(prices)]
+
+def test_grouped_percentiles_match_numpy():
+    rng = np.random.default_rng(7)
+    groups = rng.integers(0, 4, 200)
+    values = rng.normal(500, 50, 200)
+    quantiles = (0.0, 0.25, 0.5, 0.75)
+
+    result = grouped_percentiles(groups, values, quantiles, 5)
+
+    for group in range(4):
+        expected = np.percentile(values[groups == group], [q * 100 for q in quantiles])
+        assert result[group] == pytest.approx(expected)
+    # A group without values stays NaN
+    assert np.isnan(result[4]).all()
+
+def test_cheapest_quarter_is_a_buy():
+    stats = compute_fare_stats(history(daily(CELL, [500, 480, 520, 510, 400])))
+    cell = stats['cells'][CELL]
+
+    assert cell['latest'] == 400
+    assert (cell['min'], cell['p25'], cell['median'], cell['p75']) == (400, 480, 500, 510)
+    assert cell['observations'] == 5
+    assert cell['days_before'] == 87
+    assert cell['signal'] == "buy"
+
+def test_signals_need_enough_observations():
+    stats = compute_fare_stats(history(daily(CELL, [500, 400])), min_observations=3)
+    assert stats['cells'][CELL]['signal'] == "watch"
+    assert stats['cells'][CELL]['reason'] == "only 2 observations so far"
+
+def test_flat_history_is_watched():
+    stats = compute_fare_stats(history(daily(CELL, [500, 500, 500, 500])))
+    assert stats['cells'][CELL]['signal'] == "watch"
+    assert stats['cells'][CELL]['reason'] == "close to the usual price"
+
+def test_window_only_covers_recent_observations():
+    rows = daily(CELL, [300, 300, 300], first_day="2026-06-01") + daily(CELL, [500, 520, 510], first_day="2026-09-01")
+    stats = compute_fare_stats(history(rows), window_days=30)
+    assert stats['cells'][CELL]['min'] == 500
+    assert stats['observations'] == 6
+
+def test_days_before_departure_curve():
+    # Fares for both cells were higher three months out than in the last week
+    rows = []
+    for cell in (CELL, OTHER_CELL):
+        rows += daily(cell, [600, 600, 600], first_day="2026-09-10")
+        rows += daily(cell, [400, 400, 400], first_day="2026-11-25")
+
+    curve = {point['days_before']: point for point in compute_fare_stats(history(rows))['curve']}
+
+    assert set(curve) == {"0-7", "61-90"}
+    assert curve["0-7"]['relative_price'] < curve["61-90"]['relative_price']
+    assert curve["0-7"]['observations'] == 6
+
+def test_no_history():
+    assert compute_fare_stats(None) is None
+    assert fare_insights(None, {CELL: 400.0}) == []
+
+def test_route_fare_stats_reads_the_price_history(tmp_path, make_offer):
+    price_history = PriceHistory(str(tmp_path / "history.db"))
+    segments = [("LY", "1", "TLV", "KEF", "2026-12-01T08:00", "2026-12-01T13:00")]
+    now = datetime.now()
+    for days_ago, price in ((5, "520.00"), (4, "500.00"), (1, "450.00")):
+        offers = [make_offer(segments, price=price), make_offer(segments, price="999.00", offer_id="2")]
+        price_history.record_run("TLV", "KEF", offers, observed_at=now - timedelta(days=days_ago))
+
+    arrays = load_history_arrays(price_history, "TLV", "KEF")
+    # One row per run and cell, at its best price
+    assert arrays['price'].tolist() == [520.0, 500.0, 450.0]
+    assert load_history_arrays(price_history, "TLV", "LHR") is None
+
+    stats = route_fare_stats(price_history, "TLV", "KEF", history_days=2)
+    assert stats['observations'] == 1
+    price_history.close()
+
+def test_fare_insights():
+    rows = daily(CELL, [500, 480, 520, 510, 400]) + daily(OTHER_CELL, [600, 600, 600, 600, 600])
+    stats = compute_fare_stats(history(rows))
+
+    insights = fare_insights(stats, {CELL: 400.0, OTHER_CELL: 600.0})
+
+    assert insights[0] == (
+        "Over the last 30 days the cheapest dates (2026-12-01 → 2026-12-08) ranged $400–$510 (median $500), "
+        "today $400: book now, in the cheapest quarter of the last 30 days."
+    )
+    assert insights[1] == "1 of 2 date combinations are at a buy-now price."
@@ -0,0 +1,70 @@
+from flight_analysis import analyze_offers, pareto_frontier, render_analysis_html
+
+def direct(number, hour=8):
+    return [("LY", number, "TLV", "KEF", f"2026-12-01T{hour:02d}:00", f"2026-12-01T{hour + 5:02d}:00")]
+
+def one_stop(number, connection_at="2026-12-01T12:00"):
+    return [
+        ("LH", number, "TLV", "FRA", "2026-12-01T06:00", "2026-12-01T10:00"),
+        ("LH", f"{number}1", "FRA", "KEF", connection_at, "2026-12-02T14:00"),
+    ]
+
+WEIGHTS = {'price': 1.0, 'duration': 0.5, 'stops': 0.2}
+
+def test_pareto_frontier_drops_dominated_offers(make_offer):
+    cheap = make_offer(one_stop("1"), price="300.00", leg_duration="PT9H", offer_id="cheap")
+    fast = make_offer(direct("2"), price="500.00", leg_duration="PT5H", offer_id="fast")
+    # Dearer and slower than fast, with more stops
+    dominated = make_offer(one_stop("3"), price="550.00", leg_duration="PT10H", offer_id="dominated")
+
+    assert [offer.offer_id for offer in pareto_frontier([dominated, fast, cheap])] == ["cheap", "fast"]
+
+def test_picks(make_offer):
+    cheap = make_offer(one_stop("1"), price="300.00", leg_duration="PT9H", offer_id="cheap")
+    fast = make_offer(direct("2"), price="320.00", leg_duration="PT5H", offer_id="fast")
+    dominated = make_offer(one_stop("3"), price="550.00", leg_duration="PT10H", offer_id="dominated")
+
+    analysis = analyze_offers([cheap, fast, dominated], weights=WEIGHTS)
+
+    assert analysis['cheapest'] is cheap
+    assert analysis['fastest'] is fast
+    assert analysis['best_value'] is fast
+    assert dominated not in analysis['frontier']
+
+def test_no_offers():
+    assert analyze_offers([]) is None
+    assert render_analysis_html(None) == "No flights found."
+
+def test_date_and_offer_insights(make_offer):
+    offers = [
+        make_offer(one_stop("1", connection_at="2026-12-01T10:30"), price="300.00", offer_id="tight"),
+        make_offer(direct("2"), price="380.00", offer_id="direct"),
+        make_offer([
+            ("LH", "5", "TLV", "FRA", "2026-12-01T18:00", "2026-12-01T22:00"),
+            ("LH", "51", "FRA", "KEF", "2026-12-02T07:00", "2026-12-02T09:00"),
+        ], price="450.00", offer_id="overnight"),
+    ]
+    matrix = {("2026-12-01", "2026-12-08"): 380.0, ("2026-12-02", "2026-12-09"): 300.0, ("2026-12-03", "2026-12-10"): None}
+
+    insights = analyze_offers(offers, matrix, WEIGHTS, requested_cell=("2026-12-01", "2026-12-08"))['insights']
+
+    assert "range from $300 to $380; the cheapest dates are 2026-12-02 → 2026-12-09." in insights[0]
+    assert "saves $80." in insights[1]
+    assert "the cheapest costs $80 more than the overall cheapest fare" in insights[2]
+    assert any("overnight connection" in insight for insight in insights)
+    assert any("shorter than the minimum connection time" in insight for insight in insights)
+
+def test_no_direct_flights(make_offer):
+    insights = analyze_offers([make_offer(one_stop("1"))])['insights']
+    assert "No direct flights were found for these dates." in insights
+
+def test_render_refers_to_displayed_cards(make_offer):
+    cheap = make_offer(direct("1"), price="300.00", offer_id="cheap")
+    other = make_offer(direct("2", 10), price="320.00", leg_duration="PT4H", offer_id="other")
+    analysis = analyze_offers([cheap, other], weights=WEIGHTS)
+
+    html = render_analysis_html(analysis, displayed_offers=[other])
+
+    assert "Cheapest Option:</strong> Not in the list below: LY 1, 2026-12-01 → 2026-12-08, $300.00, 5h 0m, direct" in html
+    assert "Fastest Option:</strong> Option 1: LY 2" in html
+    assert "Key Insights" in html
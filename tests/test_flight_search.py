@@ -0,0 +1,214 @@
+import asyncio
+
+import pytest
+
+import flight_search
+from alert_rules import compile_rules
+from conftest import raw_offer
+from models import parse_offers
+from price_history import PriceHistory
+from routes import RouteSpec
+from search_executor import _timed_search
+from ttl_cache import PersistentTTLCache
+
+OUTBOUND = [("LY", "123", "TLV", "KEF", "2026-12-01T08:00", "2026-12-01T13:00")]
+RETURN = [("LY", "124", "KEF", "TLV", "2026-12-08T15:00", "2026-12-08T23:00")]
+
+class FakeFlightOffers:
+    def __init__(self, data):
+        self.data = data
+        self.calls = 0
+
+    def get(self, **params):
+        self.calls += 1
+        if isinstance(self.data, Exception):
+            raise self.data
+        return type("Response", (), {'data': self.data})()
+
+@pytest.fixture
+def flight_offers(monkeypatch, tmp_path):
+    offers = FakeFlightOffers([raw_offer([OUTBOUND, RETURN], price="432.10")])
+    amadeus = type("Amadeus", (), {'shopping': type("Shopping", (), {'flight_offers_search': offers})()})()
+    monkeypatch.setattr(flight_search, 'get_amadeus', lambda: amadeus)
+    monkeypatch.setattr(flight_search, 'search_cache', PersistentTTLCache(str(tmp_path / "search.json"), 600, 10))
+    monkeypatch.setattr(flight_search, 'SEARCH_CACHE_ENABLED', True)
+    return offers
+
+def search():
+    return flight_search.search_flights("TLV", "KEF", "2026-12-01", "2026-12-08", 5, 1)
+
+def test_search_cache_serves_repeated_searches(flight_offers):
+    flights, cached_at = search()
+    assert cached_at is None
+    cached_flights, cached_at = search()
+
+    assert cached_at is not None
+    assert flight_offers.calls == 1
+    assert cached_flights == flights
+    assert cached_flights[0].price_cents == 43210
+
+def test_search_cache_keeps_one_compact_string_per_search(flight_offers):
+    search()
+    (stored_at, payload), = flight_search.search_cache.entries.values()
+    assert isinstance(payload, str)
+    assert '"carrierCode":"LY"' in payload
+
+def test_failed_search_is_not_an_empty_result(flight_offers):
+    flight_offers.data = ConnectionError("timed out")
+    assert search() is None
+
+    result = _timed_search(lambda route, dep, ret: search(), (None, "2026-12-01", "2026-12-08"))
+    assert result['failed']
+    assert result['flights'] == []
+
+# --- Price history across runs ---
+
+ROUTE = RouteSpec("TLV", "KEF", "2026-12-01", "2026-12-08")
+FIRST_CELL = ("2026-12-01", "2026-12-08")
+SECOND_CELL = ("2026-12-02", "2026-12-09")
+
+def cell_offers(cell, number, price):
+    departure_date, return_date = cell
+    legs = [
+        [("LY", number, "TLV", "KEF", f"{departure_date}T08:00", f"{departure_date}T13:00")],
+        [("LY", str(int(number) + 1), "KEF", "TLV", f"{return_date}T15:00", f"{return_date}T23:00")],
+    ]
+    return parse_offers([raw_offer(legs, price=price, offer_id=number)], departure_date, return_date)
+
+def run_searches(cells):
+    """Search results as the executor builds them, a cell mapped to None failed"""
+    return [
+        _timed_search(lambda route, dep, ret: offers, (ROUTE, *cell))
+        for cell, offers in cells.items()
+    ]
+
+@pytest.fixture
+def history(monkeypatch, tmp_path):
+    history = PriceHistory(str(tmp_path / "history.db"))
+    monkeypatch.setattr(flight_search, 'price_history', history)
+    monkeypatch.setattr(flight_search, 'EMAIL_CHANGES_ONLY', False)
+    yield history
+    history.close()
+
+def test_failed_cell_offers_are_not_reported_gone(history):
+    flight_search.prepare_route_report(ROUTE, run_searches({
+        FIRST_CELL: cell_offers(FIRST_CELL, "100", "400.00"),
+        SECOND_CELL: cell_offers(SECOND_CELL, "200", "300.00"),
+    }))
+
+    report = flight_search.prepare_route_report(ROUTE, run_searches({
+        FIRST_CELL: cell_offers(FIRST_CELL, "100", "400.00"),
+        SECOND_CELL: None,
+    }))
+
+    assert report['changes']['disappeared'] == []
+    assert report['changes']['new'] == []
+    # Nothing is recorded for the failed cell in this run
+    assert set(history.latest_cell_prices("TLV", "KEF")) == {FIRST_CELL}
+
+    # A later successful search of that cell is compared with its last real observation
+    report = flight_search.prepare_route_report(ROUTE, run_searches({
+        FIRST_CELL: cell_offers(FIRST_CELL, "100", "400.00"),
+        SECOND_CELL: [],
+    }))
+    assert [row['departure_date'] for row in report['changes']['disappeared']] == ["2026-12-02"]
+
+def test_every_search_failed_records_nothing(history):
+    flight_search.prepare_route_report(ROUTE, run_searches({FIRST_CELL: cell_offers(FIRST_CELL, "100", "400.00")}))
+    report = flight_search.prepare_route_report(ROUTE, run_searches({FIRST_CELL: None}))
+
+    assert report['changes'] is None
+    assert report['offer_count'] == 0
+
+def test_alerted_offer_gets_a_card_with_changes_only(history, monkeypatch):
+    monkeypatch.setattr(flight_search, 'EMAIL_CHANGES_ONLY', True)
+    route = RouteSpec("TLV", "KEF", "2026-12-01", "2026-12-08", alert_rules=compile_rules([{"rule": "price_below", "price": 350}]))
+    history.record_notification("TLV", "KEF")
+    searches = {FIRST_CELL: cell_offers(FIRST_CELL, "100", "400.00"), SECOND_CELL: cell_offers(SECOND_CELL, "200", "300.00")}
+    flight_search.prepare_route_report(route, run_searches(searches))
+
+    # Nothing changed, but the $300 offer is still below the alert price
+    report = flight_search.prepare_route_report(route, run_searches(searches))
+
+    assert report['changes_only']
+    assert report['changes']['new'] == [] and report['changes']['price_drops'] == []
+    assert [offer.offer_id for offer in report['alerts'][0]['offers']] == ["200"]
+    assert [offer.offer_id for offer in report['flights']] == ["200"]
+
+# --- Claude narrative cache ---
+
+class FakeClaude:
+    def __init__(self):
+        self.calls = 0
+        self.messages = self
+
+    def create(self, **request):
+        self.calls += 1
+        content = [type("Block", (), {'text': f"Narrative {self.calls}"})()]
+        return type("Response", (), {'content': content, 'usage': None})()
+
+def test_narrative_is_reused_when_only_the_insights_change(monkeypatch, tmp_path):
+    claude = FakeClaude()
+    monkeypatch.setattr(flight_search, 'get_claude_client', lambda: claude)
+    monkeypatch.setattr(flight_search, 'summary_cache', PersistentTTLCache(str(tmp_path / "summary.json"), 3600, 10))
+    flights = cell_offers(FIRST_CELL, "100", "400.00") + cell_offers(SECOND_CELL, "200", "300.00")
+    analysis = {'cheapest': flights[1], 'fastest': flights[0], 'best_value': flights[1], 'insights': ["Below the 30 day median"]}
+
+    first = flight_search.summarize_with_claude(flights, {FIRST_CELL: 400.0}, analysis)
+    changed_insights = {**analysis, 'insights': ["At the 30 day median"]}
+    assert flight_search.summarize_with_claude(flights, {FIRST_CELL: 410.0}, changed_insights) == first
+    assert claude.calls == 1
+
+    other_picks = {**analysis, 'best_value': flights[0]}
+    assert flight_search.summarize_with_claude(flights, {FIRST_CELL: 400.0}, other_picks) != first
+    assert claude.calls == 2
+
+# --- Mailer ---
+
+def test_mailer_is_built_on_first_use(monkeypatch):
+    built = []
+
+    class FakeMailer:
+        closed = False
+
+        def close(self):
+            self.closed = True
+
+        def get_stats(self):
+            return {}
+
+    monkeypatch.setattr(flight_search, '_clients', {})
+    monkeypatch.setattr(flight_search.metrics, 'sources', dict(flight_search.metrics.sources))
+    monkeypatch.setattr(flight_search, 'create_mailer', lambda: built.append(FakeMailer()) or built[-1])
+
+    # Closing before any email was sent does not build one
+    flight_search.close_mailer()
+    assert built == []
+
+    mailer = flight_search.get_mailer()
+    assert flight_search.get_mailer() is mailer
+    assert len(built) == 1
+    flight_search.close_mailer()
+    assert mailer.closed
+
+# --- City code expansion ---
+
+def test_city_codes_expand_into_airport_pairs(monkeypatch):
+    members = {'NYC': ["JFK", "EWR", "LGA"], 'LON': ["LHR", "LGW"]}
+    monkeypatch.setattr(flight_search, 'EXPAND_CITY_CODES', True)
+    monkeypatch.setattr(flight_search, 'MAX_AIRPORTS_PER_CITY', 2)
+    monkeypatch.setattr(flight_search, 'get_amadeus', lambda: None)
+    monkeypatch.setattr(flight_search.cache, 'get_city_airports', lambda code, client: members.get(code, [code]))
+    routes = [RouteSpec("NYC", "LON", "2026-12-01", "2026-12-08"), RouteSpec("EWR", "NYC", "2026-12-01", "2026-12-08")]
+
+    airports = asyncio.run(flight_search.expand_city_codes_async(routes))
+
+    assert airports == {'EWR': ["EWR"], 'LON': ["LHR", "LGW"], 'NYC': ["JFK", "EWR"]}
+    assert flight_search.airport_pairs(routes[0], airports) == [("JFK", "LHR"), ("JFK", "LGW"), ("EWR", "LHR"), ("EWR", "LGW")]
+    # A pair with the same airport at both ends is not searched
+    assert flight_search.airport_pairs(routes[1], airports) == [("EWR", "JFK")]
+
+def test_city_expansion_can_be_disabled(monkeypatch):
+    monkeypatch.setattr(flight_search, 'EXPAND_CITY_CODES', False)
+    airports = asyncio.run(flight_search.expand_city_codes_async([ROUTE]))
+    assert airports == {'KEF': ["KEF"], 'TLV': ["TLV"]}
@@ -0,0 +1,194 @@
+import json
+import smtplib
+import socket
+from datetime import datetime, timedelta
+
+import pytest
+
+from cache_manager import write_json_atomic
+from mailer import Mailer, MailQueue, is_transient, parse_recipients, rejects_message
+
+@pytest.mark.parametrize("value, recipients", [
+    ("a@example.com", ["a@example.com"]),
+    ("a@example.com, b@example.com;c@example.com", ["a@example.com", "b@example.com", "c@example.com"]),
+    (" a@example.com ;; a@example.com, ", ["a@example.com"]),
+    (["a@example.com", " b@example.com", "a@example.com", ""], ["a@example.com", "b@example.com"]),
+    ("", []),
+    (None, []),
+])
+def test_parse_recipients(value, recipients):
+    assert parse_recipients(value) == recipients
+
+@pytest.mark.parametrize("error, transient", [
+    (smtplib.SMTPServerDisconnected("gone"), True),
+    (ConnectionRefusedError(), True),
+    (smtplib.SMTPDataError(451, b"try later"), True),
+    (smtplib.SMTPDataError(550, b"rejected"), False),
+    (smtplib.SMTPAuthenticationError(535, b"bad login"), False),
+    (smtplib.SMTPRecipientsRefused({'a@example.com': (450, b"busy")}), True),
+    (smtplib.SMTPRecipientsRefused({'a@example.com': (450, b"busy"), 'b@example.com': (550, b"no such user")}), False),
+    (ValueError("bug"), False),
+])
+def test_is_transient(error, transient):
+    assert is_transient(error) is transient
+
+def test_rejects_message():
+    assert rejects_message(smtplib.SMTPDataError(550, b"rejected"))
+    assert not rejects_message(smtplib.SMTPDataError(451, b"try later"))
+    # The server refusing the login is not about this message, it is queued
+    assert not rejects_message(smtplib.SMTPAuthenticationError(535, b"bad login"))
+
+# --- Queue ---
+
+def test_queue_keeps_messages_in_order(tmp_path):
+    queue = MailQueue(str(tmp_path / "queue"))
+    assert queue.pending() == [] and len(queue) == 0
+
+    first = queue.put("First", "<p>1</p>", ["a@example.com"], "timeout")
+    queue.put("Second", "<p>2</p>", ["b@example.com"], "timeout")
+
+    assert len(queue) == 2
+    assert [record['subject'] for _, record in queue.pending()] == ["First", "Second"]
+
+    queue.put("First", "<p>1</p>", ["a@example.com"], "refused", first)
+    record = dict(queue.pending())[first]
+    assert record['attempts'] == 2
+    assert record['last_error'] == "refused"
+
+    queue.remove(first)
+    queue.remove(first)
+    assert [record['subject'] for _, record in queue.pending()] == ["Second"]
+
+def test_queue_drops_expired_messages(tmp_path):
+    queue = MailQueue(str(tmp_path / "queue"), max_age_hours=24)
+    stale = queue.put("Stale", "<p>old</p>", ["a@example.com"], "timeout")
+    queue.put("Fresh", "<p>new</p>", ["a@example.com"], "timeout")
+    with open(stale, encoding='utf-8') as f:
+        record = json.load(f)
+    record['queued_at'] = (datetime.now() - timedelta(hours=25)).isoformat(timespec='seconds')
+    write_json_atomic(stale, record)
+
+    assert [record['subject'] for _, record in queue.pending()] == ["Fresh"]
+    assert len(queue) == 1
+
+def test_queue_skips_unreadable_files(tmp_path):
+    queue = MailQueue(str(tmp_path / "queue"))
+    queue.put("Good", "<p>ok</p>", ["a@example.com"], "timeout")
+    (tmp_path / "queue" / "broken.json").write_text("{", encoding='utf-8')
+    (tmp_path / "queue" / "notes.txt").write_text("ignored", encoding='utf-8')
+
+    assert [record['subject'] for _, record in queue.pending()] == ["Good"]
+
+# --- Delivery against a local SMTP server ---
+
+class RecordingHandler:
+    """Accepts messages, or answers DATA with the next scripted reply"""
+
+    def __init__(self):
+        self.messages = []
+        self.replies = []
+
+    async def handle_DATA(self, server, session, envelope):
+        if self.replies:
+            return self.replies.pop(0)
+        self.messages.append((id(session), envelope.rcpt_tos, envelope.content.decode('utf-8', 'replace')))
+        return "250 Message accepted for delivery"
+
+@pytest.fixture
+def smtp_server():
+    controller_module = pytest.importorskip("aiosmtpd.controller")
+    handler = RecordingHandler()
+    controller = controller_module.Controller(handler, hostname="127.0.0.1", port=_free_port())
+    controller.start()
+    yield handler, controller.port
+    controller.stop()
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def make_mailer(port, queue=None, max_retries=2):
+    return Mailer("127.0.0.1", port, "bot@example.com", None, security='none', timeout=5,
+                  max_retries=max_retries, backoff_base=0, queue=queue)
+
+MESSAGES = [
+    ("Flight Search Results", "<p>one</p>", "a@example.com"),
+    ("Flight Price Alert", "<p>two</p>", ["b@example.com", "c@example.com"]),
+]
+
+def test_one_session_for_every_message(smtp_server, tmp_path):
+    handler, port = smtp_server
+    with make_mailer(port, MailQueue(str(tmp_path / "queue"))) as mailer:
+        assert mailer.send(MESSAGES) == ['sent', 'sent']
+        assert mailer.send([("Later", "<p>three</p>", "a@example.com")]) == ['sent']
+        assert mailer.get_stats()['sessions'] == 1
+
+    assert len({session for session, _, _ in handler.messages}) == 1
+    assert [recipients for _, recipients, _ in handler.messages] == [
+        ["a@example.com"], ["b@example.com", "c@example.com"], ["a@example.com"]
+    ]
+    assert "Subject: Flight Price Alert" in handler.messages[1][2]
+
+def test_transient_reply_is_retried(smtp_server):
+    handler, port = smtp_server
+    handler.replies = ["451 Try again later"]
+    mailer = make_mailer(port)
+
+    assert mailer.send(MESSAGES[:1]) == ['sent']
+    assert mailer.get_stats()['retried'] == 1
+    assert len(handler.messages) == 1
+    mailer.close()
+
+def test_rejected_message_is_dropped(smtp_server, tmp_path):
+    handler, port = smtp_server
+    handler.replies = ["550 Message rejected"]
+    queue = MailQueue(str(tmp_path / "queue"))
+    mailer = make_mailer(port, queue)
+
+    # The rejection does not hold up the next message or mark the server unavailable
+    assert mailer.send(MESSAGES) == ['failed', 'sent']
+    assert mailer.get_stats()['retried'] == 0
+    assert mailer.get_stats()['failed'] == 1
+    assert len(queue) == 0
+    assert [recipients for _, recipients, _ in handler.messages] == [["b@example.com", "c@example.com"]]
+    mailer.close()
+
+def test_unavailable_server_queues_and_next_send_delivers(smtp_server, tmp_path):
+    handler, port = smtp_server
+    queue = MailQueue(str(tmp_path / "queue"))
+
+    offline = make_mailer(_free_port(), queue, max_retries=1)
+    assert offline.send(MESSAGES) == ['queued', 'queued']
+    stats = offline.get_stats()
+    # The second message does not wait through the retries again
+    assert stats['retried'] == 1
+    assert stats['queued'] == 2 and stats['queue_pending'] == 2
+    offline.close()
+
+    mailer = make_mailer(port, queue)
+    assert mailer.send([("Today", "<p>new</p>", "a@example.com")]) == ['sent']
+    assert mailer.get_stats()['sent_from_queue'] == 2
+    assert len(queue) == 0
+    # Queued messages go out first, oldest first
+    assert ["<p>one</p>" in content for _, _, content in handler.messages] == [True, False, False]
+    assert "<p>new</p>" in handler.messages[-1][2]
+    mailer.close()
+
+def test_queued_message_rejected_on_redelivery_is_removed(smtp_server, tmp_path):
+    handler, port = smtp_server
+    queue = MailQueue(str(tmp_path / "queue"))
+    queue.put("Old", "<p>old</p>", ["a@example.com"], "timeout")
+    handler.replies = ["554 Transaction failed"]
+
+    mailer = make_mailer(port, queue)
+    assert mailer.send([]) == []
+    assert len(queue) == 0
+    assert handler.messages == []
+    mailer.close()
+
+def test_message_without_recipients_fails(smtp_server):
+    _, port = smtp_server
+    mailer = make_mailer(port)
+    assert mailer.send([("Nobody", "<p>?</p>", " ; ")]) == ['failed']
+    assert mailer.get_stats()['sessions'] == 0
@@ -0,0 +1,123 @@
+import asyncio
+import json
+
+import pytest
+
+from metrics import MetricsRegistry
+
+class StatsSource:
+    def __init__(self, stats):
+        self.stats = stats
+
+    def get_stats(self):
+        if self.stats is None:
+            raise RuntimeError("not available")
+        return self.stats
+
+def test_spans_aggregate_per_name_and_labels():
+    registry = MetricsRegistry()
+    for route in ("TLV-KEF", "TLV-KEF", "TLV-LHR"):
+        with registry.span('flight_search', route=route):
+            pass
+
+    spans = {span['labels']['route']: span for span in registry.snapshot()['spans']}
+    assert spans['TLV-KEF']['count'] == 2
+    assert spans['TLV-LHR']['count'] == 1
+    assert spans['TLV-KEF']['max_seconds'] <= spans['TLV-KEF']['seconds']
+
+def test_spans_record_errors_and_parents():
+    registry = MetricsRegistry()
+    with pytest.raises(ValueError):
+        with registry.span('stage', stage='search'):
+            with registry.span('api_call', api="Amadeus"):
+                raise ValueError("boom")
+
+    trace = registry.snapshot()['trace']
+    assert [(span['name'], span['parent'], span['error']) for span in trace] == [
+        ('api_call', 'stage', 'ValueError'), ('stage', None, 'ValueError'),
+    ]
+    assert all(span['errors'] == 1 for span in registry.snapshot()['spans'])
+
+def test_concurrent_tasks_get_their_own_parents():
+    registry = MetricsRegistry()
+
+    async def route(name):
+        with registry.span(name):
+            await asyncio.sleep(0.01)
+            with registry.span('child'):
+                await asyncio.sleep(0.01)
+
+    async def main():
+        await asyncio.gather(route('first'), route('second'))
+    asyncio.run(main())
+
+    parents = sorted(span['parent'] for span in registry.snapshot()['trace'] if span['name'] == 'child')
+    assert parents == ['first', 'second']
+
+def test_timed_decorator():
+    registry = MetricsRegistry()
+
+    @registry.timed('work', kind="test")
+    def work(value):
+        return value * 2
+
+    assert work(21) == 42
+    assert registry.snapshot()['spans'][0]['labels'] == {'kind': "test"}
+
+def test_counters_sources_and_reset():
+    registry = MetricsRegistry()
+    registry.increment('searches', 4)
+    registry.increment('searches')
+    registry.increment('alerts_fired', rule='price_below')
+    registry.register_source('api', StatsSource({'calls': 3}))
+    registry.register_source('broken', StatsSource(None))
+
+    snapshot = registry.snapshot()
+    assert {(c['name'], tuple(c['labels'].items())): c['value'] for c in snapshot['counters']} == {
+        ('searches', ()): 5, ('alerts_fired', (('rule', 'price_below'),)): 1,
+    }
+    # A failing source is left out instead of failing the export
+    assert snapshot['sources'] == {'api': {'calls': 3}}
+
+    registry.reset()
+    assert registry.snapshot()['counters'] == []
+    assert 'api' in registry.snapshot()['sources']
+
+def test_trace_is_capped(monkeypatch):
+    monkeypatch.setattr("metrics.MAX_TRACE_SPANS", 2)
+    registry = MetricsRegistry()
+    for _ in range(5):
+        with registry.span('tick'):
+            pass
+    snapshot = registry.snapshot()
+    assert len(snapshot['trace']) == 2
+    assert snapshot['dropped_spans'] == 3
+    assert snapshot['spans'][0]['count'] == 5
+
+def test_prometheus_text():
+    registry = MetricsRegistry()
+    with registry.span('llm_call', model='claude "haiku"'):
+        pass
+    registry.increment('emails-sent', 2)
+    registry.register_source('search_cache', StatsSource({'hits': 3, 'hit_rate': 0.75, 'name': "cache", 'enabled': True,
+                                                          'nested': {'entries': 9}}))
+
+    text = registry.prometheus_text()
+
+    assert 'flight_search_span_seconds_count{span="llm_call",model="claude \\"haiku\\""} 1' in text
+    assert "# TYPE flight_search_emails_sent_total counter\nflight_search_emails_sent_total 2" in text
+    assert "flight_search_search_cache_hit_rate 0.75" in text
+    assert "flight_search_search_cache_nested_entries 9" in text
+    assert "search_cache_name" not in text and "search_cache_enabled" not in text
+    assert text.endswith("\n")
+
+def test_write_json_and_prometheus(tmp_path):
+    registry = MetricsRegistry()
+    registry.increment('searches')
+    registry.write_json(str(tmp_path / "metrics.json"))
+    registry.write_prometheus(str(tmp_path / "textfile" / "flights.prom"))
+
+    with open(tmp_path / "metrics.json", encoding='utf-8') as f:
+        assert json.load(f)['counters'][0]['value'] == 1
+    assert "flight_search_searches_total 1" in (tmp_path / "textfile" / "flights.prom").read_text(encoding='utf-8')
+    assert [path.name for path in (tmp_path / "textfile").iterdir()] == ["flights.prom"]
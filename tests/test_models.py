@@ -0,0 +1,131 @@
+import pytest
+
+import models
+from models import Offer, parse_duration_minutes, parse_offers, parse_price_cents
+from conftest import raw_offer
+
+DIRECT_OUT = [("LY", "123", "TLV", "KEF", "2026-12-01T08:00", "2026-12-01T13:00")]
+DIRECT_BACK = [("LY", "124", "KEF", "TLV", "2026-12-08T15:00", "2026-12-08T23:00")]
+
+@pytest.mark.parametrize("duration, minutes", [
+    ("PT4H30M", 270),
+    ("PT45M", 45),
+    ("PT7H", 420),
+    ("P1DT2H", 1560),
+])
+def test_parse_duration_minutes(duration, minutes):
+    assert parse_duration_minutes(duration) == minutes
+
+@pytest.mark.parametrize("duration", ["", None, "4H30M", "PT4X"])
+def test_parse_duration_minutes_rejects_invalid(duration):
+    with pytest.raises(ValueError):
+        parse_duration_minutes(duration)
+
+def test_parse_price_cents_is_exact():
+    assert parse_price_cents("1204.16") == 120416
+    assert parse_price_cents("0.1") == 10
+    with pytest.raises(ValueError):
+        parse_price_cents("free")
+
+def test_round_trip_totals(make_offer):
+    offer = make_offer(DIRECT_OUT, DIRECT_BACK, price="432.10", leg_duration="PT5H")
+
+    assert offer.price_cents == 43210
+    assert offer.duration_minutes == 600
+    assert offer.stops == 0
+    assert offer.outbound.first_segment.number == "123"
+    assert offer.inbound.first_segment.number == "124"
+    assert [segment.number for segment in offer.segments] == ["123", "124"]
+
+def test_one_way_offer_has_no_inbound(make_offer):
+    offer = make_offer(DIRECT_OUT)
+    assert offer.inbound is None
+    assert offer.max_leg_stops == 0
+
+def test_layover_minutes(make_offer):
+    offer = make_offer([
+        ("LH", "1", "TLV", "FRA", "2026-12-01T06:00", "2026-12-01T10:00"),
+        ("LH", "2", "FRA", "KEF", "2026-12-01T11:30", "2026-12-01T14:00"),
+    ])
+    leg = offer.outbound
+
+    assert leg.layover_minutes == (90,)
+    assert leg.stop_airports == ("FRA",)
+    assert leg.overnight == (False,)
+    assert leg.short_connection == (False,)
+    assert offer.overnight_stops == offer.short_connections == 0
+
+def test_overnight_connection(make_offer):
+    offer = make_offer([
+        ("W6", "1", "TLV", "BUD", "2026-12-01T19:00", "2026-12-01T23:00"),
+        ("W6", "2", "BUD", "KEF", "2026-12-02T06:00", "2026-12-02T09:00"),
+    ])
+
+    assert offer.outbound.layover_minutes == (420,)
+    assert offer.outbound.overnight == (True,)
+    assert offer.overnight_stops == 1
+
+def test_short_connection(make_offer):
+    offer = make_offer([
+        ("LH", "1", "TLV", "FRA", "2026-12-01T06:00", "2026-12-01T10:00"),
+        ("LH", "2", "FRA", "KEF", "2026-12-01T10:40", "2026-12-01T13:00"),
+    ])
+
+    assert offer.outbound.layover_minutes == (40,)
+    assert offer.outbound.short_connection == (True,)
+    assert offer.short_connections == 1
+
+def test_short_connection_uses_the_airport_minimum(make_offer, monkeypatch):
+    monkeypatch.setitem(models.MIN_CONNECTION_MINUTES_BY_AIRPORT, "FRA", 30)
+    offer = make_offer([
+        ("LH", "1", "TLV", "FRA", "2026-12-01T06:00", "2026-12-01T10:00"),
+        ("LH", "2", "FRA", "KEF", "2026-12-01T10:40", "2026-12-01T13:00"),
+    ])
+    assert offer.outbound.short_connection == (False,)
+
+def test_max_leg_stops_is_per_leg(make_offer):
+    offer = make_offer(
+        [
+            ("LH", "1", "TLV", "FRA", "2026-12-01T06:00", "2026-12-01T10:00"),
+            ("LH", "2", "FRA", "KEF", "2026-12-01T12:00", "2026-12-01T14:00"),
+        ],
+        [
+            ("FI", "1", "KEF", "CPH", "2026-12-08T07:00", "2026-12-08T12:00"),
+            ("SK", "2", "CPH", "WAW", "2026-12-08T14:00", "2026-12-08T15:30"),
+            ("LO", "3", "WAW", "TLV", "2026-12-08T17:00", "2026-12-08T21:30"),
+        ],
+    )
+
+    assert offer.outbound.stops == 1
+    assert offer.inbound.stops == 2
+    assert offer.stops == 3
+    assert offer.max_leg_stops == 2
+
+def test_itinerary_key_covers_both_legs(make_offer):
+    one = make_offer(DIRECT_OUT, DIRECT_BACK)
+    other_return = make_offer(DIRECT_OUT, [("LY", "126", "KEF", "TLV", "2026-12-08T18:00", "2026-12-09T02:00")])
+    assert one.itinerary_key != other_return.itinerary_key
+    assert one.itinerary_key == make_offer(DIRECT_OUT, DIRECT_BACK, price="999.00").itinerary_key
+
+def test_offer_without_segments_is_rejected():
+    with pytest.raises(ValueError):
+        Offer.from_amadeus(raw_offer([[]]))
+
+def test_parse_offers_skips_malformed():
+    good = raw_offer([DIRECT_OUT], offer_id="good")
+    missing_price = raw_offer([DIRECT_OUT], offer_id="bad")
+    del missing_price['price']
+
+    offers = parse_offers([good, missing_price, raw_offer([[]], offer_id="empty")], "2026-12-01", "2026-12-08")
+
+    assert [offer.offer_id for offer in offers] == ["good"]
+    assert offers[0].departure_date == "2026-12-01"
+
+def test_segments_and_itinerary_key_are_computed_once(make_offer):
+    offer = make_offer(DIRECT_OUT, DIRECT_BACK)
+    assert offer.segments is offer.segments
+    assert offer.itinerary_key is offer.itinerary_key
+    assert offer.itinerary_key == (
+        ("LY", "123", "2026-12-01T08:00:00", "2026-12-01T13:00:00"),
+        ("LY", "124", "2026-12-08T15:00:00", "2026-12-08T23:00:00"),
+    )
@@ -0,0 +1,58 @@
+import pytest
+
+from offer_ranking import dedupe_offers, ranking_key, select_top_offers, value_scorer
+
+def direct(number, hour=8):
+    return [("LY", number, "TLV", "KEF", f"2026-12-01T{hour:02d}:00", f"2026-12-01T{hour + 5:02d}:00")]
+
+def one_stop(number):
+    return [
+        ("LH", number, "TLV", "FRA", "2026-12-01T06:00", "2026-12-01T10:00"),
+        ("LH", f"{number}1", "FRA", "KEF", "2026-12-01T12:00", "2026-12-01T14:00"),
+    ]
+
+def test_dedupe_keeps_the_cheapest_in_first_seen_order(make_offer):
+    first = make_offer(direct("1"), price="500.00", offer_id="a")
+    other = make_offer(direct("2", 10), price="450.00", offer_id="b")
+    cheaper_repeat = make_offer(direct("1"), price="480.00", offer_id="c", departure_date="2026-11-30")
+
+    assert [offer.offer_id for offer in dedupe_offers([first, other, cheaper_repeat])] == ["c", "b"]
+
+def test_rank_by_price_then_duration(make_offer):
+    slow = make_offer(direct("1"), price="400.00", leg_duration="PT9H", offer_id="slow")
+    fast = make_offer(direct("2", 10), price="400.00", leg_duration="PT5H", offer_id="fast")
+    pricey = make_offer(direct("3", 12), price="600.00", offer_id="pricey")
+
+    top = select_top_offers([pricey, slow, fast], 2, 'price')
+    assert [offer.offer_id for offer in top] == ["fast", "slow"]
+
+def test_rank_by_duration(make_offer):
+    slow = make_offer(direct("1"), price="300.00", leg_duration="PT9H", offer_id="slow")
+    fast = make_offer(direct("2", 10), price="700.00", leg_duration="PT4H", offer_id="fast")
+
+    assert [offer.offer_id for offer in select_top_offers([slow, fast], 5, 'duration')] == ["fast", "slow"]
+
+def test_rank_by_score_weighs_price_duration_and_stops(make_offer):
+    cheap_connection = make_offer(one_stop("1"), price="400.00", leg_duration="PT8H", offer_id="connection")
+    direct_flight = make_offer(direct("2"), price="420.00", leg_duration="PT5H", offer_id="direct")
+    weights = {'price': 1.0, 'duration': 0.5, 'stops': 0.2}
+
+    top = select_top_offers([cheap_connection, direct_flight], 2, 'score', weights)
+    assert [offer.offer_id for offer in top] == ["direct", "connection"]
+
+    score = value_scorer([cheap_connection, direct_flight], weights)
+    assert score(direct_flight) == pytest.approx(1.05 + 0.5)
+    assert score(cheap_connection) == pytest.approx(1.0 + 0.5 * 8 / 5 + 0.2)
+
+def test_equal_offers_keep_input_order(make_offer):
+    offers = [make_offer(direct(str(i), 8 + i), offer_id=str(i)) for i in range(4)]
+    assert [offer.offer_id for offer in select_top_offers(offers, 3)] == ["0", "1", "2"]
+
+def test_unknown_ranking_is_rejected():
+    with pytest.raises(ValueError):
+        ranking_key([], 'comfort')
+
+def test_empty_input(make_offer):
+    assert select_top_offers([], 5) == []
+    assert dedupe_offers([]) == []
+    assert value_scorer([], {})(None) == 0.0
@@ -0,0 +1,100 @@
+from datetime import datetime
+
+import pytest
+
+from price_history import PriceHistory, itinerary_id
+
+@pytest.fixture
+def history(tmp_path):
+    history = PriceHistory(str(tmp_path / "history.db"))
+    yield history
+    history.close()
+
+@pytest.fixture
+def offer(make_offer):
+    """An offer on flight number, for the given departure date"""
+    def make(number, price, departure_date="2026-12-01"):
+        day = departure_date[-2:]
+        return make_offer(
+            [("LY", number, "TLV", "KEF", f"2026-12-{day}T08:00", f"2026-12-{day}T13:00")],
+            price=price, departure_date=departure_date, return_date="2026-12-20",
+        )
+    return make
+
+def key(offer):
+    return (offer.departure_date, offer.return_date, itinerary_id(offer))
+
+def record(history, offers, hour):
+    return history.record_run("TLV", "KEF", offers, observed_at=datetime(2026, 11, 1, hour))
+
+def test_first_run_has_no_changes(history, offer):
+    run_id = record(history, [offer("1", "400.00")], 8)
+    assert history.compute_changes(run_id, 10) is None
+    assert history.previous_prices(run_id) is None
+
+def test_changes_since_the_previous_run(history, offer):
+    kept, dropped, gone = offer("1", "400.00"), offer("2", "500.00"), offer("3", "300.00")
+    record(history, [kept, dropped, gone], 8)
+
+    cheaper, new = offer("2", "440.00"), offer("4", "350.00")
+    run_id = record(history, [offer("1", "390.00"), cheaper, new], 9)
+    changes = history.compute_changes(run_id, 10)
+
+    assert changes['previous_observed_at'] == "2026-11-01T08:00:00"
+    assert changes['new'] == {key(new)}
+    assert changes['price_drops'] == {key(cheaper): 50000}
+    assert [row['flight_number'] for row in changes['disappeared']] == ["3"]
+    assert changes['disappeared'][0]['price_cents'] == 30000
+
+def test_drop_threshold_is_inclusive(history, offer):
+    record(history, [offer("1", "500.00"), offer("2", "500.00")], 8)
+    run_id = record(history, [offer("1", "450.00"), offer("2", "450.01")], 9)
+
+    assert list(history.compute_changes(run_id, 10)['price_drops']) == [key(offer("1", "450.00"))]
+
+def test_duplicate_itinerary_keeps_the_lowest_price(history, offer):
+    record(history, [offer("1", "500.00")], 8)
+    run_id = record(history, [offer("1", "480.00"), offer("1", "440.00")], 9)
+
+    assert history.compute_changes(run_id, 10)['price_drops'] == {key(offer("1", "440.00")): 50000}
+
+def test_routes_are_compared_separately(history, offer):
+    history.record_run("TLV", "BUD", [offer("9", "100.00")], observed_at=datetime(2026, 11, 1, 7))
+    run_id = record(history, [offer("1", "400.00")], 8)
+    assert history.compute_changes(run_id, 10) is None
+
+def test_partial_run_compares_each_cell_with_its_last_observation(history, offer):
+    first_day, second_day = offer("1", "400.00"), offer("2", "500.00", "2026-12-02")
+    record(history, [first_day, second_day], 8)
+    # Only the second day was searched again, the first was served from the search cache
+    record(history, [offer("2", "480.00", "2026-12-02")], 9)
+
+    run_id = record(history, [offer("1", "300.00"), offer("2", "470.00", "2026-12-02")], 10)
+    changes = history.compute_changes(run_id, 10)
+
+    # The first day is compared with the 08:00 run rather than reported as new
+    assert changes['new'] == set()
+    assert changes['price_drops'] == {key(first_day): 40000}
+    assert changes['disappeared'] == []
+    assert changes['previous_observed_at'] == "2026-11-01T09:00:00"
+    assert history.previous_prices(run_id) == {key(first_day): 40000, key(second_day): 48000}
+
+def test_searched_cells_without_offers_report_disappeared(history, offer):
+    record(history, [offer("1", "400.00"), offer("2", "500.00", "2026-12-02")], 8)
+    run_id = record(history, [offer("1", "400.00")], 9)
+
+    # By default only cells with offers are compared, the caller knows which cells it searched
+    assert history.compute_changes(run_id, 10)['disappeared'] == []
+    changes = history.compute_changes(run_id, 10, {("2026-12-01", "2026-12-20"), ("2026-12-02", "2026-12-20")})
+    assert [row['flight_number'] for row in changes['disappeared']] == ["2"]
+
+def test_latest_cell_prices(history, offer):
+    record(history, [offer("1", "400.00"), offer("2", "350.00"), offer("3", "500.00", "2026-12-02")], 8)
+    assert history.latest_cell_prices("TLV", "KEF") == {("2026-12-01", "2026-12-20"): 350.0, ("2026-12-02", "2026-12-20"): 500.0}
+
+def test_notifications(history):
+    assert history.last_notified_at("TLV", "KEF") is None
+    history.record_notification("TLV", "KEF", datetime(2026, 11, 1, 8))
+    history.record_notification("TLV", "KEF", datetime(2026, 11, 8, 8))
+    assert history.last_notified_at("TLV", "KEF") == datetime(2026, 11, 8, 8)
+    assert history.last_notified_at("TLV", "BUD") is None
@@ -0,0 +1,91 @@
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from rate_limiter import ApiCallGuard, GuardedClient, TokenBucket, amadeus_guard, is_retryable
+
+class ApiError(Exception):
+    def __init__(self, status_code, headers=None):
+        super().__init__(f"HTTP {status_code}")
+        self.response = SimpleNamespace(status_code=status_code, headers=headers or {})
+
+def flaky(*errors, result="ok"):
+    """A function raising the given errors in turn, then returning result"""
+    errors = list(errors)
+    calls = []
+
+    def fn(*args, **kwargs):
+        calls.append((args, kwargs))
+        if errors:
+            raise errors.pop(0)
+        return result
+    fn.calls = calls
+    return fn
+
+def make_guard(max_retries=3):
+    return ApiCallGuard(TokenBucket(1e9, 1e9), max_retries=max_retries, base_delay=0, max_delay=0, name="test")
+
+def test_token_bucket_paces_calls():
+    bucket = TokenBucket(rate=50, capacity=1)
+    started = time.monotonic()
+    waited = sum(bucket.acquire() for _ in range(4))
+    elapsed = time.monotonic() - started
+
+    # The first token is free, the next three wait about 20ms each
+    assert waited == pytest.approx(0.06, abs=0.02)
+    assert elapsed >= 0.05
+
+@pytest.mark.parametrize("error, retryable", [
+    (ApiError(429), True),
+    (ApiError(503), True),
+    (ApiError(400), False),
+    (ApiError(None), True),
+    (ConnectionError(), True),
+    (TimeoutError(), True),
+    (ValueError(), False),
+])
+def test_is_retryable(error, retryable):
+    assert is_retryable(error) is retryable
+
+def test_transient_failures_are_retried():
+    guard = make_guard()
+    fn = flaky(ApiError(429), ApiError(503))
+
+    assert guard.call(fn, 1, key="value") == "ok"
+    assert fn.calls == [((1,), {'key': "value"})] * 3
+    stats = guard.get_stats()
+    assert (stats['calls'], stats['retried'], stats['throttled'], stats['failed']) == (3, 2, 1, 0)
+
+def test_client_errors_are_not_retried():
+    guard = make_guard()
+    with pytest.raises(ApiError):
+        guard.call(flaky(ApiError(400)))
+    assert guard.get_stats()['calls'] == 1
+    assert guard.get_stats()['failed'] == 1
+
+def test_retries_are_limited():
+    guard = make_guard(max_retries=2)
+    with pytest.raises(ApiError):
+        guard.call(flaky(*[ApiError(500)] * 5))
+    stats = guard.get_stats()
+    assert (stats['calls'], stats['retried'], stats['failed']) == (3, 2, 1)
+
+def test_retry_after_is_honoured_up_to_the_maximum():
+    guard = ApiCallGuard(TokenBucket(1e9, 1e9), max_delay=2.0)
+    assert guard._backoff(0, ApiError(429, {'Retry-After': "1.5"})) == 1.5
+    assert guard._backoff(0, ApiError(429, {'Retry-After': "60"})) == 2.0
+    assert 0 <= guard._backoff(3, ApiError(503)) <= 2.0
+
+def test_guarded_client_routes_get_and_post_through_the_guard():
+    endpoint = SimpleNamespace(get=flaky(ApiError(503), result="offers"), post=flaky(result="posted"), name="search")
+    client = GuardedClient(SimpleNamespace(shopping=SimpleNamespace(flight_offers_search=endpoint)), make_guard())
+
+    assert client.shopping.flight_offers_search.get(max=5) == "offers"
+    assert client.shopping.flight_offers_search.post() == "posted"
+    assert client.shopping.flight_offers_search.name == "search"
+    assert len(endpoint.get.calls) == 2
+
+def test_amadeus_guard_uses_the_environment_quota():
+    assert amadeus_guard('production').bucket.rate == 40.0
+    assert amadeus_guard('unknown').bucket.rate == 10.0
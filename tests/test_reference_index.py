@@ -0,0 +1,95 @@
+import pytest
+
+from reference_index import ReferenceIndex, airport_display_name, build_index, load_openflights_airlines
+
+SECTIONS = {
+    'airlines': {'LY': "El Al", 'FI': "Icelandair", 'W6': "Wizz Air", 'ÖA': "Ignored"},
+    'airports': {'KEF': "Keflavik International Airport, Reykjavik", 'TLV': "Ben Gurion", 'ZRH': "Zürich"},
+    'cities': {'LON': "LHR,LGW,STN"},
+}
+
+@pytest.fixture
+def index(tmp_path):
+    sections = {name: {code: value for code, value in entries.items() if code.isascii()} for name, entries in SECTIONS.items()}
+    path = tmp_path / "index.bin"
+    build_index(sections, str(path))
+    index = ReferenceIndex(str(path))
+    yield index
+    index.close()
+
+def test_lookup_finds_every_code(index):
+    for section, entries in SECTIONS.items():
+        for code, value in entries.items():
+            if code.isascii():
+                assert index.lookup(section, code) == value
+
+def test_lookup_is_case_insensitive(index):
+    assert index.airline_name("ly") == "El Al"
+    assert index.airport_name("kef") == "Keflavik International Airport, Reykjavik"
+
+def test_lookup_keeps_utf8_names(index):
+    assert index.airport_name("ZRH") == "Zürich"
+
+@pytest.mark.parametrize("section, code", [
+    ('airlines', "LH"),        # between existing codes
+    ('airlines', "AA"),        # before the first
+    ('airlines', "ZZ"),        # after the last
+    ('airlines', "LYX"),       # wrong width
+    ('airlines', "ÖA"),        # not ASCII
+    ('airlines', ""),
+    ('airlines', None),
+    ('airports', "LY"),
+    ('trains', "KEF"),         # unknown section
+])
+def test_lookup_misses(index, section, code):
+    assert index.lookup(section, code) is None
+
+def test_city_airports(index):
+    assert index.city_airports("LON") == ["LHR", "LGW", "STN"]
+    assert index.city_airports("KEF") is None
+
+def test_count(index):
+    assert index.count('airlines') == 3
+    assert index.count('cities') == 1
+    assert index.count('trains') == 0
+
+def test_build_index_rejects_mixed_code_widths(tmp_path):
+    with pytest.raises(ValueError):
+        build_index({'airlines': {'LY': "El Al", 'LYX': "Too long"}}, str(tmp_path / "index.bin"))
+
+def test_missing_file_behaves_as_empty(tmp_path):
+    index = ReferenceIndex(str(tmp_path / "missing.bin"))
+    assert index.airline_name("LY") is None
+    assert index.count('airlines') == 0
+
+def test_invalid_file_behaves_as_empty(tmp_path):
+    path = tmp_path / "index.bin"
+    path.write_bytes(b"not an index at all")
+    index = ReferenceIndex(str(path))
+    assert index.airport_name("KEF") is None
+    index.close()
+
+def test_bundled_index():
+    index = ReferenceIndex("reference_data/iata_index.bin")
+    assert index.airline_name("LH") == "Lufthansa"
+    assert "Keflavik" in index.airport_name("KEF")
+    assert index.city_airports("LON")[0] == "LHR"
+    index.close()
+
+def test_airport_display_name():
+    assert airport_display_name("Keflavik International Airport", "Reykjavik") == "Keflavik International Airport, Reykjavik"
+    assert airport_display_name("Dubai International Airport", "Dubai") == "Dubai International Airport"
+    assert airport_display_name("Ben Gurion International Airport", "") == "Ben Gurion International Airport"
+
+def test_load_openflights_airlines(tmp_path):
+    path = tmp_path / "airlines.dat"
+    path.write_text("\n".join([
+        '1,"Private flight",\\N,"-","N/A","","","Y"',
+        '100,"Old Nippon",\\N,"NH","ONH",\\N,"Japan","N"',
+        '324,"All Nippon Airways","ANA All Nippon Airways","NH","ANA","ALL NIPPON","Japan","Y"',
+        '325,"Later Nippon",\\N,"NH","LNH",\\N,"Japan","Y"',
+        '200,"Defunct Only",\\N,"ZZ","ZZZ",\\N,"Nowhere","N"',
+        '201,"No Code",\\N,\\N,"NCO",\\N,"Nowhere","Y"',
+    ]), encoding='utf-8')
+
+    assert load_openflights_airlines(str(path)) == {'NH': "All Nippon Airways", 'ZZ': "Defunct Only"}
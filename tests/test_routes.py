@@ -0,0 +1,68 @@
+import pytest
+
+from routes import RouteSpec, load_routes, validate_route
+
+def test_invalid_alert_rules_fail_validation():
+    routes = load_routes([], alert_rules=[{"rule": "price_below", "price": -1}, {"rule": "new_direct"}])
+
+    assert [rule.rule for rule in routes[0].alert_rules] == ["new_direct"]
+    errors = [error for error in validate_route(routes[0]) if "Alert rule" in error]
+    assert errors == [routes[0].name + ": Alert rule {'rule': 'price_below', 'price': -1} needs a positive 'price'"]
+
+def test_watchlist_entry_rules_are_validated_per_route():
+    routes = load_routes([
+        {"origin": "TLV", "destination": "KEF", "alert_rules": [{"rule": "price_drop"}]},
+        {"origin": "TLV", "destination": "LHR"},
+    ], alert_rules=[{"rule": "new_direct"}])
+
+    assert routes[0].alert_rule_errors and not routes[0].alert_rules
+    assert routes[1].alert_rule_errors == ()
+    assert [rule.rule for rule in routes[1].alert_rules] == ["new_direct"]
+    assert isinstance(routes[1], RouteSpec)
+
+def test_empty_watchlist_is_the_single_configured_route():
+    route, = load_routes([], alert_rules=[])
+    assert route.alert_rules == ()
+    assert route.recipients == ()
+
+def test_watchlist_entries_fall_back_to_the_global_settings():
+    first, second = load_routes([
+        {"origin": "TLV", "destination": "KEF", "departure_date": "2027-01-10", "return_date": "2027-01-17"},
+        {"origin": "NYC", "destination": "LON", "max_stops": 0, "recipients": "a@example.com; b@example.com"},
+    ], alert_rules=[])
+
+    assert (first.departure_date, first.return_date) == ("2027-01-10", "2027-01-17")
+    assert second.max_stops == 0
+    assert second.max_results == first.max_results
+    assert second.recipients == ("a@example.com", "b@example.com")
+    assert second.name == "NYC → LON"
+    # Routes are hashable, reports and grids are keyed on them
+    assert len({first, second, first}) == 2
+
+def test_unknown_watchlist_key_is_rejected():
+    with pytest.raises(ValueError, match="Invalid watchlist entry"):
+        load_routes([{"origin": "TLV", "destination": "KEF", "max_price": 400}], alert_rules=[])
+
+def future_route(**overrides):
+    return RouteSpec(**{'origin': "TLV", 'destination': "KEF", 'departure_date': "2099-12-01", 'return_date': "2099-12-08", **overrides})
+
+def test_valid_route_passes():
+    assert validate_route(future_route()) == []
+
+@pytest.mark.parametrize("overrides, message", [
+    ({'origin': "TL"}, "Invalid origin airport code"),
+    ({'destination': "TLV"}, "Origin and destination are the same"),
+    ({'departure_date': "2000-01-01"}, "is in the past"),
+    ({'return_date': "2099-11-01"}, "is before departure date"),
+    ({'return_date': "08/12/2099"}, "Invalid date format"),
+    ({'max_results': 0}, "MAX_RESULTS should be between 1 and 100"),
+    ({'max_stops': -1}, "MAX_STOPS should be 0 or positive"),
+    ({'min_stay_days': 5, 'max_stay_days': 3}, "smaller than MIN_STAY_DAYS"),
+    ({'max_date_combinations': 0}, "MAX_DATE_COMBINATIONS should be at least 1"),
+    ({'recipients': ("not-an-address",)}, "Invalid recipient email address"),
+])
+def test_invalid_route_settings(overrides, message):
+    errors = validate_route(future_route(**overrides))
+    assert len(errors) == 1
+    assert errors[0].startswith(future_route(**overrides).name + ": ")
+    assert message in errors[0]
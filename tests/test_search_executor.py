@@ -0,0 +1,92 @@
+import asyncio
+import contextvars
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from routes import RouteSpec
+from search_executor import _timed_search, run_searches_async
+
+ROUTE = RouteSpec("TLV", "KEF", "2026-12-01", "2026-12-08")
+COMBINATIONS = [(ROUTE, f"2026-12-0{day}", f"2026-12-1{day}") for day in range(1, 6)]
+
+def run(search_fn, combinations, workers=4):
+    async def main():
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            return await run_searches_async(search_fn, combinations, executor)
+    return asyncio.run(main())
+
+def test_results_keep_the_order_of_the_combinations():
+    def search(route, dep, ret):
+        # Later combinations finish first
+        time.sleep(0.01 * (10 - int(dep[-1])))
+        return [f"{route.origin}{dep}"]
+
+    results = run(search, COMBINATIONS)
+
+    assert [result['departure_date'] for result in results] == [dep for _, dep, _ in COMBINATIONS]
+    assert [result['flights'] for result in results] == [[f"TLV{dep}"] for _, dep, _ in COMBINATIONS]
+    assert all(result['route'] is ROUTE for result in results)
+    assert all(result['elapsed_seconds'] > 0 for result in results)
+
+def test_no_combinations():
+    assert run(lambda *combination: [], []) == []
+
+def test_combinations_without_a_route():
+    result, = run(lambda dep, ret: ["offer"], [("2026-12-01", "2026-12-08")])
+    assert result['route'] is None
+    assert result['flights'] == ["offer"]
+
+def test_cached_results_carry_their_fetch_time():
+    fetched = datetime(2026, 10, 1, 8, 0)
+    result = _timed_search(lambda route, dep, ret: (["offer"], fetched), COMBINATIONS[0])
+    assert result['flights'] == ["offer"]
+    assert result['cached_at'] == fetched
+    assert not result['failed']
+
+def test_failures_are_marked():
+    def search(route, dep, ret):
+        if dep.endswith("2"):
+            raise RuntimeError("boom")
+        if dep.endswith("3"):
+            return None
+        return []
+
+    results = run(search, COMBINATIONS[:4])
+
+    assert [result['failed'] for result in results] == [False, True, True, False]
+    assert all(result['flights'] == [] for result in results)
+
+def test_shared_executor_bounds_concurrency():
+    running, peak = [0], [0]
+    lock = threading.Lock()
+
+    def search(route, dep, ret):
+        with lock:
+            running[0] += 1
+            peak[0] = max(peak[0], running[0])
+        time.sleep(0.02)
+        with lock:
+            running[0] -= 1
+        return []
+
+    async def main():
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            await asyncio.gather(
+                run_searches_async(search, COMBINATIONS, executor),
+                run_searches_async(search, COMBINATIONS, executor),
+            )
+    asyncio.run(main())
+
+    assert peak[0] == 2
+
+def test_searches_see_the_callers_context():
+    request = contextvars.ContextVar("request", default=None)
+
+    async def main():
+        request.set("run-1")
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            return await run_searches_async(lambda route, dep, ret: [request.get()], COMBINATIONS[:2], executor)
+
+    assert [result['flights'] for result in asyncio.run(main())] == [["run-1"], ["run-1"]]
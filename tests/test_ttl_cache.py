@@ -0,0 +1,74 @@
+import json
+
+from ttl_cache import PersistentTTLCache, canonical_hash
+
+def make_cache(tmp_path, ttl_seconds=60, max_entries=3):
+    return PersistentTTLCache(str(tmp_path / "cache.json"), ttl_seconds, max_entries, name="test cache")
+
+def test_canonical_hash_ignores_key_order():
+    assert canonical_hash({'a': 1, 'b': [1, 2]}) == canonical_hash({'b': [1, 2], 'a': 1})
+    assert canonical_hash({'a': 1}) != canonical_hash({'a': 2})
+
+def test_get_and_put(tmp_path):
+    cache = make_cache(tmp_path)
+    assert cache.get("key") is None
+    cache.put("key", {'value': 1})
+
+    assert cache.get("key") == {'value': 1}
+    stored_at, value = cache.get_entry("key")
+    assert value == {'value': 1} and stored_at > 0
+    assert cache.get_cache_stats() == {'entries': 1, 'hits': 2, 'misses': 1, 'hit_rate': 2 / 3}
+
+def test_expired_entries_are_misses(tmp_path, monkeypatch):
+    cache = make_cache(tmp_path, ttl_seconds=60)
+    cache.put("key", "value")
+    now = cache.entries["key"][0]
+    monkeypatch.setattr("ttl_cache.time.time", lambda: now + 61)
+
+    assert cache.get("key") is None
+    assert "key" not in cache.entries
+
+def test_least_recently_used_entry_is_evicted(tmp_path):
+    cache = make_cache(tmp_path, max_entries=2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    cache.get("a")
+    cache.put("c", 3)
+
+    assert list(cache.entries) == ["a", "c"]
+
+def test_flush_persists_the_lru_order(tmp_path):
+    cache = make_cache(tmp_path)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    cache.flush()
+
+    reloaded = make_cache(tmp_path)
+    assert reloaded.get("a") == 1
+    # Reading the older entry reorders the cache, so it has to be written again
+    assert reloaded._dirty
+    reloaded.flush()
+
+    with open(tmp_path / "cache.json", encoding='utf-8') as f:
+        assert [key for key, _, _ in json.load(f)['entries']] == ["b", "a"]
+    assert list(make_cache(tmp_path).entries) == ["b", "a"]
+
+def test_reading_the_newest_entry_writes_nothing(tmp_path):
+    cache = make_cache(tmp_path)
+    cache.put("a", 1)
+    cache.flush()
+    cache.get("a")
+    assert not cache._dirty
+
+def test_expired_entries_are_dropped_on_load(tmp_path, monkeypatch):
+    cache = make_cache(tmp_path, ttl_seconds=60)
+    cache.put("old", 1)
+    cache.flush()
+    stored_at = cache.entries["old"][0]
+    monkeypatch.setattr("ttl_cache.time.time", lambda: stored_at + 61)
+
+    assert len(make_cache(tmp_path).entries) == 0
+
+def test_unreadable_file_starts_empty(tmp_path):
+    (tmp_path / "cache.json").write_text("{", encoding='utf-8')
+    assert len(make_cache(tmp_path).entries) == 0
@@ -0,0 +1,122 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from cache_manager import write_json_atomic
+
+def canonical_hash(obj):
+    """Stable SHA-256 of a JSON-serializable structure, independent of dict ordering"""
+    payload = json.dumps(obj, sort_keys=True, separators=(',', ':'), ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+class PersistentTTLCache:
+    """
+    Small key/value cache persisted as JSON, with per-entry expiry and LRU eviction.
+
+    Entries are kept in least-recently-used order and written back in that order,
+    so eviction survives across runs. The file is read on first use and changes
+    are written once by flush().
+    """
+
+    def __init__(self, cache_file, ttl_seconds, max_entries, name="cache"):
+        self.cache_file = cache_file
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.name = name
+        self.hits = 0
+        self.misses = 0
+        self._dirty = False
+        self._lock = threading.Lock()
+        self._entries = None
+        self._load_lock = threading.Lock()
+
+    @property
+    def entries(self):
+        """Entries in LRU order, read from the file on first access"""
+        if self._entries is None:
+            with self._load_lock:
+                if self._entries is None:
+                    self._entries = self._load()
+        return self._entries
+
+    def _load(self):
+        """Load entries from file, dropping any that already expired"""
+        entries = OrderedDict()
+        if not os.path.exists(self.cache_file):
+            logging.info(f"No existing {self.name} found, creating new cache")
+            return entries
+        try:
+            with open(self.cache_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            for key, stored_at, value in data.get('entries', []):
+                if not self._expired(stored_at):
+                    entries[key] = (stored_at, value)
+            logging.info(f"{self.name.capitalize()} restored: {len(entries)} entries")
+        except Exception as e:
+            logging.warning(f"Could not load {self.name} file: {e}. Creating new cache.")
+        return entries
+
+    def _expired(self, stored_at):
+        return self.ttl_seconds is not None and time.time() - stored_at > self.ttl_seconds
+
+    def get(self, key):
+        """Return the cached value or None, counting hits and misses"""
+        entry = self.get_entry(key)
+        return entry[1] if entry is not None else None
+
+    def get_entry(self, key):
+        """(stored_at, value) of a cached value or None, counting hits and misses"""
+        with self._lock:
+            entry = self.entries.get(key)
+            if entry is not None and self._expired(entry[0]):
+                del self.entries[key]
+                self._dirty = True
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            if next(reversed(self.entries)) != key:
+                # The new LRU order is persisted, so eviction follows use across runs
+                self.entries.move_to_end(key)
+                self._dirty = True
+            self.hits += 1
+            return entry
+
+    def put(self, key, value):
+        """Store a value, evicting the least recently used entries beyond max_entries"""
+        with self._lock:
+            self.entries[key] = (time.time(), value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                evicted, _ = self.entries.popitem(last=False)
+                logging.debug(f"Evicted {evicted} from {self.name}")
+            self._dirty = True
+
+    def flush(self):
+        """Write pending changes to disk, if any"""
+        with self._lock:
+            if not self._dirty:
+                return
+            try:
+                data = {
+                    'version': '1.0',
+                    'entries': [[key, stored_at, value] for key, (stored_at, value) in self.entries.items()]
+                }
+                write_json_atomic(self.cache_file, data)
+                self._dirty = False
+                logging.info(f"{self.name.capitalize()} flushed to {self.cache_file}")
+            except Exception as e:
+                logging.error(f"Could not save {self.name}: {e}")
+
+    def get_cache_stats(self):
+        """Get cache statistics"""
+        lookups = self.hits + self.misses
+        return {
+            'entries': len(self.entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0
+        }